@@ -0,0 +1,158 @@
+import contextlib
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Estado de cada proceso de trabajo: el modelo se construye una sola vez por proceso.
+_worker = {}
+
+
+def read_records(stream, fmt):
+    """Lee registros de evidencia uno a uno desde un flujo JSONL o CSV, sin cargar todo el archivo.
+
+    Una línea JSONL que no se puede leer se entrega como texto, para que `diagnose_record`
+    escriba su registro de error sin detener el lote.
+    """
+    if fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line
+    elif fmt == "csv":
+        for row in csv.DictReader(stream):
+            record = {}
+            for key, value in row.items():
+                if value not in (None, ""):
+                    record[key] = int(value) if value.lstrip("-").isdigit() else value
+            yield record
+    else:
+        raise ValueError(f"Formato de entrada desconocido: {fmt}")
+
+
+def chunked(iterable, size):
+    """Agrupa un iterable en listas de como mucho `size` elementos."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _load_worker(snapshot, backend):
+    from bayesian_model import VehicleDiagnosis
+
+    _worker["diagnosis"] = VehicleDiagnosis.from_snapshot(snapshot) if snapshot else VehicleDiagnosis()
+    _worker["backend"] = backend
+
+
+def _init_worker(snapshot, backend):
+    # Los avisos impresos por el modelo no deben mezclarse con la salida JSONL.
+    sys.stdout = sys.stderr
+    _load_worker(snapshot, backend)
+
+
+def diagnose_record(record):
+    """Diagnostica un registro con el modelo bayesiano y el motor de reglas del proceso actual.
+
+    La evidencia es el objeto `evidence` del registro o, si no lo tiene (por ejemplo en
+    un CSV), las columnas que son variables de la red; las demás columnas se copian a la
+    salida como datos del registro. Si el registro no se puede diagnosticar (no es un
+    objeto JSON, la evidencia trae variables o estados inválidos, o la inferencia falla),
+    devuelve el registro con `error` en lugar de detener el lote.
+    """
+    try:
+        return _diagnose_record(record)
+    except Exception as e:
+        return {"record": record, "error": f"{type(e).__name__}: {e}"}
+
+
+def _diagnose_record(record):
+    from bayesian_model import INFERENCE_QUERIES, _is_state
+
+    if not isinstance(record, dict):
+        raise ValueError("El registro no es un objeto JSON")
+    diagnosis = _worker["diagnosis"]
+    cardinality = diagnosis._cardinality
+    if "evidence" in record:
+        evidence = record["evidence"]
+        if not isinstance(evidence, dict):
+            raise ValueError("La evidencia no es un objeto JSON")
+        metadata = {key: value for key, value in record.items() if key != "evidence"}
+    else:
+        evidence = {key: value for key, value in record.items() if key in cardinality}
+        metadata = {key: value for key, value in record.items() if key not in cardinality}
+    for variable, value in evidence.items():
+        if variable not in cardinality:
+            raise ValueError(f"Variable que no está en la red: {variable}")
+        if not _is_state(value, cardinality[variable]):
+            raise ValueError(f"Estado inválido para {variable}: {value!r}")
+
+    bayesian = {issue: float(prob) for issue, prob in diagnosis.infer(evidence).items()}
+    failed = [query for query in INFERENCE_QUERIES if query not in evidence and query not in bayesian]
+    if failed:
+        raise ValueError(f"La inferencia falló para {', '.join(failed)}")
+    if _worker["backend"] == "compiled":
+        from rules import get_compiled_rules
+        rule_based = get_compiled_rules().evaluate(evidence)
+    else:
+        from rules import pass_evidence_to_engine
+        rule_based = pass_evidence_to_engine(evidence, bayesian)
+
+    result = dict(metadata)
+    result.update({
+        "evidence": evidence,
+        "bayesian": bayesian,
+        "most_probable": max(bayesian, key=bayesian.get) if bayesian else "Unknown",
+        "rule_based": rule_based,
+    })
+    return result
+
+
+def diagnose_chunk(records):
+    return [diagnose_record(record) for record in records]
+
+
+def run_batch(input_stream, output_stream, fmt="jsonl", workers=None, chunk_size=256,
+              max_in_flight=None, snapshot=None, backend="compiled"):
+    """Diagnostica en paralelo los registros de `input_stream` y escribe JSONL en `output_stream`.
+
+    La entrada se procesa por bloques de `chunk_size` registros. Como mucho hay
+    `max_in_flight` bloques pendientes a la vez (por defecto, dos por proceso), así que la
+    memoria no crece con el tamaño de la entrada. La salida conserva el orden de entrada.
+    Devuelve la cantidad de registros procesados.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    chunks = chunked(read_records(input_stream, fmt), chunk_size)
+    count = 0
+
+    def write(results):
+        nonlocal count
+        for result in results:
+            output_stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        count += len(results)
+
+    if workers == 1:
+        with contextlib.redirect_stdout(sys.stderr):
+            _load_worker(snapshot, backend)
+            for chunk in chunks:
+                write(diagnose_chunk(chunk))
+        return count
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot, backend)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= max_in_flight:
+                write(pending.popleft().result())
+            pending.append(pool.submit(diagnose_chunk, chunk))
+        while pending:
+            write(pending.popleft().result())
+    return count
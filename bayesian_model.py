@@ -1,137 +1,921 @@
-from pgmpy.models import BayesianNetwork
-from pgmpy.factors.discrete import TabularCPD
-from pgmpy.inference import VariableElimination
+import json
+import os
+
+import numpy as np
+
+import instrumentation
+from elimination import EliminationPlanner
+from evidence import BitEvidence, _is_state, bit_rows, mask_of
+from junction_tree import JunctionTreeInference
+from posterior_cache import PosteriorCache, evidence_key
+from sampling import LikelihoodWeighting, SamplingResult
+
+# Variables raíz que el cuestionario puede observar, en el orden en que se preguntan.
+OBSERVABLE_VARIABLES = [
+    'difficulty_starting', 'battery_ok', 'starter_sound', 'fuel_smell',
+    'brake_problem_frequency', 'noise_type',
+    'overheating', 'coolant_level', 'fan_function', 'leak_presence',
+    'vibrations', 'speed_dependency', 'tire_wear', 'steering_vibrates'
+]
+
+INFERENCE_QUERIES = ['ignition_issue', 'battery_issue', 'coolant_leak', 'radiator_issue', 'tire_issue', 'engine_mount_issue']
+DIAGNOSIS_QUERIES = ['ignition_issue', 'battery_issue', 'brake_issue', 'coolant_leak', 'radiator_issue', 'tire_issue', 'engine_mount_issue']
+
+# Valor centinela para las variables no observadas en las matrices de evidencia.
+UNOBSERVED = -1
+
+_OBSERVABLE_COLUMN = {variable: column for column, variable in enumerate(OBSERVABLE_VARIABLES)}
+
+
+def evidence_matrix(evidences):
+    """Convierte una lista de diccionarios de evidencia (o de `BitEvidence`) en una matriz N x 14 para `infer_batch`."""
+    if evidences and all(isinstance(evidence, BitEvidence) for evidence in evidences):
+        return bit_rows(evidences, OBSERVABLE_VARIABLES, UNOBSERVED)
+    matrix = np.full((len(evidences), len(OBSERVABLE_VARIABLES)), UNOBSERVED, dtype=np.int8)
+    for row, evidence in enumerate(evidences):
+        for column, variable in enumerate(OBSERVABLE_VARIABLES):
+            if variable in evidence:
+                matrix[row, column] = evidence[variable]
+    return matrix
+
+
+def _check_sampling(method, sampling):
+    """Los parámetros de muestreo solo valen con `method="sampling"`; con otro método se ignorarían."""
+    if sampling and method != "sampling":
+        raise TypeError(f"method={method!r} no acepta {', '.join(sorted(sampling))}: solo se usan con method='sampling'")
+
+
+def _entropy(probabilities):
+    """Suma de las entropías binarias (en bits) de una colección de probabilidades P(x = 1)."""
+    p = np.clip(np.fromiter(probabilities, dtype=float), 1e-12, 1 - 1e-12)
+    return float(-(p * np.log2(p) + (1 - p) * np.log2(1 - p)).sum())
+
+
+def _posterior_table(cpd_values, priors):
+    """Tabla compilada de un nodo cuyos padres son todos raíces (ver `VehicleDiagnosis.compile`).
+
+    `cpd_values` tiene un eje por variable (el nodo primero) y `priors` es el prior de
+    cada padre, en el mismo orden.
+    """
+    parents = len(priors)
+    operands = [cpd_values, list(range(parents + 1))]
+    for i, prior in enumerate(priors):
+        weights = np.vstack([prior, np.eye(len(prior))])
+        operands += [weights, [parents + 1 + i, i + 1]]
+    joint = np.einsum(*operands, [0] + list(range(parents + 1, 2 * parents + 1)))
+    return joint[1] / joint.sum(axis=0)
+
+
+def __getattr__(name):
+    # pgmpy tarda varios segundos en importarse; solo se carga cuando se necesita.
+    if name == "BayesianNetwork":
+        from pgmpy.models import BayesianNetwork
+        return BayesianNetwork
+    if name == "TabularCPD":
+        from pgmpy.factors.discrete import TabularCPD
+        return TabularCPD
+    if name == "VariableElimination":
+        from pgmpy.inference import VariableElimination
+        return VariableElimination
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class VehicleDiagnosis:
-    def __init__(self):
-        self.model = BayesianNetwork([
-            ('difficulty_starting', 'ignition_issue'),
-            ('starter_sound', 'ignition_issue'),
-            ('difficulty_starting', 'battery_issue'),
-            ('battery_ok', 'battery_issue'),
-            ('fuel_smell', 'ignition_issue'),
-            ('noise_type', 'brake_issue'),
-            ('brake_problem_frequency', 'brake_issue'),
-            ('overheating', 'coolant_leak'),
-            ('overheating', 'radiator_issue'),
-            ('coolant_level', 'coolant_leak'),
-            ('fan_function', 'radiator_issue'),
-            ('leak_presence', 'coolant_leak'),
-            ('vibrations', 'tire_issue'),
-            ('vibrations', 'engine_mount_issue'),
-            ('speed_dependency', 'tire_issue'),
-            ('tire_wear', 'tire_issue'),
-            ('steering_vibrates', 'tire_issue')
-        ])
-
-        self.cpd_difficulty_starting = TabularCPD(variable='difficulty_starting', variable_card=2, values=[[0.7], [0.3]])
-        self.cpd_battery_ok = TabularCPD(variable='battery_ok', variable_card=2, values=[[0.8], [0.2]])
-        self.cpd_starter_sound = TabularCPD(variable='starter_sound', variable_card=2, values=[[0.6], [0.4]])
-        self.cpd_fuel_smell = TabularCPD(variable='fuel_smell', variable_card=2, values=[[0.5], [0.5]])
-        self.cpd_noise_type = TabularCPD(variable='noise_type', variable_card=2, values=[[0.5], [0.5]])
-        self.cpd_brake_responsiveness = TabularCPD(variable='brake_problem_frequency', variable_card=2, values=[[0.7], [0.3]])
-        self.cpd_overheating = TabularCPD(variable='overheating', variable_card=2, values=[[0.9], [0.1]])
-        self.cpd_coolant_level = TabularCPD(variable='coolant_level', variable_card=2, values=[[0.85], [0.15]])
-        self.cpd_fan_function = TabularCPD(variable='fan_function', variable_card=2, values=[[0.95], [0.05]])
-        self.cpd_leak_presence = TabularCPD(variable='leak_presence', variable_card=2, values=[[0.8], [0.2]])
-        self.cpd_vibrations = TabularCPD(variable='vibrations', variable_card=2, values=[[0.6], [0.4]])
-        self.cpd_tire_wear = TabularCPD(variable='tire_wear', variable_card=2, values=[[0.7], [0.3]])
-        self.cpd_speed_dependency = TabularCPD(variable='speed_dependency', variable_card=2, values=[[0.6], [0.4]])
-        self.cpd_steering_vibrates = TabularCPD(variable='steering_vibrates', variable_card=2, values=[[0.65], [0.35]])
-
-        self.cpd_ignition_issue = TabularCPD(
-            variable='ignition_issue', 
-            variable_card=2, 
-            values=[[0.95, 0.1, 0.8, 0.05, 0.85, 0.15, 0.75, 0.25],
-                    [0.05, 0.9, 0.2, 0.95, 0.15, 0.85, 0.25, 0.75]],
-            evidence=['difficulty_starting', 'starter_sound', 'fuel_smell'], 
-            evidence_card=[2, 2, 2]  
-        )
-
-        self.cpd_battery_issue = TabularCPD(variable='battery_issue', variable_card=2, 
-                                           values=[[0.9, 0.7, 0.8, 0.6],
-                                                   [0.1, 0.3, 0.2, 0.4]],  
-                                           evidence=['difficulty_starting', 'battery_ok'], 
-                                           evidence_card=[2, 2])
-
-        self.cpd_brake_issue = TabularCPD(variable='brake_issue', variable_card=2, 
-                                         values=[[0.85, 0.75, 0.9, 0.8],
-                                                 [0.15, 0.25, 0.1, 0.2]],
-                                         evidence=['noise_type', 'brake_problem_frequency'], 
-                                         evidence_card=[2, 2])
-
-
-        self.cpd_coolant_leak = TabularCPD(
-            variable='coolant_leak', 
-            variable_card=2, 
-            values=[[0.95, 0.85, 0.9, 0.7, 0.9, 0.75, 0.85, 0.65],
-                    [0.05, 0.15, 0.1, 0.3, 0.1, 0.25, 0.15, 0.35]],
-            evidence=['overheating', 'coolant_level', 'leak_presence'], 
-            evidence_card=[2, 2, 2] 
-        )
-
-
-        self.cpd_radiator_issue = TabularCPD(variable='radiator_issue', variable_card=2, 
-                                            values=[[0.9, 0.6, 0.8, 0.7],
-                                                    [0.1, 0.4, 0.2, 0.3]],
-                                            evidence=['overheating', 'fan_function'], 
-                                            evidence_card=[2, 2])
-
-
-        self.cpd_tire_issue = TabularCPD(
-            variable='tire_issue', 
-            variable_card=2, 
-            values=[[0.85, 0.75, 0.7, 0.8, 0.9, 0.85, 0.75, 0.7, 0.85, 0.8, 0.75, 0.7, 0.8, 0.85, 0.75, 0.7],
-                    [0.15, 0.25, 0.3, 0.2, 0.1, 0.15, 0.25, 0.3, 0.15, 0.2, 0.25, 0.3, 0.2, 0.15, 0.25, 0.3]],
-            evidence=['vibrations', 'speed_dependency', 'tire_wear', 'steering_vibrates'], 
-            evidence_card=[2, 2, 2, 2]
-        )
-
-
-        self.cpd_engine_mount_issue = TabularCPD(variable='engine_mount_issue', variable_card=2, 
-                                                values=[[0.8, 0.6],
-                                                        [0.2, 0.4]],
-                                                evidence=['vibrations'], evidence_card=[2])
-
-        self.model.add_cpds(
-            self.cpd_difficulty_starting, self.cpd_battery_ok, self.cpd_starter_sound, self.cpd_fuel_smell, 
-            self.cpd_noise_type, self.cpd_brake_responsiveness, self.cpd_overheating, self.cpd_coolant_level, 
-            self.cpd_fan_function, self.cpd_leak_presence, self.cpd_vibrations, self.cpd_tire_wear, self.cpd_speed_dependency, 
-            self.cpd_steering_vibrates, self.cpd_ignition_issue, self.cpd_battery_issue, self.cpd_brake_issue, 
-            self.cpd_coolant_leak, self.cpd_radiator_issue, self.cpd_tire_issue, self.cpd_engine_mount_issue
-        )
+    def __init__(self, cache_size=1024, cpds=None, workers=1):
+        """Construye y compila la red; `cpds` reemplaza los valores escritos a mano (ver `set_cpds`).
+
+        Con `workers > 1`, los componentes de la red que haya que recalcular en una misma
+        consulta se resuelven en paralelo en un pool de hilos.
+        """
+        with instrumentation.span("model_build", source="pgmpy"):
+            from pgmpy.models import BayesianNetwork
+            from pgmpy.factors.discrete import TabularCPD
+
+            self.model = BayesianNetwork([
+                ('difficulty_starting', 'ignition_issue'),
+                ('starter_sound', 'ignition_issue'),
+                ('difficulty_starting', 'battery_issue'),
+                ('battery_ok', 'battery_issue'),
+                ('fuel_smell', 'ignition_issue'),
+                ('noise_type', 'brake_issue'),
+                ('brake_problem_frequency', 'brake_issue'),
+                ('overheating', 'coolant_leak'),
+                ('overheating', 'radiator_issue'),
+                ('coolant_level', 'coolant_leak'),
+                ('fan_function', 'radiator_issue'),
+                ('leak_presence', 'coolant_leak'),
+                ('vibrations', 'tire_issue'),
+                ('vibrations', 'engine_mount_issue'),
+                ('speed_dependency', 'tire_issue'),
+                ('tire_wear', 'tire_issue'),
+                ('steering_vibrates', 'tire_issue')
+            ])
+
+            self.cpd_difficulty_starting = TabularCPD(variable='difficulty_starting', variable_card=2, values=[[0.7], [0.3]])
+            self.cpd_battery_ok = TabularCPD(variable='battery_ok', variable_card=2, values=[[0.8], [0.2]])
+            self.cpd_starter_sound = TabularCPD(variable='starter_sound', variable_card=2, values=[[0.6], [0.4]])
+            self.cpd_fuel_smell = TabularCPD(variable='fuel_smell', variable_card=2, values=[[0.5], [0.5]])
+            self.cpd_noise_type = TabularCPD(variable='noise_type', variable_card=2, values=[[0.5], [0.5]])
+            self.cpd_brake_responsiveness = TabularCPD(variable='brake_problem_frequency', variable_card=2, values=[[0.7], [0.3]])
+            self.cpd_overheating = TabularCPD(variable='overheating', variable_card=2, values=[[0.9], [0.1]])
+            self.cpd_coolant_level = TabularCPD(variable='coolant_level', variable_card=2, values=[[0.85], [0.15]])
+            self.cpd_fan_function = TabularCPD(variable='fan_function', variable_card=2, values=[[0.95], [0.05]])
+            self.cpd_leak_presence = TabularCPD(variable='leak_presence', variable_card=2, values=[[0.8], [0.2]])
+            self.cpd_vibrations = TabularCPD(variable='vibrations', variable_card=2, values=[[0.6], [0.4]])
+            self.cpd_tire_wear = TabularCPD(variable='tire_wear', variable_card=2, values=[[0.7], [0.3]])
+            self.cpd_speed_dependency = TabularCPD(variable='speed_dependency', variable_card=2, values=[[0.6], [0.4]])
+            self.cpd_steering_vibrates = TabularCPD(variable='steering_vibrates', variable_card=2, values=[[0.65], [0.35]])
+
+            self.cpd_ignition_issue = TabularCPD(
+                variable='ignition_issue', 
+                variable_card=2, 
+                values=[[0.95, 0.1, 0.8, 0.05, 0.85, 0.15, 0.75, 0.25],
+                        [0.05, 0.9, 0.2, 0.95, 0.15, 0.85, 0.25, 0.75]],
+                evidence=['difficulty_starting', 'starter_sound', 'fuel_smell'], 
+                evidence_card=[2, 2, 2]  
+            )
+
+            self.cpd_battery_issue = TabularCPD(variable='battery_issue', variable_card=2, 
+                                               values=[[0.9, 0.7, 0.8, 0.6],
+                                                       [0.1, 0.3, 0.2, 0.4]],  
+                                               evidence=['difficulty_starting', 'battery_ok'], 
+                                               evidence_card=[2, 2])
+
+            self.cpd_brake_issue = TabularCPD(variable='brake_issue', variable_card=2, 
+                                             values=[[0.85, 0.75, 0.9, 0.8],
+                                                     [0.15, 0.25, 0.1, 0.2]],
+                                             evidence=['noise_type', 'brake_problem_frequency'], 
+                                             evidence_card=[2, 2])
+
+
+            self.cpd_coolant_leak = TabularCPD(
+                variable='coolant_leak', 
+                variable_card=2, 
+                values=[[0.95, 0.85, 0.9, 0.7, 0.9, 0.75, 0.85, 0.65],
+                        [0.05, 0.15, 0.1, 0.3, 0.1, 0.25, 0.15, 0.35]],
+                evidence=['overheating', 'coolant_level', 'leak_presence'], 
+                evidence_card=[2, 2, 2] 
+            )
+
+
+            self.cpd_radiator_issue = TabularCPD(variable='radiator_issue', variable_card=2, 
+                                                values=[[0.9, 0.6, 0.8, 0.7],
+                                                        [0.1, 0.4, 0.2, 0.3]],
+                                                evidence=['overheating', 'fan_function'], 
+                                                evidence_card=[2, 2])
+
 
+            self.cpd_tire_issue = TabularCPD(
+                variable='tire_issue', 
+                variable_card=2, 
+                values=[[0.85, 0.75, 0.7, 0.8, 0.9, 0.85, 0.75, 0.7, 0.85, 0.8, 0.75, 0.7, 0.8, 0.85, 0.75, 0.7],
+                        [0.15, 0.25, 0.3, 0.2, 0.1, 0.15, 0.25, 0.3, 0.15, 0.2, 0.25, 0.3, 0.2, 0.15, 0.25, 0.3]],
+                evidence=['vibrations', 'speed_dependency', 'tire_wear', 'steering_vibrates'], 
+                evidence_card=[2, 2, 2, 2]
+            )
+
+
+            self.cpd_engine_mount_issue = TabularCPD(variable='engine_mount_issue', variable_card=2, 
+                                                    values=[[0.8, 0.6],
+                                                            [0.2, 0.4]],
+                                                    evidence=['vibrations'], evidence_card=[2])
+
+            self.model.add_cpds(
+                self.cpd_difficulty_starting, self.cpd_battery_ok, self.cpd_starter_sound, self.cpd_fuel_smell, 
+                self.cpd_noise_type, self.cpd_brake_responsiveness, self.cpd_overheating, self.cpd_coolant_level, 
+                self.cpd_fan_function, self.cpd_leak_presence, self.cpd_vibrations, self.cpd_tire_wear, self.cpd_speed_dependency, 
+                self.cpd_steering_vibrates, self.cpd_ignition_issue, self.cpd_battery_issue, self.cpd_brake_issue, 
+                self.cpd_coolant_leak, self.cpd_radiator_issue, self.cpd_tire_issue, self.cpd_engine_mount_issue
+            )
+
+            self._cpd_version = 0
+            if cpds is not None:
+                self._replace_cpds(cpds)
+            self.model.check_model()
+            self.cache = PosteriorCache(cache_size)
+            self.component_cache = PosteriorCache(cache_size)
+            self.workers = workers
+            self._executor = None
+            self.overlay = {}
+            self._variants = None
+            self.compile()
+
+    def compile(self):
+        """Precalcula en tablas de NumPy el posterior de cada falla para toda evidencia posible sobre sus padres.
+
+        Cada tabla tiene un eje por padre con `card + 1` posiciones: la posición 0 indica
+        que el padre no fue observado y la posición `s + 1` que se observó el estado `s`.
+        Solo se compilan las variables cuyos padres son todos raíces, que es el caso de
+        todas las fallas de la red; las raíces quedan como tablas sin ejes con su prior.
+        También construye una única vez los motores de inferencia exacta que se
+        reutilizan en todas las consultas, y vacía la caché de posteriores.
+        """
+        with instrumentation.span("model_compile"):
+            self._compile()
+
+    def _compile(self):
+        import networkx as nx
+        from pgmpy.inference import VariableElimination
+
+        self._compiled_version = self._cpd_version
+        self.cache.clear()
+        self.component_cache.clear()
+        self.variable_elimination = VariableElimination(self.model)
+        self.junction_tree = JunctionTreeInference(self.model)
+        cpds = self._cpds = [dict(structure, values=self.model.get_cpds(structure["variable"]).get_values())
+                             for structure in self.network_structure()]
+        self.elimination = EliminationPlanner.from_cpds(cpds)
+        self.sampler = LikelihoodWeighting.from_cpds(cpds)
+        self.posterior_tables = {}
+        self.table_parents = {}
+        self._component_hidden = {}
+        self._cardinality = self.model.get_cardinality()
+
+        for component in nx.weakly_connected_components(self.model):
+            hidden = {node for node in component if self.model.get_parents(node)}
+            for node in component:
+                self._component_hidden[node] = hidden
+        self._index_components()
+
+        for node in self.model.nodes():
+            parents = self.model.get_cpds(node).variables[1:]
+            if any(self.model.get_parents(parent) for parent in parents):
+                continue
+
+            cpd_values = self.model.get_cpds(node).get_values().reshape(
+                [self.model.get_cardinality(node)] + [self.model.get_cardinality(parent) for parent in parents]
+            )
+            priors = [self.model.get_cpds(parent).get_values()[:, 0] for parent in parents]
+            self.posterior_tables[node] = _posterior_table(cpd_values, priors)
+            self.table_parents[node] = parents
+
+        self._batch_columns = [[OBSERVABLE_VARIABLES.index(parent) for parent in self.table_parents[query]]
+                               for query in DIAGNOSIS_QUERIES]
+
+    def _index_components(self):
+        """Asigna a cada nodo el número de su componente débilmente conexo.
+
+        Se deriva de `_component_hidden` para que también funcione con modelos cargados
+        desde snapshot: los nodos de un mismo componente comparten el conjunto de ocultos.
+        """
+        numbers = {}
+        self._component_of = {}
+        for node, hidden in self._component_hidden.items():
+            self._component_of[node] = numbers.setdefault(frozenset(hidden), len(numbers))
+        self._component_mask = {component: mask_of(node for node, number in self._component_of.items() if number == component)
+                                for component in numbers.values()}
+        self._hidden_mask = mask_of(node for node, hidden in self._component_hidden.items() if node in hidden)
+
+    def _ensure_compiled(self):
+        """Recompila las tablas y vacía la caché si los CPDs cambiaron desde la última compilación.
+
+        Los cambios se detectan por `_cpd_version`, que sube cada vez que `_replace_cpds`
+        reemplaza CPDs: comparar un entero no agrega costo a cada consulta, como sí lo haría
+        recorrer los valores de todos los CPDs. Quien modifique `model` directamente debe
+        llamar a `compile`.
+        """
+        if self.model is not None and self._compiled_version != self._cpd_version:
+            self.compile()
+
+    def _require_model(self):
+        """Reconstruye la red de pgmpy de un modelo sin red (snapshot o variante) para exportarla o modificarla."""
+        if self.model is not None:
+            return
+        from pgmpy.models import BayesianNetwork
+        from pgmpy.factors.discrete import TabularCPD
+
+        edges, cpds = self._snapshot_network
+        model = BayesianNetwork(edges)
+        model.add_cpds(*(TabularCPD(cpd["variable"], cpd["variable_card"], cpd["values"],
+                                    evidence=cpd["evidence"] or None, evidence_card=cpd["evidence_card"] or None)
+                         for cpd in cpds))
+        self.model = model
+        self.compile()
+
+    def network_structure(self):
+        """Variable, cardinalidad y padres (en el orden de las columnas del CPD) de cada nodo de la red."""
+        if self.model is None:
+            return [{key: cpd[key] for key in ("variable", "variable_card", "evidence", "evidence_card")}
+                    for cpd in self._snapshot_network[1]]
+        return [{
+            "variable": cpd.variable,
+            "variable_card": int(cpd.variable_card),
+            "evidence": cpd.variables[1:],
+            "evidence_card": [int(card) for card in cpd.cardinality[1:]],
+        } for cpd in self.model.get_cpds()]
+
+    def _network_cpds(self):
+        """`network_structure()` con los valores de cada CPD en `values`."""
+        if self.model is None:
+            return self._snapshot_network[1]
+        self._ensure_compiled()
+        return self._cpds
+
+    def _load_overlay(self, cpds):
+        """Valida un reemplazo de CPDs (diccionario o archivo de `cpd_learning.save_cpds`) contra la red."""
+        if isinstance(cpds, (str, os.PathLike)):
+            from cpd_learning import load_cpds
+            cpds = load_cpds(cpds)
+        structure = {cpd["variable"]: cpd for cpd in self.network_structure()}
+        unknown = set(cpds) - structure.keys()
+        if unknown:
+            raise ValueError(f"Variables que no están en la red: {sorted(unknown)}")
+
+        overlay = {}
+        for variable, values in cpds.items():
+            values = np.asarray(values, dtype=float)
+            shape = (structure[variable]["variable_card"], int(np.prod(structure[variable]["evidence_card"], dtype=int)))
+            if values.shape != shape:
+                raise ValueError(f"El CPD de {variable} debe tener forma {shape}, se recibió {values.shape}")
+            overlay[variable] = values
+        return overlay
+
+    def to_spec(self):
+        """Exporta la red en el formato declarativo de `diagnostic_network` (estados "No" y "Sí")."""
+        self._require_model()
+        return {
+            "variables": [{
+                "name": cpd.variable,
+                "states": ["No", "Sí"],
+                "parents": cpd.variables[1:],
+                "cpd": cpd.get_values().tolist(),
+            } for cpd in self.model.get_cpds()],
+            "observable": list(OBSERVABLE_VARIABLES),
+            "faults": list(DIAGNOSIS_QUERIES),
+        }
+
+    def _replace_cpds(self, cpds):
+        from pgmpy.factors.discrete import TabularCPD
+
+        cpds = self._load_overlay(cpds)
+        self._cpd_version += 1
+        for cpd in list(self.model.get_cpds()):
+            if cpd.variable not in cpds:
+                continue
+            self.model.remove_cpds(cpd)
+            self.model.add_cpds(TabularCPD(cpd.variable, cpd.variable_card, cpds[cpd.variable],
+                                           evidence=cpd.variables[1:] or None,
+                                           evidence_card=[int(card) for card in cpd.cardinality[1:]] or None))
+
+    def set_cpds(self, cpds):
+        """Reemplaza los valores de los CPDs, por ejemplo por los aprendidos con `cpd_learning`.
+
+        `cpds` es un diccionario variable -> matriz con la misma forma que el CPD actual, o
+        la ruta de un archivo guardado con `cpd_learning.save_cpds`. Las variables que no
+        aparecen conservan sus valores. La red se valida y se recompila.
+        """
+        self._require_model()
+        self._replace_cpds(cpds)
         self.model.check_model()
+        self.compile()
+
+    def save_snapshot(self, path):
+        """Guarda la red validada y las tablas compiladas en un archivo .npz sin comprimir."""
+        self._require_model()
+        self._ensure_compiled()
+        cpds = self.network_structure()
+        arrays = {f"cpd/{cpd.variable}": cpd.get_values() for cpd in self.model.get_cpds()}
+        for query, table in self.posterior_tables.items():
+            arrays[f"table/{query}"] = table
 
-    def infer(self, evidence):
-        """Realiza la inferencia en el modelo Bayesiano para las evidencias proporcionadas."""
-        inference = VariableElimination(self.model)
-        result = {}
+        meta = {
+            "edges": [list(edge) for edge in self.model.edges()],
+            "cpds": cpds,
+            "table_parents": self.table_parents,
+            "component_hidden": {node: sorted(hidden) for node, hidden in self._component_hidden.items()},
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
 
-        for query in ['ignition_issue', 'battery_issue', 'coolant_leak', 'radiator_issue', 'tire_issue', 'engine_mount_issue']:
+    @classmethod
+    def from_snapshot(cls, path, cache_size=1024, workers=1):
+        """Carga un modelo guardado con `save_snapshot` sin importar pgmpy ni volver a validar la red.
+
+        Las consultas que se resuelven con las tablas compiladas (todo lo que produce el
+        cuestionario) no necesitan la red; la inferencia exacta se resuelve con el
+        planificador de eliminación armado con los CPDs guardados. Solo `to_spec`,
+        `set_cpds` y `save_snapshot` reconstruyen la red de pgmpy.
+        """
+        with instrumentation.span("model_build", source="snapshot"), np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            cpds = [dict(cpd, values=data[f"cpd/{cpd['variable']}"]) for cpd in meta["cpds"]]
+            tables = {query: data[f"table/{query}"] for query in meta["table_parents"]}
+
+        component_hidden = {node: set(hidden) for node, hidden in meta["component_hidden"].items()}
+        return cls._from_parts(([tuple(edge) for edge in meta["edges"]], cpds), tables, meta["table_parents"],
+                               component_hidden, cache_size, workers)
+
+    @classmethod
+    def _from_parts(cls, network, tables, table_parents, component_hidden, cache_size, workers):
+        """Modelo sin red de pgmpy a partir de (aristas, CPDs) y las tablas ya compiladas."""
+        diagnosis = cls.__new__(cls)
+        diagnosis.model = None
+        diagnosis._snapshot_network = network
+        diagnosis.cache = PosteriorCache(cache_size)
+        diagnosis.component_cache = PosteriorCache(cache_size)
+        diagnosis.workers = workers
+        diagnosis._executor = None
+        diagnosis._cpd_version = 0
+        diagnosis._compiled_version = None
+        diagnosis.posterior_tables = tables
+        diagnosis.table_parents = table_parents
+        diagnosis._component_hidden = component_hidden
+        diagnosis._index_components()
+        diagnosis._cardinality = {cpd["variable"]: cpd["variable_card"] for cpd in network[1]}
+        diagnosis._batch_columns = [[OBSERVABLE_VARIABLES.index(parent) for parent in table_parents[query]]
+                                    for query in DIAGNOSIS_QUERIES]
+        diagnosis.overlay = {}
+        diagnosis._variants = None
+        diagnosis._snapshot_planner = None
+        diagnosis._snapshot_sampler = None
+        return diagnosis
+
+    def derive(self, cpds, cache_size=64, workers=1):
+        """Modelo de una variante (marca, año, kilometraje...) que solo cambia algunos CPDs.
+
+        `cpds` tiene el formato de `set_cpds`. La variante comparte con este modelo la
+        estructura, los CPDs que no cambian y las tablas compiladas que no dependen de
+        ellos; solo se recompilan las tablas de los nodos cambiados y de sus hijos. No
+        importa pgmpy: como en `from_snapshot`, la inferencia exacta usa el planificador de
+        eliminación de la variante.
+        """
+        self._ensure_compiled()
+        overlay = self._load_overlay(cpds)
+        network = self._network_cpds()
+        values = {cpd["variable"]: np.asarray(cpd["values"]) for cpd in network}
+        values.update(overlay)
+
+        tables = dict(self.posterior_tables)
+        for node, parents in self.table_parents.items():
+            if node in overlay or not overlay.keys().isdisjoint(parents):
+                shape = [self._cardinality[node]] + [self._cardinality[parent] for parent in parents]
+                tables[node] = _posterior_table(values[node].reshape(shape), [values[parent][:, 0] for parent in parents])
+
+        edges = list(self.model.edges()) if self.model is not None else self._snapshot_network[0]
+        variant = self._from_parts((edges, [dict(cpd, values=values[cpd["variable"]]) for cpd in network]),
+                                   tables, self.table_parents, self._component_hidden, cache_size, workers)
+        variant.overlay = overlay
+        return variant
+
+    def cache_stats(self):
+        """Devuelve los contadores de la caché de posteriores, por consulta; los de la caché por componente van en `components`."""
+        return dict(self.cache.stats(), components=self.component_cache.stats())
+
+    def _lookup(self, queries, evidence):
+        """Resuelve con las tablas compiladas las consultas que la evidencia permite.
+
+        Devuelve un diccionario con los posteriores encontrados; las consultas que falten
+        necesitan inferencia exacta (variables desconocidas o estados inválidos en la
+        evidencia, o variables no raíz observadas en el mismo componente), que registra el
+        error de las que no se pueden resolver.
+        """
+        observed_hidden = set()
+        if isinstance(evidence, BitEvidence):
+            # Solo trae variables del cuestionario con valores 0/1: no hace falta validarla.
+            if evidence.observed & self._hidden_mask:
+                observed_hidden = {variable for variable in evidence if variable in self._component_hidden[variable]}
+        else:
+            for variable, value in evidence.items():
+                hidden = self._component_hidden.get(variable)
+                if hidden is None or not _is_state(value, self._cardinality[variable]):
+                    return {}
+                if variable in hidden:
+                    observed_hidden.add(variable)
+
+        found = {}
+        for query in queries:
+            table = self.posterior_tables.get(query)
+            if table is not None and observed_hidden.isdisjoint(self._component_hidden[query]):
+                found[query] = table[tuple(evidence.get(parent, -1) + 1 for parent in self.table_parents[query])]
+        return found
+
+    def _posteriors(self, queries, evidence, method="table", **sampling):
+        """Devuelve los posteriores desde las tablas o la caché, calculándolos solo si la evidencia no está guardada.
+
+        Además del resultado completo, una caché aparte (`component_cache`, con sus propios
+        contadores) guarda cada grupo de consultas de un mismo componente de la red con
+        solo la evidencia de ese componente, porque los componentes son independientes:
+        con una respuesta nueva solo se recalcula el componente al que pertenece. Las
+        variables que no están en la red se dejan en la evidencia de todos los grupos para
+        que el error se siga informando. Con `method="sampling"` no se usa la caché y
+        `sampling` se pasa a `sample_posteriors`; con otro método, `sampling` debe venir
+        vacío.
+        """
+        _check_sampling(method, sampling)
+        self._ensure_compiled()
+        if method == "sampling":
+            result = self.sample_posteriors(queries, evidence, **sampling)
+            return {query: result.marginals[query][1] for query in queries if query in result.marginals}
+        try:
+            key = (method, tuple(queries), evidence_key(evidence))
+            hash(key)
+        except TypeError:
+            return self._compute_posteriors(queries, evidence, method)
+        return dict(self.cache.get_or_compute(key, lambda: self._component_posteriors(queries, evidence, method)))
+
+    def _component_posteriors(self, queries, evidence, method):
+        # Lo que resuelven las tablas compiladas no necesita agruparse por componente.
+        found = self._lookup(queries, evidence) if method == "table" else {}
+        if len(found) == len(queries):
+            return found
+        groups = {}
+        for query in queries:
+            if query not in found:
+                groups.setdefault(self._component_of.get(query), []).append(query)
+        missing = []
+        for component, group in groups.items():
+            if component is None:
+                part = evidence
+            elif isinstance(evidence, BitEvidence):
+                part = evidence.restrict(self._component_mask[component])
+            else:
+                part = {variable: value for variable, value in evidence.items()
+                        if self._component_of.get(variable, component) == component}
+            key = (method, tuple(group), evidence_key(part))
+            cached = self.component_cache.get(key)
+            if cached is None:
+                missing.append((key, group, part))
+            else:
+                found.update(cached)
+
+        if len(missing) > 1 and self.workers > 1:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="components")
+            futures = [self._executor.submit(self.component_cache.get_or_compute, key, self._component_task(group, part, method))
+                       for key, group, part in missing]
+            for future in futures:
+                found.update(future.result())
+        else:
+            for key, group, part in missing:
+                found.update(self.component_cache.get_or_compute(key, self._component_task(group, part, method)))
+        instrumentation.count("components_recomputed", n=len(missing))
+        return {query: found[query] for query in queries if query in found}
+
+    def _component_task(self, queries, evidence, method):
+        return lambda: self._compute_posteriors(queries, evidence, method)
+
+    def _compute_posteriors(self, queries, evidence, method):
+        """Calcula P(query = 1 | evidencia) para cada consulta con el método de inferencia indicado.
+
+        - "table": tablas compiladas; lo que no se puede resolver por tabla se calcula
+          con una sola calibración del árbol de uniones.
+        - "junction_tree": una sola calibración del árbol de uniones para todas las consultas.
+        - "variable_elimination": una consulta de pgmpy por variable, como antes.
+        - "elimination": eliminación de variables propia, con planes guardados por
+          patrón de evidencia (ver `elimination.EliminationPlanner`).
+
+        En un modelo sin red de pgmpy (snapshot o variante) los métodos exactos, y lo que las
+        tablas no resuelven, usan el planificador de eliminación. El modo aproximado
+        "sampling" se resuelve aparte, en `sample_posteriors`.
+        """
+        if method not in ("table", "junction_tree", "variable_elimination", "elimination"):
+            raise ValueError(f"Método de inferencia desconocido: {method}")
+        with instrumentation.span("inference", method=method, queries=len(queries)):
+            return self._run_inference(queries, evidence, method)
+
+    def _run_inference(self, queries, evidence, method):
+        if self.model is None and method != "table":
+            # Sin red de pgmpy (snapshot o variante) la inferencia exacta usa el planificador,
+            # que se arma con los CPDs guardados: da los mismos posteriores sin importar pgmpy.
+            method = "elimination"
+
+        # Cada motor exacto trata distinto un estado como `1.0` o `True` (algunos lo aceptan
+        # como índice); se rechaza antes para que todos registren el mismo error.
+        for variable, value in evidence.items():
+            if variable in self._cardinality and not _is_state(value, self._cardinality[variable]):
+                error = IndexError(f"Estado {value!r} fuera de rango para {variable}")
+                for query in queries:
+                    self._inference_error(query, error)
+                return {}
+
+        found = self._lookup(queries, evidence) if method == "table" else {}
+        pending = []
+        for query in queries:
             try:
-                prob = inference.query([query], evidence=evidence)
-                result[query] = prob.values[1]
+                if method == "variable_elimination":
+                    with instrumentation.span("inference_query", method=method, variable=query):
+                        found[query] = self.variable_elimination.query([query], evidence=dict(evidence), show_progress=False).values[1]
+                    continue
+                if method == "elimination":
+                    with instrumentation.span("inference_query", method=method, variable=query):
+                        found[query] = self._planner().query([query], evidence)[query][1]
+                    continue
+                if query in evidence:
+                    raise ValueError(f"Can't have the same variables in both `variables` and `evidence`. Found in both: {{'{query}'}}")
+                if query not in found:
+                    pending.append(query)
             except Exception as e:
-                print(f"Error al realizar la inferencia para {query}: {e}")
+                self._inference_error(query, e)
+
+        if pending and self.model is None:
+            planner = self._planner()
+            for query in pending:
+                try:
+                    with instrumentation.span("inference_query", method="elimination", variable=query):
+                        found[query] = planner.query([query], evidence)[query][1]
+                except Exception as e:
+                    self._inference_error(query, e)
+        elif pending:
+            try:
+                with instrumentation.span("inference_query", method="junction_tree", variables=len(pending)):
+                    marginals = self.junction_tree.query(evidence, pending)
+            except Exception as e:
+                for query in pending:
+                    self._inference_error(query, e)
+            else:
+                for query in pending:
+                    found[query] = marginals[query][1]
+
+        return {query: found[query] for query in queries if query in found}
+
+    @staticmethod
+    def _inference_error(query, error):
+        """Registra una consulta que no se pudo resolver; la consulta se omite del resultado."""
+        instrumentation.count("inference_error", query)
+        instrumentation.event("inference_error", variable=query, error=str(error))
+
+    def sample_posteriors(self, queries, evidence, samples=None, time_budget=None, seed=None):
+        """Estima los posteriores por ponderación por verosimilitud, con intervalos de confianza del 95 %.
+
+        `samples` y `time_budget` (segundos) fijan el presupuesto: se corta en el primero
+        que se alcance (ver `sampling.LikelihoodWeighting.run`). Como en la inferencia
+        exacta, se registran como error y se omiten las consultas que la evidencia observa,
+        las del componente de una respuesta con estado inválido y todas si la evidencia
+        trae variables desconocidas.
+        Devuelve un `sampling.SamplingResult`. No necesita la red de pgmpy.
+        """
+        if samples is not None and samples < 1:
+            raise ValueError(f"`samples` debe ser al menos 1: {samples}")
+        sampler = self._sampler()
+        errors = {}
+        valid = {}
+        for variable, value in evidence.items():
+            if variable not in self._cardinality:
+                # Como en la inferencia exacta, una variable desconocida invalida todas las consultas.
+                for query in queries:
+                    self._inference_error(query, ValueError(f"Node {variable} not in graph"))
+                return SamplingResult({}, {}, 0, 0.0, 0.0)
+            if _is_state(value, self._cardinality[variable]):
+                valid[variable] = value
+            else:
+                # Un estado inválido solo invalida las consultas de su componente.
+                errors[self._component_of[variable]] = IndexError(f"Estado {value!r} fuera de rango para {variable}")
 
+        pending = []
+        for query in queries:
+            if self._component_of.get(query) in errors:
+                self._inference_error(query, errors[self._component_of[query]])
+            elif query in evidence:
+                self._inference_error(query, ValueError(
+                    f"Can't have the same variables in both `variables` and `evidence`. Found in both: {{'{query}'}}"))
+            else:
+                pending.append(query)
+        evidence = valid
+        with instrumentation.span("inference", method="sampling", queries=len(pending)):
+            result = sampler.run(pending, evidence, samples, time_budget, seed=seed)
+        instrumentation.count("sampling_samples", n=result.samples)
         return result
 
-    def diagnose_vehicle(self, evidence):
-        """Realiza la inferencia en el modelo Bayesiano con las evidencias proporcionadas."""
-        inference = VariableElimination(self.model)
-        result = {}
+    def _sampler(self):
+        """Muestreador de la red; en un modelo sin red de pgmpy se arma con los CPDs guardados, como `_planner`."""
+        if self.model is not None:
+            self._ensure_compiled()
+            return self.sampler
+        if self._snapshot_sampler is None:
+            self._snapshot_sampler = LikelihoodWeighting.from_cpds(self._snapshot_network[1])
+        return self._snapshot_sampler
 
-        for query in ['ignition_issue', 'battery_issue', 'brake_issue', 'coolant_leak', 'radiator_issue', 'tire_issue', 'engine_mount_issue']:
-            try:
-                prob = inference.query([query], evidence=evidence)
-                result[query] = prob.values[1]  
-            except Exception as e:
-                print(f"Error al realizar la inferencia para {query}: {e}")
+    def infer_batch(self, evidence):
+        """Calcula los posteriores de las 7 fallas para una matriz de evidencia N x 14.
+
+        Las columnas siguen el orden de `OBSERVABLE_VARIABLES` y `UNOBSERVED` marca las
+        respuestas faltantes. Devuelve una matriz N x 7 en el orden de `DIAGNOSIS_QUERIES`,
+        calculada con indexación vectorizada sobre las tablas compiladas. Como en `infer`,
+        los estados deben ser enteros: una matriz de floats o de bool se rechaza.
+        """
+        self._ensure_compiled()
+        evidence = np.asarray(evidence)
+        if evidence.ndim != 2 or evidence.shape[1] != len(OBSERVABLE_VARIABLES):
+            raise ValueError(f"Se esperaba una matriz de N x {len(OBSERVABLE_VARIABLES)}, se recibió {evidence.shape}")
+        if not np.issubdtype(evidence.dtype, np.integer):
+            raise ValueError(f"La evidencia debe ser una matriz de enteros, se recibió {evidence.dtype}")
+
+        with instrumentation.span("infer_batch", rows=len(evidence)):
+            offsets = evidence.astype(np.intp) - UNOBSERVED
+            result = np.empty((len(evidence), len(DIAGNOSIS_QUERIES)))
+            for i, (query, columns) in enumerate(zip(DIAGNOSIS_QUERIES, self._batch_columns)):
+                table = self.posterior_tables[query]
+                try:
+                    index = np.ravel_multi_index(offsets[:, columns].T, table.shape)
+                except ValueError:
+                    raise ValueError(f"La evidencia contiene estados inválidos para los padres de {query}") from None
+                result[:, i] = table.ravel()[index]
+        return result
+
+    def what_if(self, evidence):
+        """Posteriores de las fallas al cambiar o quitar cada respuesta de `evidence`, en una sola pasada.
+
+        Por cada variable observada se arma una variante con cada uno de sus otros estados
+        y otra sin la respuesta. Si la evidencia solo observa raíces, todas se resuelven
+        juntas con `infer_batch`; si observa alguna falla (que `infer_batch` no lee), cada
+        variante pasa por `fault_posteriors`, con inferencia exacta donde haga falta y la
+        caché. Las variantes se ordenan por cuánto mueven la probabilidad de la falla más
+        probable (la de `diagnose_vehicle`); `value` es None en las que quitan la
+        respuesta. Como en `fault_posteriors`, las fallas observadas no aparecen en los
+        posteriores.
+        """
+        variants = []
+        for variable, value in evidence.items():
+            if variable not in self._cardinality:
+                continue
+            variants += [(variable, state) for state in range(self._cardinality[variable]) if state != value]
+            variants.append((variable, None))
+
+        with instrumentation.span("what_if", variants=len(variants)):
+            if any(variable in self._component_hidden.get(variable, ()) for variable in evidence):
+                rows = self._what_if_exact(evidence, variants)
+            else:
+                rows = self._what_if_batch(evidence, variants)
+
+        base = rows[0]
+        top_fault = max(base, key=base.get) if base else None
+        results = []
+        for result, (variable, state) in zip(rows[1:], variants):
+            results.append({
+                "variable": variable,
+                "value": state,
+                "posteriors": result,
+                "top_fault": max(result, key=result.get) if result else None,
+                "delta": result[top_fault] - base[top_fault] if top_fault in result else 0.0,
+            })
+        results.sort(key=lambda variant: abs(variant["delta"]), reverse=True)
+        return {"posteriors": base, "top_fault": top_fault, "variants": results}
+
+    def _what_if_batch(self, evidence, variants):
+        # Todas las filas parten de la evidencia base; cada una cambia una sola columna.
+        matrix = np.repeat(evidence_matrix([evidence]), len(variants) + 1, axis=0)
+        for row, (variable, state) in enumerate(variants, 1):
+            if variable in _OBSERVABLE_COLUMN:
+                matrix[row, _OBSERVABLE_COLUMN[variable]] = UNOBSERVED if state is None else state
+        observed = [query in evidence for query in DIAGNOSIS_QUERIES]
+        rows = []
+        for row, variant in zip(self.infer_batch(matrix).tolist(), [(None, 0)] + variants):
+            rows.append({query: p for query, p, seen in zip(DIAGNOSIS_QUERIES, row, observed)
+                         if not seen or (variant[1] is None and query == variant[0])})
+        return rows
+
+    def _what_if_exact(self, evidence, variants):
+        evidence = {variable: value for variable, value in evidence.items() if variable in self._cardinality}
+        evidences = [evidence]
+        for variable, state in variants:
+            changed = dict(evidence)
+            if state is None:
+                del changed[variable]
+            else:
+                changed[variable] = state
+            evidences.append(changed)
+        return [{query: float(p) for query, p in self.fault_posteriors(changed).items()} for changed in evidences]
+
+    def _planner(self):
+        """Planificador de eliminación; en un modelo sin red de pgmpy se arma con los CPDs guardados."""
+        if self.model is not None:
+            self._ensure_compiled()
+            return self.elimination
+        if self._snapshot_planner is None:
+            self._snapshot_planner = EliminationPlanner.from_cpds(self._snapshot_network[1])
+        return self._snapshot_planner
+
+    def most_probable_explanation(self, evidence, k=1):
+        """Las `k` combinaciones de fallas más probables dada la evidencia, con su probabilidad conjunta.
+
+        A diferencia de `diagnose_vehicle`, que toma la falla de mayor marginal, responde qué
+        combinación de fallas explica mejor los síntomas, en una sola pasada de eliminación
+        max-producto (las variables no observadas que no son fallas se suman). Las fallas
+        observadas no aparecen. Los planes se guardan por patrón de evidencia en el
+        planificador y los resultados en la caché de posteriores. Devuelve
+        [{"faults": {falla: estado}, "probability": P}], de mayor a menor. Como en
+        `infer`, si la evidencia trae variables desconocidas o estados inválidos se registra
+        el error para cada falla y se devuelve una lista vacía.
+        """
+        self._ensure_compiled()
+        faults = [query for query in DIAGNOSIS_QUERIES if query not in evidence]
+
+        def compute():
+            with instrumentation.span("inference", method="mpe", k=k):
+                try:
+                    explanations = self._planner().map(faults, evidence, k)
+                except Exception as e:
+                    for query in faults:
+                        self._inference_error(query, e)
+                    return []
+                return [{"faults": assignment, "probability": probability}
+                        for assignment, probability in explanations]
+
+        try:
+            key = ("mpe", k, evidence_key(evidence))
+            hash(key)
+        except TypeError:
+            return compute()
+        return [dict(explanation, faults=dict(explanation["faults"]))
+                for explanation in self.cache.get_or_compute(key, compute)]
+
+    def fault_posteriors(self, evidence, method="table"):
+        """Posteriores de las fallas que la evidencia no observa directamente."""
+        return self._posteriors([query for query in DIAGNOSIS_QUERIES if query not in evidence], evidence, method)
+
+    def update_posteriors(self, posteriors, evidence, variable):
+        """Actualiza los posteriores de `fault_posteriors` después de agregar `variable` a `evidence`.
+
+        Una respuesta solo afecta a las fallas de su componente de la red: las demás se
+        reutilizan del paso anterior. Las del componente se vuelven a calcular desde cero
+        con la evidencia de ese componente (con las tablas o, si hace falta, con inferencia
+        exacta); no se reutilizan factores ni mensajes del paso anterior. Como los
+        componentes son chicos y `component_cache` guarda cada uno por su evidencia, eso
+        cuesta lo mismo que una actualización incremental y no guarda estado entre pasos.
+        """
+        hidden = self._component_hidden.get(variable)
+        if hidden is None:
+            return self.fault_posteriors(evidence)
+        with instrumentation.span("update_posteriors", variable=variable):
+            updated = {query: probability for query, probability in posteriors.items() if query not in hidden}
+            updated.update(self._posteriors([query for query in DIAGNOSIS_QUERIES
+                                             if query in hidden and query not in evidence], evidence))
+        return {query: updated[query] for query in DIAGNOSIS_QUERIES if query in updated}
+
+    def question_gains(self, evidence, candidates):
+        """Reducción esperada de la entropía de las fallas al preguntar por cada variable candidata.
+
+        La entropía es la suma de las entropías binarias de las fallas no observadas. Para
+        cada candidata se promedia la entropía que quedaría con cada respuesta, ponderada
+        por la probabilidad de esa respuesta dada la evidencia actual. Todas las consultas
+        se resuelven con las tablas compiladas y la caché, así que puntuar el cuestionario
+        completo toma menos de un milisegundo. Las candidatas ya observadas o que no están
+        en la red se omiten.
+        """
+        with instrumentation.span("question_gains", candidates=len(candidates)):
+            faults = [query for query in DIAGNOSIS_QUERIES if query not in evidence]
+            current = _entropy(self._posteriors(faults, evidence).values())
+            candidates = [candidate for candidate in candidates
+                          if candidate not in evidence and candidate in self._cardinality]
+            predictive = self._posteriors(candidates, evidence)
+
+            gains = {}
+            for candidate, probability in predictive.items():
+                remaining = [query for query in faults if query != candidate]
+                expected = 0.0
+                for state, weight in ((0, 1 - probability), (1, probability)):
+                    if weight > 0:
+                        posteriors = self._posteriors(remaining, {**evidence, candidate: state})
+                        expected += weight * _entropy(posteriors.values())
+                gains[candidate] = current - expected
+        return gains
+
+    @property
+    def variants(self):
+        """Registro de variantes derivadas de este modelo (ver `model_registry.ModelRegistry`)."""
+        if self._variants is None:
+            from model_registry import ModelRegistry
+            self._variants = ModelRegistry(self)
+        return self._variants
+
+    def infer(self, evidence, method="table", variant=None, **sampling):
+        """Realiza la inferencia en el modelo Bayesiano para las evidencias proporcionadas.
+
+        `variant` elige una variante registrada en `variants`. Con `method="sampling"`
+        acepta `samples`, `time_budget` y `seed` (ver `sample_posteriors`).
+        """
+        if variant is not None:
+            return self.variants.infer(evidence, variant, method, **sampling)
+        return self._posteriors(INFERENCE_QUERIES, evidence, method, **sampling)
+
+    def diagnose_vehicle(self, evidence, method="table", variant=None, **sampling):
+        """Realiza la inferencia en el modelo Bayesiano con las evidencias proporcionadas.
+
+        Con `method="mpe"` el diagnóstico es la combinación de fallas más probable (ver
+        `most_probable_explanation`), que además se devuelve en `faults`. Con
+        `method="sampling"` se agrega `interval`, el intervalo de confianza del 95 % de
+        `probability` (ver `sample_posteriors`).
+        """
+        if variant is not None:
+            return self.variants.diagnose_vehicle(evidence, variant, method, **sampling)
+        if method == "sampling":
+            result = self.sample_posteriors(DIAGNOSIS_QUERIES, evidence, **sampling)
+            if not result.marginals:
+                return {"issue": "Unknown", "probability": 0, "interval": (0.0, 0.0)}
+            issue = max(result.marginals, key=lambda query: result.marginals[query][1])
+            low, high = result.intervals[issue][1]
+            return {"issue": issue, "probability": result.marginals[issue][1], "interval": (float(low), float(high))}
+        _check_sampling(method, sampling)
+        if method == "mpe":
+            # Combinación de fallas más probable en lugar de la falla de mayor marginal.
+            explanations = self.most_probable_explanation(evidence)
+            if not explanations:
+                return {"issue": "Unknown", "probability": 0, "faults": {}}
+            best = explanations[0]
+            present = [fault for fault, state in best["faults"].items() if state]
+            return {"issue": ", ".join(present) if present else "No fault", "probability": best["probability"],
+                    "faults": best["faults"]}
+        result = self._posteriors(DIAGNOSIS_QUERIES, evidence, method, **sampling)
 
         most_probable_issue = max(result, key=result.get) if result else "Unknown"
         return {"issue": most_probable_issue, "probability": result.get(most_probable_issue, 0)}
-    
-    
-
-    
\ No newline at end of file
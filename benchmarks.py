@@ -0,0 +1,277 @@
+"""Benchmarks reproducibles del modelo bayesiano, el motor de reglas y sesiones completas.
+
+Ejemplos:
+    python benchmarks.py --output bench.json
+    python benchmarks.py --baseline bench.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+SEED = 1234
+
+# nombre -> (función que prepara y devuelve la operación a medir, iteraciones, calentamiento)
+CASES = {}
+
+
+def case(name, iterations, warmup=5):
+    def register(setup):
+        CASES[name] = (setup, iterations, warmup)
+        return setup
+    return register
+
+
+def _sample_evidence(count):
+    from questions import questionnaire_evidence
+
+    rng = random.Random(SEED)
+    return rng.choices(questionnaire_evidence(), k=count)
+
+
+def _cycle(items):
+    state = {"i": 0}
+
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+
+@case("model_construction", iterations=10, warmup=1)
+def bench_model_construction():
+    from bayesian_model import VehicleDiagnosis
+    return VehicleDiagnosis
+
+
+@case("infer", iterations=2000)
+def bench_infer():
+    from bayesian_model import VehicleDiagnosis
+    diagnosis = VehicleDiagnosis(cache_size=0)
+    evidence = _cycle(_sample_evidence(500))
+    return lambda: diagnosis.infer(evidence())
+
+
+@case("infer_cached", iterations=20000)
+def bench_infer_cached():
+    from bayesian_model import VehicleDiagnosis
+    diagnosis = VehicleDiagnosis()
+    evidence = _cycle(_sample_evidence(50))
+    return lambda: diagnosis.infer(evidence())
+
+
+@case("infer_bits", iterations=2000)
+def bench_infer_bits():
+    from bayesian_model import VehicleDiagnosis
+    from evidence import BitEvidence
+    diagnosis = VehicleDiagnosis(cache_size=0)
+    evidence = _cycle([BitEvidence.from_dict(e) for e in _sample_evidence(500)])
+    return lambda: diagnosis.infer(evidence())
+
+
+@case("infer_elimination", iterations=2000)
+def bench_infer_elimination():
+    from bayesian_model import VehicleDiagnosis
+    diagnosis = VehicleDiagnosis(cache_size=0)
+    evidence = _cycle(_sample_evidence(500))
+    return lambda: diagnosis.infer(evidence(), method="elimination")
+
+
+@case("diagnose_vehicle", iterations=2000)
+def bench_diagnose_vehicle():
+    from bayesian_model import VehicleDiagnosis
+    diagnosis = VehicleDiagnosis(cache_size=0)
+    evidence = _cycle([{k: v for k, v in e.items() if k != "brake_issue"} for e in _sample_evidence(500)])
+    return lambda: diagnosis.diagnose_vehicle(evidence())
+
+
+@case("diagnose_mpe", iterations=2000)
+def bench_diagnose_mpe():
+    from bayesian_model import VehicleDiagnosis
+    diagnosis = VehicleDiagnosis(cache_size=0)
+    evidence = _cycle(_sample_evidence(500))
+    return lambda: diagnosis.diagnose_vehicle(evidence(), method="mpe")
+
+
+@case("infer_batch_10k", iterations=50)
+def bench_infer_batch():
+    from bayesian_model import VehicleDiagnosis, evidence_matrix
+    diagnosis = VehicleDiagnosis()
+    matrix = evidence_matrix(_sample_evidence(10000))
+    return lambda: diagnosis.infer_batch(matrix)
+
+
+@case("rule_engine_experta", iterations=300)
+def bench_rule_engine_experta():
+    from bayesian_model import VehicleDiagnosis
+    from rules import pass_evidence_to_engine
+    diagnosis = VehicleDiagnosis()
+    samples = [(e, diagnosis.infer(e)) for e in _sample_evidence(200)]
+    sample = _cycle(samples)
+    return lambda: pass_evidence_to_engine(*sample())
+
+
+@case("rule_engine_compiled", iterations=20000)
+def bench_rule_engine_compiled():
+    from rules import pass_evidence_to_engine
+    evidence = _cycle(_sample_evidence(500))
+    return lambda: pass_evidence_to_engine(evidence(), {}, backend="compiled")
+
+
+@case("session", iterations=300)
+def bench_session():
+    """Sesión completa: preguntas del cuestionario con respuestas aleatorias y diagnóstico final."""
+    from chatbot import DiagnosticChatbot
+    from questions import get_next_question
+
+    chatbot = DiagnosticChatbot()
+    rng = random.Random(SEED)
+
+    def session():
+        chatbot.evidence = {}
+        question = get_next_question(chatbot.evidence)
+        while question is not None:
+            chatbot.evidence[question["key"]] = rng.randint(0, 1)
+            question = get_next_question(chatbot.evidence)
+        return chatbot.diagnose()
+    return session
+
+
+@case("session_adaptive", iterations=300)
+def bench_session_adaptive():
+    """Como `session`, pero eligiendo las preguntas por ganancia de información con parada temprana."""
+    from chatbot import DiagnosticChatbot
+    from questions import get_adaptive_question
+
+    chatbot = DiagnosticChatbot()
+    rng = random.Random(SEED)
+
+    def session():
+        chatbot.evidence = {}
+        question = get_adaptive_question(chatbot.evidence, chatbot.bayesian_handler)
+        while question is not None:
+            chatbot.evidence[question["key"]] = rng.randint(0, 1)
+            question = get_adaptive_question(chatbot.evidence, chatbot.bayesian_handler)
+        return chatbot.diagnose()
+    return session
+
+
+@case("session_store_1k", iterations=20, warmup=1)
+def bench_session_store():
+    """1000 sesiones de 10 respuestas y diagnóstico final, hasta quedar guardadas en SQLite."""
+    import os
+    import tempfile
+
+    from session_store import SessionStore
+
+    store = SessionStore(os.path.join(tempfile.mkdtemp(), "sessions.db"))
+    posteriors = {"ignition_issue": 0.5, "battery_issue": 0.3, "tire_issue": 0.2}
+    state = {"round": 0}
+
+    def sessions():
+        state["round"] += 1
+        for i in range(1000):
+            session_id = f"{state['round']}-{i}"
+            for key in range(10):
+                store.record_answer(session_id, f"q{key}", key % 2, posteriors)
+            store.record_diagnosis(session_id, posteriors, ["Revisar pastillas y liquido de frenos"])
+        store.flush()
+    return sessions
+
+
+def run_case(setup, iterations, warmup):
+    """Mide latencias por operación y el pico de memoria (en una pasada aparte con tracemalloc).
+
+    Se mide al menos dos veces, que es lo mínimo que necesitan los percentiles.
+    """
+    iterations = max(iterations, 2)
+    operation = setup()
+    for _ in range(warmup):
+        operation()
+
+    gc.collect()
+    latencies = []
+    start_all = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - start_all
+
+    tracemalloc.start()
+    for _ in range(min(iterations, 50)):
+        operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "iterations": iterations,
+        "ops_per_s": iterations / elapsed,
+        "mean_s": statistics.fmean(latencies),
+        "p50_s": quantiles[49],
+        "p95_s": quantiles[94],
+        "p99_s": quantiles[98],
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compara la mediana de cada caso con la línea base; devuelve los casos que empeoraron más que `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        ratio = result["p50_s"] / reference["p50_s"]
+        status = "REGRESIÓN" if ratio > 1 + threshold else "ok"
+        print(f"  {name:<24} {ratio:6.2f}x de la línea base  {status}")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="casos a ejecutar (por defecto, todos)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica las iteraciones de cada caso")
+    parser.add_argument("--output", help="guarda los resultados en JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="empeoramiento tolerado de la mediana (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'caso':<24} {'ops/s':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'pico mem':>10}")
+    for name in args.cases or CASES:
+        setup, iterations, warmup = CASES[name]
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_case(setup, int(iterations * args.scale), warmup)
+        results[name] = result
+        print(f"{name:<24} {result['ops_per_s']:>10,.1f} {result['p50_s'] * 1e3:>8.3f}ms "
+              f"{result['p95_s'] * 1e3:>8.3f}ms {result['p99_s'] * 1e3:>8.3f}ms {result['peak_memory_kb']:>8.0f}KB")
+
+    if args.output:
+        import numpy
+        meta = {"python": sys.version.split()[0], "platform": platform.platform(), "numpy": numpy.__version__,
+                "seed": SEED, "scale": args.scale}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparación con {args.baseline} (umbral {args.threshold:.0%}):")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
-from rules import TroubleshootingExpert
-from bayesian_model import BayesianNetwork, VehicleDiagnosis
-from experta import Fact
+import argparse
+import sys
+
+import instrumentation
+from bayesian_model import VehicleDiagnosis
+from evidence import BitEvidence
 from rules import pass_evidence_to_engine
+from questions import CONFIDENCE_THRESHOLD, get_adaptive_question
 
 class DiagnosticChatbot:
     """Chatbot de diagnóstico con múltiples preguntas y análisis probabilístico."""
 
-    def __init__(self):
-        self.rule_engine = TroubleshootingExpert() 
-        self.bayesian_handler = BayesianNetwork() 
+    def __init__(self, snapshot=None):
         self.evidence = {}  
-        self.bayesian_handler = VehicleDiagnosis()
+        self.bayesian_handler = VehicleDiagnosis.from_snapshot(snapshot) if snapshot else VehicleDiagnosis()
 
     def ask_question(self, question, valid_responses=None):
         """Pregunta al usuario asegurando respuestas válidas."""
@@ -52,17 +54,29 @@ class DiagnosticChatbot:
             self.evidence['tire_wear'] = 1 if self.ask_question("¿Notas desgaste en las llantas?", ["si", "no"]) == "si" else 0
             self.evidence['steering_vibrates'] = 1 if self.ask_question("¿El volante vibra mientras conduces?", ["si", "no"]) == "si" else 0
 
+    def collect_adaptive_evidence(self, threshold=CONFIDENCE_THRESHOLD):
+        """Pregunta primero lo más informativo y se detiene cuando la falla más probable supera `threshold`."""
+        print("\nRespondamos algunas preguntas relacionadas con los síntomas.")
+        question = get_adaptive_question(self.evidence, self.bayesian_handler, threshold=threshold)
+        while question is not None:
+            self.evidence[question["key"]] = 1 if self.ask_question(question["text"], ["si", "no"]) == "si" else 0
+            question = get_adaptive_question(self.evidence, self.bayesian_handler, threshold=threshold)
+
     def diagnose(self):
         """Realiza el diagnóstico basado en las reglas y el análisis bayesiano."""
         print("\nIniciando el diagnóstico...")
 
+        # Las respuestas se juntan en un diccionario; el resto del diagnóstico usa la forma empaquetada.
+        evidence = BitEvidence.from_dict(self.evidence)
+
         print("\nEvaluando con el modelo bayesiano...")
-        bayesian_diagnosis = self.bayesian_handler.infer(self.evidence)
+        bayesian_diagnosis = self.bayesian_handler.infer(evidence)
         sorted_diagnosis = sorted(bayesian_diagnosis.items(), key=lambda x: x[1], reverse=True)
         top_three = sorted_diagnosis[:3]
 
         print("\nEvaluando con el motor de reglas...")
-        rule_based_diagnosis = pass_evidence_to_engine(self.evidence,bayesian_diagnosis)
+        # Las reglas reciben el diccionario, que conserva el orden de las respuestas.
+        rule_based_diagnosis = pass_evidence_to_engine(self.evidence, bayesian_diagnosis)
 
         print("\nResultados del diagnóstico:")
         print(f"- Diagnóstico basado en reglas: {rule_based_diagnosis}")
@@ -74,16 +88,55 @@ class DiagnosticChatbot:
         }
 
 
-    def run(self):
+    def run(self, adaptive=False, threshold=CONFIDENCE_THRESHOLD):
         """Ejecuta el chatbot."""
         print("Bienvenido al Chatbot de Diagnóstico de Vehículos.")
-        self.collect_bayesian_evidence() 
+        if adaptive:
+            self.collect_adaptive_evidence(threshold)
+        else:
+            self.collect_bayesian_evidence() 
         diagnosis_results = self.diagnose()  
         
 
 
-chatbot = DiagnosticChatbot()
-chatbot.run()
-
-
-
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chatbot de diagnóstico de vehículos.")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="elige las preguntas por ganancia de información y termina antes si el diagnóstico es claro")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD,
+                        help="probabilidad de la falla más probable para terminar en modo adaptativo")
+    parser.add_argument("--batch", metavar="ENTRADA",
+                        help="diagnostica sin preguntas los registros de un archivo JSONL/CSV ('-' para stdin)")
+    parser.add_argument("--output", default="-", help="archivo JSONL de salida ('-' para stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="formato de entrada (por defecto, según la extensión)")
+    parser.add_argument("--workers", type=int, help="procesos de trabajo (por defecto, uno por núcleo)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="registros por bloque enviado a cada proceso")
+    parser.add_argument("--max-in-flight", type=int, help="bloques pendientes como máximo (por defecto, 2 por proceso)")
+    parser.add_argument("--snapshot", help="carga el modelo desde un snapshot .npz en lugar de construirlo")
+    parser.add_argument("--rules", choices=["compiled", "experta"], default="compiled", help="motor de reglas")
+    args = parser.parse_args(argv)
+
+    if args.batch is None:
+        instrumentation.configure_from_env()
+        chatbot = DiagnosticChatbot(args.snapshot)
+        chatbot.run(args.adaptive, args.threshold)
+        return
+
+    from batch_diagnosis import run_batch
+
+    fmt = args.format or ("csv" if args.batch.endswith(".csv") else "jsonl")
+    input_stream = sys.stdin if args.batch == "-" else open(args.batch, newline="", encoding="utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        count = run_batch(input_stream, output_stream, fmt=fmt, workers=args.workers, chunk_size=args.chunk_size,
+                          max_in_flight=args.max_in_flight, snapshot=args.snapshot, backend=args.rules)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    print(f"{count} registros diagnosticados.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
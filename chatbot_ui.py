@@ -1,134 +1,57 @@
+import atexit
+import io
+import os
+import uuid
+
 import streamlit as st
-from rules import TroubleshootingExpert
-from bayesian_model import BayesianNetwork, VehicleDiagnosis
+
+import instrumentation
+from bayesian_model import INFERENCE_QUERIES, VehicleDiagnosis
+from evidence import BitEvidence
 from rules import pass_evidence_to_engine
-import matplotlib.pyplot as plt
+from questions import CONFIDENCE_THRESHOLD, QUESTIONS, find_question, get_adaptive_question, get_next_question
+from session_store import DEFAULT_PATH, SessionStore
 
 
 class DiagnosticChatbot:
     """Chatbot de diagnóstico con flujo condicional basado en evidencia."""
 
-    def __init__(self):
-        self.rule_engine = TroubleshootingExpert()
-        self.evidence = {}
-        self.bayesian_handler = VehicleDiagnosis()
-        self.questions = [
-            {
-                "key": "difficulty_starting",
-                "text": "¿Tu vehículo tiene dificultad para arrancar?",
-                "options": ["Sí", "No"],
-                "follow_up": [
-                    {
-                        "key": "battery_ok",
-                        "text": "¿La batería parece estar cargada?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("difficulty_starting") == 1
-                    },
-                    {
-                        "key": "starter_sound",
-                        "text": "¿Escuchas el sonido del motor de arranque?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("difficulty_starting") == 1
-                    },
-                    {
-                        "key": "fuel_smell",
-                        "text": "¿Notas olor a combustible?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("difficulty_starting") == 1
-                    }
-                ]
-            },
-            {
-                "key": "brake_issue",
-                "text": "¿Los frenos suenan raro al utilizarlos?",
-                "options": ["Sí", "No"],
-                "follow_up": [
-                    {
-                        "key": "brake_problem_frequency",
-                        "text": "¿El problema con los frenos ocurre frecuentemente?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("brake_issue") == 1
-                    },
-                    {
-                        "key": "noise_type",
-                        "text": "¿Los frenos funcionan con normalidad?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("brake_issue") == 1
-                    }
-                ]
-            },
-            {
-                "key": "overheating",
-                "text": "¿Tu vehículo se sobrecalienta?",
-                "options": ["Sí", "No"],
-                "follow_up": [
-                    {
-                        "key": "coolant_level",
-                        "text": "¿El nivel de refrigerante está bajo?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("overheating") == 1
-                    },
-                    {
-                        "key": "fan_function",
-                        "text": "¿El ventilador del radiador está funcionando?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("overheating") == 1
-                    },
-                    {
-                        "key": "leak_presence",
-                        "text": "¿Ves signos de fuga de refrigerante?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("overheating") == 1
-                    }
-                ]
-            },
-            {
-                "key": "vibrations",
-                "text": "¿Sientes vibraciones mientras conduces?",
-                "options": ["Sí", "No"],
-                "follow_up": [
-                    {
-                        "key": "speed_dependency",
-                        "text": "¿Las vibraciones aumentan con la velocidad?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("vibrations") == 1
-                    },
-                    {
-                        "key": "tire_wear",
-                        "text": "¿Notas desgaste en las llantas?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("vibrations") == 1
-                    },
-                    {
-                        "key": "steering_vibrates",
-                        "text": "¿El volante vibra mientras conduces?",
-                        "options": ["Sí", "No"],
-                        "condition": lambda e: e.get("vibrations") == 1
-                    }
-                ]
-            }
-        ]
+    def __init__(self, snapshot=None):
+        self.evidence = BitEvidence()
+        self.bayesian_handler = VehicleDiagnosis.from_snapshot(snapshot) if snapshot else VehicleDiagnosis()
+        self.questions = QUESTIONS
 
     def update_evidence(self, key, value):
-        self.evidence[key] = value
-        print("Evidencia actualizada:", self.evidence)
-
-    def diagnose(self, evidence=None):
-        """Realiza el diagnóstico basado en las reglas y el análisis bayesiano."""
-        self.evidence = st.session_state.evidence if evidence is None else evidence
-
-        print("Evidencia antes de diagnóstico:", self.evidence)
+        self.evidence = self.evidence.set(key, value)
+
+    def update_posteriors(self, posteriors, evidence, key):
+        """Posteriores en curso de la sesión tras agregar la respuesta `key`; reutiliza los del paso anterior."""
+        if posteriors is None:
+            return self.bayesian_handler.fault_posteriors(evidence)
+        return self.bayesian_handler.update_posteriors(posteriors, evidence, key)
+
+    def diagnose(self, evidence=None, posteriors=None, order=None):
+        """Realiza el diagnóstico basado en las reglas y el análisis bayesiano.
+
+        La instancia se comparte entre sesiones, así que la evidencia se toma de la
+        sesión actual (o del argumento) y no se guarda en `self`. Si se pasan los
+        posteriores ya calculados respuesta a respuesta, no se vuelve a inferir. Las
+        reglas se evalúan con el evaluador compilado, equivalente al motor de experta;
+        `order` son las variables en el orden en que se respondieron, que `BitEvidence` no
+        guarda y del que depende el orden de los diagnósticos por reglas.
+        """
+        evidence = st.session_state.evidence if evidence is None else evidence
 
-        if not self.evidence:
-            print("Error: No hay evidencia para diagnosticar.")
+        if not evidence:
+            instrumentation.event("empty_evidence")
             return {"rule_based": {}, "bayesian": {}}
 
-        bayesian_diagnosis = self.bayesian_handler.infer(self.evidence)
-        print("Diagnóstico bayesiano intermedio:", bayesian_diagnosis)
-
-        print("Evidencia enviada al motor de reglas:", self.evidence)
-        rule_based_diagnosis = pass_evidence_to_engine(self.evidence, bayesian_diagnosis)
-        print("Diagnóstico basado en reglas intermedio:", rule_based_diagnosis)
+        if posteriors is None:
+            bayesian_diagnosis = self.bayesian_handler.infer(evidence)
+        else:
+            bayesian_diagnosis = {query: posteriors[query] for query in INFERENCE_QUERIES if query in posteriors}
+        rule_evidence = evidence if order is None else {key: evidence[key] for key in order if key in evidence}
+        rule_based_diagnosis = pass_evidence_to_engine(rule_evidence, bayesian_diagnosis, backend="compiled")
 
         if isinstance(rule_based_diagnosis, list):
             sorted_rule_based = rule_based_diagnosis[:3]  
@@ -148,117 +71,196 @@ class DiagnosticChatbot:
         }
 
 
-    def get_next_question(self, evidence):
-        """Obtiene la siguiente pregunta en el flujo."""
-        for question in self.questions:
-            if question["key"] not in evidence:
-                return question
-            for follow_up in question.get("follow_up", []):
-                if follow_up["key"] not in evidence and follow_up["condition"](evidence):
-                    return follow_up
-        return None
-
-
-
-st.title("Chatbot de Diagnóstico de Vehículos 🚗")
-
-if "evidence" not in st.session_state:
-    st.session_state.evidence = {}
-if "chat_progress" not in st.session_state:
-    st.session_state.chat_progress = []
-
-chatbot = DiagnosticChatbot()
-
-progress = len(st.session_state.evidence) / len(chatbot.questions)
-progress = min(1.0, progress)
-st.progress(progress)
-
-for entry in st.session_state.chat_progress:
-    if entry['role'] == "Usuario":
-        st.markdown(f"<div style='background-color:#e0f7fa;padding:10px;border-radius:5px;margin-bottom:10px;'><strong>Usuario:</strong> {entry['text']}</div>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div style='background-color:#f9f9f9;padding:10px;border-radius:5px;margin-bottom:10px;'><strong>Chatbot:</strong> {entry['text']}</div>", unsafe_allow_html=True)
+    def get_next_question(self, evidence, adaptive=False, threshold=CONFIDENCE_THRESHOLD):
+        """Obtiene la siguiente pregunta en el flujo.
 
+        En modo adaptativo elige la pregunta más informativa según el modelo bayesiano y
+        termina en cuanto la falla más probable supera `threshold`.
+        """
+        if adaptive:
+            return get_adaptive_question(evidence, self.bayesian_handler, self.questions, threshold)
+        return get_next_question(evidence, self.questions)
 
 
-next_question = chatbot.get_next_question(st.session_state.evidence)
-if next_question:
-    with st.form(key=next_question["key"]):
-        st.write(next_question["text"])
-        response = st.radio("Selecciona una opción:", next_question["options"], key=f"response_{next_question['key']}")
-        submitted = st.form_submit_button("Responder")
+@st.cache_resource
+def get_chatbot():
+    """Construye una sola vez por proceso el modelo y el árbol de preguntas.
 
-        if submitted:
-            
-            st.session_state.evidence[next_question["key"]] = 1 if response == "Sí" else 0
-            chatbot.evidence = st.session_state.evidence
+    Si DIAGNOSIS_SNAPSHOT indica un snapshot .npz, el modelo se carga de ahí sin importar pgmpy.
+    """
+    return DiagnosticChatbot(os.environ.get("DIAGNOSIS_SNAPSHOT"))
 
-            print("Evidencia actualizada:", st.session_state.evidence)
 
-            st.session_state.chat_progress.append({"role": "Chatbot", "text": next_question["text"]})
-            st.session_state.chat_progress.append({"role": "Usuario", "text": response})
-            
+@st.cache_resource
+def get_session_store():
+    """Registro de sesiones compartido por el proceso; la ruta se toma de DIAGNOSIS_SESSION_DB."""
+    store = SessionStore(os.environ.get("DIAGNOSIS_SESSION_DB", DEFAULT_PATH))
+    atexit.register(store.close)
+    return store
 
-            st.session_state.evidence = chatbot.evidence
-            st.rerun()
 
-else:
-    st.write("## **Diagnóstico final**")
+def resume_session(store, session_id):
+    """Carga en `st.session_state` la evidencia y el historial de una sesión guardada."""
+    session = store.load_session(session_id)
+    if session is None:
+        return False
+    st.session_state.evidence = BitEvidence.from_dict(session["evidence"])
+    st.session_state.answer_order = list(session["evidence"])
+    st.session_state.chat_progress = []
+    for key, value in session["evidence"].items():
+        question = find_question(key)
+        st.session_state.chat_progress.append({"role": "Chatbot", "text": question["text"] if question else key})
+        st.session_state.chat_progress.append({"role": "Usuario", "text": "Sí" if value == 1 else "No"})
+    if session["finished"]:
+        st.session_state.diagnosis_recorded = st.session_state.evidence
+    return True
+
+
+@st.cache_data
+def render_bayesian_chart(labels, probs):
+    """Dibuja el gráfico de barras del diagnóstico bayesiano y lo devuelve como PNG."""
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig, ax = plt.subplots()
+    ax.barh(labels, probs, color="skyblue")
+    ax.set_xlabel("Probabilidad")
+    ax.set_title("Diagnóstico Bayesiano")
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def render_page():
+    """Dibuja la página completa; Streamlit la vuelve a ejecutar en cada interacción."""
+    st.title("Chatbot de Diagnóstico de Vehículos 🚗")
+
+    store = get_session_store()
+    if "session_id" not in st.session_state:
+        # Una sesión se retoma abriendo la página con ?session=<id>.
+        session_id = st.query_params.get("session")
+        if session_id is None or not resume_session(store, session_id):
+            session_id = uuid.uuid4().hex
+        st.session_state.session_id = session_id
+        st.query_params["session"] = session_id
+
+    if "evidence" not in st.session_state:
+        # Evidencia empaquetada en bits (ver `evidence.BitEvidence`): inmutable y hashable.
+        st.session_state.evidence = BitEvidence()
+    if "answer_order" not in st.session_state:
+        st.session_state.answer_order = list(st.session_state.evidence)
+    if "chat_progress" not in st.session_state:
+        st.session_state.chat_progress = []
+
+    chatbot = get_chatbot()
+
+    adaptive = st.sidebar.toggle("Preguntas adaptativas", help="Pregunta primero lo más informativo y termina antes si el diagnóstico ya es claro")
+    threshold = st.sidebar.slider("Confianza para terminar", 0.5, 0.99, CONFIDENCE_THRESHOLD, 0.01, disabled=not adaptive)
+
+    progress = len(st.session_state.evidence) / len(chatbot.questions)
+    progress = min(1.0, progress)
+    st.progress(progress)
+
+    # Posteriores en curso: se actualizan con cada respuesta y se recalculan solo si la
+    # evidencia de la sesión cambió por otro camino.
+    if st.session_state.get("posteriors_evidence") != st.session_state.evidence:
+        st.session_state.posteriors = chatbot.update_posteriors(None, st.session_state.evidence, None)
+        st.session_state.posteriors_evidence = st.session_state.evidence
+
+    st.sidebar.markdown("#### Diagnóstico en curso")
+    for issue, probability in sorted(st.session_state.posteriors.items(), key=lambda x: x[1], reverse=True)[:3]:
+        st.sidebar.markdown(f"- **{issue}**: {probability:.2f}")
+
+    for entry in st.session_state.chat_progress:
+        if entry['role'] == "Usuario":
+            st.markdown(f"<div style='background-color:#e0f7fa;padding:10px;border-radius:5px;margin-bottom:10px;'><strong>Usuario:</strong> {entry['text']}</div>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div style='background-color:#f9f9f9;padding:10px;border-radius:5px;margin-bottom:10px;'><strong>Chatbot:</strong> {entry['text']}</div>", unsafe_allow_html=True)
 
-# Establecer la evidencia para diagnóstico
-    chatbot.evidence = st.session_state.evidence
-    results = chatbot.diagnose()
 
-    # Mostrar diagnóstico basado en reglas con formato
-    st.write("### **Diagnóstico basado en reglas**:")
-    results["rule_based"]
 
-    # Separador visual
-    st.markdown("---")
+    next_question = chatbot.get_next_question(st.session_state.evidence, adaptive, threshold)
+    if next_question:
+        with st.form(key=next_question["key"]):
+            st.write(next_question["text"])
+            response = st.radio("Selecciona una opción:", next_question["options"], key=f"response_{next_question['key']}")
+            submitted = st.form_submit_button("Responder")
 
-    # Mostrar diagnóstico basado en modelo bayesiano con formato
-    st.write("### **Diagnóstico basado en modelo bayesiano**:")
-    if results["bayesian"]:
-        for diagnosis, probability in results["bayesian"]:
-            try:
-                # Intentar convertir la probabilidad a float y mostrarla
-                formatted_probability = float(probability)
-                st.markdown(f"- **{diagnosis}** - _Probabilidad_: {formatted_probability:.2f}")
-            except ValueError:
-                # Si la probabilidad no es un número, se muestra tal cual
-                st.markdown(f"- **{diagnosis}** - _Probabilidad_: {probability}")
-    else:
-        st.markdown("No se ha encontrado diagnóstico basado en el modelo bayesiano :warning:")
+            if submitted:
 
-    st.markdown("#### Diagnóstico basado en modelo bayesiano:")
-    probs = [prob for _, prob in results["bayesian"]]
-    labels = [diag for diag, _ in results["bayesian"]]
+                st.session_state.evidence = st.session_state.evidence.set(next_question["key"], 1 if response == "Sí" else 0)
+                st.session_state.answer_order.append(next_question["key"])
+                st.session_state.posteriors = chatbot.update_posteriors(
+                    st.session_state.posteriors, st.session_state.evidence, next_question["key"])
+                st.session_state.posteriors_evidence = st.session_state.evidence
+                store.record_answer(st.session_state.session_id, next_question["key"],
+                                    st.session_state.evidence[next_question["key"]], st.session_state.posteriors)
 
+                st.session_state.chat_progress.append({"role": "Chatbot", "text": next_question["text"]})
+                st.session_state.chat_progress.append({"role": "Usuario", "text": response})
 
-    if probs:
+                st.rerun()
 
-        fig, ax = plt.subplots()
-        ax.barh(labels, probs, color="skyblue")
-        ax.set_xlabel("Probabilidad")
-        ax.set_title("Diagnóstico Bayesiano")
-        st.pyplot(fig)
     else:
-        st.write("No hay diagnósticos bayesianos disponibles.")
+        st.write("## **Diagnóstico final**")
+
+        # El diagnóstico se calcula una sola vez por evidencia y se guarda en la sesión
+        evidence_snapshot = st.session_state.evidence
+        if st.session_state.get("diagnosis_evidence") != evidence_snapshot:
+            st.session_state.diagnosis = chatbot.diagnose(evidence_snapshot, st.session_state.posteriors,
+                                                          st.session_state.answer_order)
+            st.session_state.diagnosis_evidence = evidence_snapshot
+        if st.session_state.get("diagnosis_recorded") != evidence_snapshot:
+            store.record_diagnosis(st.session_state.session_id, st.session_state.posteriors,
+                                   st.session_state.diagnosis["rule_based"])
+            st.session_state.diagnosis_recorded = evidence_snapshot
+        results = st.session_state.diagnosis
+
+        # Mostrar diagnóstico basado en reglas con formato
+        st.write("### **Diagnóstico basado en reglas**:")
+        results["rule_based"]
+
+        # Separador visual
+        st.markdown("---")
+
+        # Mostrar diagnóstico basado en modelo bayesiano con formato
+        st.write("### **Diagnóstico basado en modelo bayesiano**:")
+        if results["bayesian"]:
+            for diagnosis, probability in results["bayesian"]:
+                try:
+                    # Intentar convertir la probabilidad a float y mostrarla
+                    formatted_probability = float(probability)
+                    st.markdown(f"- **{diagnosis}** - _Probabilidad_: {formatted_probability:.2f}")
+                except ValueError:
+                    # Si la probabilidad no es un número, se muestra tal cual
+                    st.markdown(f"- **{diagnosis}** - _Probabilidad_: {probability}")
+        else:
+            st.markdown("No se ha encontrado diagnóstico basado en el modelo bayesiano :warning:")
 
+        st.markdown("#### Diagnóstico basado en modelo bayesiano:")
+        probs = tuple(float(prob) for _, prob in results["bayesian"])
+        labels = tuple(diag for diag, _ in results["bayesian"])
 
-    st.markdown("---")
-    st.write("👨‍🔧 **¡Recuerda que este diagnóstico es solo informativo! Para un diagnóstico preciso, te recomendamos visitar un mecánico especializado.**")
 
-    st.markdown(
-        """
-        <div style="background-color: #f2f2f2; padding: 10px; border-radius: 5px;">
-            <h4 style="color: #333333;">Consejo:</h4>
-            <p style="color: #666666;">Si tu vehículo muestra síntomas graves, considera llevarlo a un especialista cuanto antes. 🚗⚠️</p>
-        </div>
-        """, unsafe_allow_html=True
-    )
+        if probs:
+            st.image(render_bayesian_chart(labels, probs))
+        else:
+            st.write("No hay diagnósticos bayesianos disponibles.")
 
 
+        st.markdown("---")
+        st.write("👨‍🔧 **¡Recuerda que este diagnóstico es solo informativo! Para un diagnóstico preciso, te recomendamos visitar un mecánico especializado.**")
 
+        st.markdown(
+            """
+            <div style="background-color: #f2f2f2; padding: 10px; border-radius: 5px;">
+                <h4 style="color: #333333;">Consejo:</h4>
+                <p style="color: #666666;">Si tu vehículo muestra síntomas graves, considera llevarlo a un especialista cuanto antes. 🚗⚠️</p>
+            </div>
+            """, unsafe_allow_html=True
+        )
 
 
+instrumentation.configure_from_env()
+with instrumentation.span("ui_rerun"):
+    render_page()
@@ -0,0 +1,143 @@
+import numpy as np
+
+import instrumentation
+from evidence import EVIDENCE_VARIABLES, BitEvidence
+
+# Orden fijo de las variables de evidencia que usan las reglas (el del cuestionario); es el
+# mismo índice de bits de `evidence.BitEvidence`.
+RULE_VARIABLES = EVIDENCE_VARIABLES
+
+# Tabla de decisión equivalente a `TroubleshootingExpert`. Cada grupo se activa cuando su
+# variable disparadora vale 1 (las reglas `set_symptom_*`) y agrega como mucho uno de sus
+# diagnósticos, cuyas condiciones son excluyentes entre sí. Los nombres son los de las
+# reglas de experta, para que los contadores de disparos usen las mismas claves.
+#
+# Se replica el comportamiento efectivo del motor de experta:
+# - `set_symptom_overheating` está definida dos veces y la segunda (vibraciones) reemplaza a
+#   la primera, así que el síntoma "overheating" nunca se declara y las reglas del radiador
+#   no se disparan.
+# - `pass_evidence_to_engine` declara las probabilidades como `issue_prob`, por lo que las
+#   reglas `*_from_bayesian` (que esperan `battery_issue_prob`, etc.) tampoco se disparan.
+RULE_GROUPS = [
+    ('difficulty_starting', 'set_symptom_difficulty_starting', [
+        ('diagnose_ignition', {'battery_ok': 1, 'starter_sound': 0, 'fuel_smell': 0}, "Problema en el sistema de encendido (bujías, cables)"),
+        ('diagnose_battery', {'battery_ok': 0, 'starter_sound': 0, 'fuel_smell': 0}, "La batería está descargada o desconectada"),
+    ]),
+    ('brake_issue', 'set_symptom_brake_issue', [
+        ('diagnose_brakes', {'brake_problem_frequency': 1, 'noise_type': 1}, "Revisar pastillas y liquido de frenos"),
+        ('diagnose_brakes2', {'brake_problem_frequency': 1, 'noise_type': 0}, "Acudir al mecanico para diagnosticar problema en los frenos"),
+    ]),
+    ('vibrations', 'set_symptom_overheating', [
+        ('diagnose_tires_or_alignment', {'speed_dependency': 1, 'tire_wear': 0, 'steering_vibrates': 1}, "Desbalanceo de ruedas, llevar al mecanico para un balanceo"),
+        ('diagnose_tires_or_alignment2', {'speed_dependency': 1, 'tire_wear': 1, 'steering_vibrates': 0}, "Desgate grave en las llantas, cambielas y reduzca la velocidad"),
+    ]),
+]
+
+NO_DIAGNOSIS = -1
+
+
+def encode_evidence(evidence):
+    """Codifica un diccionario de evidencia como (máscara de observadas, máscara de valores en 1)."""
+    if isinstance(evidence, BitEvidence):
+        return evidence.observed, evidence.values
+    observed = 0
+    values = 0
+    for i, variable in enumerate(RULE_VARIABLES):
+        value = evidence.get(variable)
+        if value == 0 or value == 1:
+            observed |= 1 << i
+            if value == 1:
+                values |= 1 << i
+    return observed, values
+
+
+class CompiledRuleMatcher:
+    """Evaluador de reglas compilado a máscaras de bits; alternativa al motor de experta."""
+
+    def __init__(self, groups=RULE_GROUPS):
+        self.diagnoses = []
+        self.rule_names = []
+        self.triggers = []
+        self.trigger_rules = []
+        self.rules = []
+        bit = {variable: 1 << i for i, variable in enumerate(RULE_VARIABLES)}
+
+        for trigger, trigger_rule, rules in groups:
+            self.triggers.append(trigger)
+            self.trigger_rules.append(trigger_rule)
+            compiled = []
+            for name, conditions, diagnosis in rules:
+                care = bit[trigger]
+                expected = bit[trigger]
+                for variable, value in conditions.items():
+                    care |= bit[variable]
+                    if value:
+                        expected |= bit[variable]
+                compiled.append((care, expected, len(self.diagnoses)))
+                self.diagnoses.append(diagnosis)
+                self.rule_names.append(name)
+            self.rules.append(compiled)
+
+    def _match_group(self, group, observed, values):
+        for care, expected, code in self.rules[group]:
+            if observed & care == care and values & care == expected:
+                return code
+        return NO_DIAGNOSIS
+
+    def evaluate(self, evidence):
+        """Devuelve la lista de diagnósticos en el mismo orden que `TroubleshootingExpert.get_diagnosis()`.
+
+        experta dispara primero los síntomas declarados más recientemente, así que los grupos
+        se recorren en orden inverso a la posición de su variable disparadora en `evidence`.
+        Una `BitEvidence` se recorre en el orden del cuestionario (ver `pass_evidence_to_engine`).
+        """
+        observed, values = encode_evidence(evidence)
+        position = {variable: i for i, variable in enumerate(evidence)}
+        order = sorted((group for group, trigger in enumerate(self.triggers) if trigger in position),
+                       key=lambda group: position[self.triggers[group]], reverse=True)
+
+        counting = instrumentation.enabled()
+        result = []
+        for group in order:
+            code = self._match_group(group, observed, values)
+            if counting and values >> RULE_VARIABLES.index(self.triggers[group]) & 1:
+                instrumentation.count("rule_fired", self.trigger_rules[group])
+            if code != NO_DIAGNOSIS:
+                if counting:
+                    instrumentation.count("rule_fired", self.rule_names[code])
+                result.append(self.diagnoses[code])
+        return result
+
+    def match_batch(self, evidence):
+        """Evalúa una matriz N x 15 (columnas en `RULE_VARIABLES`, -1 = sin respuesta).
+
+        Devuelve una matriz N x grupos con el código del diagnóstico de cada grupo
+        (índice en `self.diagnoses`) o `NO_DIAGNOSIS`.
+        """
+        evidence = np.asarray(evidence)
+        weights = np.left_shift(np.int64(1), np.arange(len(RULE_VARIABLES), dtype=np.int64))
+        observed = ((evidence == 0) | (evidence == 1)) @ weights
+        values = (evidence == 1) @ weights
+
+        codes = np.full((len(evidence), len(self.rules)), NO_DIAGNOSIS, dtype=np.int16)
+        for group, rules in enumerate(self.rules):
+            for care, expected, code in reversed(rules):
+                matched = (observed & care == care) & (values & care == expected)
+                codes[matched, group] = code
+        return codes
+
+    def evaluate_many(self, evidence):
+        """Igual que `evaluate` para cada fila de una matriz N x 15, con las columnas en el orden del cuestionario."""
+        codes = self.match_batch(evidence)[:, ::-1]
+        return [[self.diagnoses[code] for code in row if code != NO_DIAGNOSIS] for row in codes.tolist()]
+
+
+def evidence_rows(evidences):
+    """Convierte una lista de diccionarios de evidencia en una matriz N x 15 para `match_batch`."""
+    matrix = np.full((len(evidences), len(RULE_VARIABLES)), -1, dtype=np.int8)
+    for row, evidence in enumerate(evidences):
+        for column, variable in enumerate(RULE_VARIABLES):
+            if variable in evidence:
+                matrix[row, column] = evidence[variable]
+    return matrix
+
@@ -0,0 +1,214 @@
+"""Aprende los CPDs de la red a partir de casos históricos con fallas confirmadas.
+
+Cada archivo se lee por bloques y solo se acumulan conteos por configuración de padres,
+así que la memoria no depende de la cantidad de filas. Los archivos se cuentan en
+paralelo (uno por proceso) y los conteos se suman al final.
+
+Ejemplos:
+    python cpd_learning.py historial-*.csv --output cpds_aprendidos.npz --pseudocount 1
+    python cpd_learning.py parte-01.csv --counts-only --output conteos-01.npz
+    python cpd_learning.py --merge conteos-*.npz --output cpds_aprendidos.npz
+
+Columnas: una por variable de la red, con el estado observado (0, 1, ...) o vacía si no
+se registró. Además de CSV se aceptan archivos .npz con las matrices `columns` y `data`;
+`data` también se lee por bloques, sin cargarla entera (comprimida o no).
+"""
+import argparse
+import csv
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CHUNK_SIZE = 100_000
+
+# Valor de las celdas sin dato en las matrices de casos.
+MISSING = -1
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Devuelve los nombres de columna y un iterador de matrices int8 de hasta `chunk_size` filas."""
+    if str(path).endswith(".npz"):
+        with np.load(path, allow_pickle=False) as data:
+            columns = [str(column) for column in data["columns"]]
+        return columns, _npz_chunks(path, "data", chunk_size)
+
+    stream = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(stream)
+    columns = next(reader)
+
+    def chunks():
+        with stream:
+            while True:
+                rows = [row for _, row in zip(range(chunk_size), reader)]
+                if not rows:
+                    return
+                yield _parse_cells(np.array(rows, dtype=str))
+    return columns, chunks()
+
+
+def _npz_chunks(path, name, chunk_size):
+    """Lee la matriz `name` de un .npz directamente del miembro del zip, `chunk_size` filas por vez."""
+    with zipfile.ZipFile(path) as archive, archive.open(f"{name}.npy") as stream:
+        read_header = np.lib.format.read_array_header_1_0 if np.lib.format.read_magic(stream) == (1, 0) \
+            else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(stream)
+        if fortran_order or len(shape) != 2 or dtype.hasobject:
+            raise ValueError(f"`{name}` en {path} debe ser una matriz 2D en orden C")
+        row_bytes = shape[1] * dtype.itemsize
+        for start in range(0, shape[0], chunk_size):
+            rows = min(chunk_size, shape[0] - start)
+            yield np.frombuffer(stream.read(rows * row_bytes), dtype=dtype).reshape(rows, shape[1])
+
+
+def _parse_cells(cells):
+    """Convierte una matriz de texto en int8, con las celdas vacías como `MISSING`."""
+    if cells.dtype.itemsize == 4:
+        # Todas las celdas tienen como mucho un carácter: se decodifican como dígitos sin
+        # pasar por la conversión de texto a entero de NumPy, que es mucho más lenta.
+        codes = cells.view(np.uint32).reshape(cells.shape).astype(np.int16)
+        digits = codes - ord("0")
+        if np.any((codes != 0) & ((digits < 0) | (digits > 9))):
+            raise ValueError("El archivo contiene celdas que no son estados enteros")
+        return np.where(codes == 0, MISSING, digits).astype(np.int8)
+    return np.where(cells == "", str(MISSING), cells).astype(np.int8)
+
+
+class SufficientStatistics:
+    """Conteos de cada variable por configuración de sus padres, acumulables por bloques y combinables."""
+
+    def __init__(self, structure):
+        self.structure = structure
+        self.counts = {cpd["variable"]: np.zeros([cpd["variable_card"]] + list(cpd["evidence_card"]), dtype=np.int64)
+                       for cpd in structure}
+        self.rows = 0
+
+    def update(self, columns, chunk):
+        """Suma los conteos de un bloque de casos; cada familia usa solo las filas donde está completa."""
+        position = {column: i for i, column in enumerate(columns)}
+        chunk = np.asarray(chunk)
+        self.rows += len(chunk)
+        for cpd in self.structure:
+            family = [cpd["variable"]] + list(cpd["evidence"])
+            if any(variable not in position for variable in family):
+                continue
+            values = chunk[:, [position[variable] for variable in family]].astype(np.intp)
+            shape = self.counts[cpd["variable"]].shape
+            complete = ((values >= 0) & (values < np.array(shape))).all(axis=1)
+            index = np.ravel_multi_index(values[complete].T, shape)
+            self.counts[cpd["variable"]] += np.bincount(index, minlength=int(np.prod(shape))).reshape(shape)
+
+    def merge(self, other):
+        """Suma los conteos de otro objeto con la misma estructura."""
+        for variable, counts in other.counts.items():
+            self.counts[variable] += counts
+        self.rows += other.rows
+        return self
+
+    def to_cpds(self, pseudocount=0.0):
+        """Estima los CPDs como matrices con el formato de `TabularCPD` (estado x configuración de padres).
+
+        Con `pseudocount=0` es la estimación de máxima verosimilitud; con un valor positivo,
+        la media posterior con un prior de Dirichlet simétrico. Las configuraciones de padres
+        sin casos (y sin pseudoconteo) quedan uniformes.
+        """
+        cpds = {}
+        for variable, counts in self.counts.items():
+            columns = counts.reshape(counts.shape[0], -1) + pseudocount
+            totals = columns.sum(axis=0)
+            cpds[variable] = np.where(totals > 0, columns / np.where(totals > 0, totals, 1), 1 / counts.shape[0])
+        return cpds
+
+    def unseen_configurations(self):
+        """Cantidad de configuraciones de padres sin ningún caso, por variable."""
+        return {variable: int((counts.reshape(counts.shape[0], -1).sum(axis=0) == 0).sum())
+                for variable, counts in self.counts.items()}
+
+    def save(self, path):
+        np.savez(path, meta=np.array(json.dumps({"structure": self.structure, "rows": self.rows})),
+                 **{f"counts/{variable}": counts for variable, counts in self.counts.items()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            statistics = cls(meta["structure"])
+            for variable in statistics.counts:
+                statistics.counts[variable] += data[f"counts/{variable}"]
+        statistics.rows = meta["rows"]
+        return statistics
+
+
+def count_file(path, structure, chunk_size=CHUNK_SIZE):
+    """Cuenta un archivo completo leyéndolo por bloques."""
+    statistics = SufficientStatistics(structure)
+    columns, chunks = read_chunks(path, chunk_size)
+    for chunk in chunks:
+        statistics.update(columns, chunk)
+    return statistics
+
+
+def count_files(paths, structure, workers=None, chunk_size=CHUNK_SIZE):
+    """Cuenta varios archivos en paralelo, uno por proceso, y combina los conteos."""
+    statistics = SufficientStatistics(structure)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        for path in paths:
+            statistics.merge(count_file(path, structure, chunk_size))
+        return statistics
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(count_file, paths, [structure] * len(paths), [chunk_size] * len(paths)):
+            statistics.merge(partial)
+    return statistics
+
+
+def save_cpds(path, cpds):
+    """Guarda los CPDs aprendidos para `VehicleDiagnosis(cpds=...)` o `VehicleDiagnosis.set_cpds`."""
+    np.savez(path, **{f"cpd/{variable}": values for variable, values in cpds.items()})
+
+
+def load_cpds(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {name.split("/", 1)[1]: data[name] for name in data.files if name.startswith("cpd/")}
+
+
+def default_structure():
+    """Estructura de la red de `VehicleDiagnosis`."""
+    from bayesian_model import VehicleDiagnosis
+    return VehicleDiagnosis().network_structure()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="archivos de casos (CSV o .npz)")
+    parser.add_argument("--merge", nargs="+", default=[], metavar="CONTEOS", help="conteos guardados con --counts-only")
+    parser.add_argument("--output", required=True, help="archivo .npz de salida")
+    parser.add_argument("--counts-only", action="store_true", help="guarda los conteos en lugar de los CPDs")
+    parser.add_argument("--pseudocount", type=float, default=0.0, help="prior de Dirichlet (0 = máxima verosimilitud)")
+    parser.add_argument("--workers", type=int, help="procesos para contar archivos en paralelo")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="filas por bloque")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.merge:
+        parser.error("indique archivos de casos o --merge")
+
+    partials = [SufficientStatistics.load(path) for path in args.merge]
+    structure = partials[0].structure if partials else default_structure()
+    statistics = count_files(args.inputs, structure, args.workers, args.chunk_size) if args.inputs \
+        else SufficientStatistics(structure)
+    for partial in partials:
+        statistics.merge(partial)
+
+    if args.counts_only:
+        statistics.save(args.output)
+    else:
+        save_cpds(args.output, statistics.to_cpds(args.pseudocount))
+    unseen = {variable: n for variable, n in statistics.unseen_configurations().items() if n}
+    print(f"{statistics.rows} casos contados.")
+    if unseen:
+        print(f"Configuraciones de padres sin casos: {unseen}")
+
+
+if __name__ == "__main__":
+    main()
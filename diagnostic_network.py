@@ -0,0 +1,209 @@
+"""Redes de diagnóstico definidas de forma declarativa, con variables de varios estados.
+
+Una especificación es un diccionario (o un archivo JSON) con esta forma:
+
+    {
+        "variables": [
+            {"name": "noise_type", "states": ["ninguno", "chirrido", "roce", "clic"],
+             "text": "¿Qué ruido hacen los frenos?", "cpd": [0.4, 0.3, 0.2, 0.1]},
+            {"name": "brake_issue", "states": ["no", "si"],
+             "parents": ["noise_type"], "cpd": [[0.9, 0.6, 0.3, 0.7], [0.1, 0.4, 0.7, 0.3]]},
+            ...
+        ],
+        "observable": ["noise_type", ...],
+        "faults": ["brake_issue", ...]
+    }
+
+`cpd` tiene una fila por estado y una columna por combinación de estados de los padres
+(el primer padre varía más lento), igual que `TabularCPD`. En las fallas, el primer
+estado es "sin falla".
+"""
+import json
+
+import numpy as np
+
+import instrumentation
+from elimination import EliminationPlanner
+from posterior_cache import PosteriorCache, evidence_key
+from sampling import LikelihoodWeighting
+
+
+def load_spec(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def validate_spec(spec):
+    """Comprueba nombres, padres, formas de los CPDs, que cada columna sume 1 y que no haya ciclos."""
+    variables = {variable["name"]: variable for variable in spec["variables"]}
+    if len(variables) != len(spec["variables"]):
+        raise ValueError("Hay variables con el mismo nombre")
+
+    for name, variable in variables.items():
+        parents = variable.get("parents", [])
+        for parent in parents:
+            if parent not in variables:
+                raise ValueError(f"{name}: el padre {parent} no está definido")
+        shape = (len(variable["states"]), int(np.prod([len(variables[parent]["states"]) for parent in parents])))
+        values = np.asarray(variable["cpd"], dtype=float).reshape(len(variable["states"]), -1)
+        if values.shape != shape:
+            raise ValueError(f"{name}: el CPD debe tener forma {shape}, tiene {values.shape}")
+        if not np.allclose(values.sum(axis=0), 1.0, atol=1e-6):
+            raise ValueError(f"{name}: las columnas del CPD deben sumar 1")
+
+    for group in ("observable", "faults"):
+        for name in spec.get(group, []):
+            if name not in variables:
+                raise ValueError(f"{group}: {name} no está definida")
+
+    # Orden topológico de Kahn; si no se pueden ordenar todas, hay un ciclo.
+    children = {name: [] for name in variables}
+    indegree = {name: len(variable.get("parents", [])) for name, variable in variables.items()}
+    for name, variable in variables.items():
+        for parent in variable.get("parents", []):
+            children[parent].append(name)
+    ready = [name for name, degree in indegree.items() if degree == 0]
+    ordered = 0
+    while ready:
+        name = ready.pop()
+        ordered += 1
+        for child in children[name]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if ordered != len(variables):
+        raise ValueError("La red tiene ciclos")
+
+
+def random_spec(n_nodes, seed=0, max_parents=3, max_states=4, window=25):
+    """Red aleatoria en capas para pruebas de escala.
+
+    Cada nodo toma hasta `max_parents` padres entre los `window` nodos anteriores, como en
+    un catálogo donde cada síntoma depende de pocos componentes cercanos. La primera mitad
+    de los nodos sin hijos se marcan como observables y el resto de los nodos con padres
+    como fallas.
+    """
+    rng = np.random.default_rng(seed)
+    variables = []
+    for i in range(n_nodes):
+        states = [f"s{k}" for k in range(int(rng.integers(2, max_states + 1)))]
+        candidates = list(range(max(0, i - window), i))
+        count = min(len(candidates), int(rng.integers(0, max_parents + 1)))
+        parents = [variables[j]["name"] for j in sorted(rng.choice(candidates, size=count, replace=False))] if count else []
+        columns = int(np.prod([len(variables[int(p[1:])]["states"]) for p in parents]))
+        cpd = rng.dirichlet(np.ones(len(states)), size=columns).T
+        variables.append({"name": f"v{i}", "states": states, "parents": parents, "cpd": cpd.tolist()})
+
+    has_children = {parent for variable in variables for parent in variable["parents"]}
+    leaves = [variable["name"] for variable in variables if variable["name"] not in has_children]
+    observable = leaves[:len(leaves) // 2] + [variable["name"] for variable in variables if not variable["parents"]]
+    faults = [variable["name"] for variable in variables if variable["parents"] and variable["name"] not in observable]
+    return {"variables": variables, "observable": observable, "faults": faults}
+
+
+class DiagnosticNetwork:
+    """Red de diagnóstico construida desde una especificación, sin pgmpy.
+
+    Ofrece la misma interfaz que usan el cuestionario y los chatbots con `VehicleDiagnosis`
+    (`infer`, `diagnose_vehicle`, `fault_posteriors`, `update_posteriors`,
+    `question_gains`), con inferencia exacta por eliminación de variables y planes
+    guardados por patrón de evidencia. La evidencia puede darse como índice de estado o
+    como nombre de estado.
+    """
+
+    def __init__(self, spec, cache_size=1024, plan_cache_size=4096):
+        validate_spec(spec)
+        with instrumentation.span("model_build", source="spec", variables=len(spec["variables"])):
+            self.spec = spec
+            self.states = {variable["name"]: list(variable["states"]) for variable in spec["variables"]}
+            self.observable_variables = list(spec.get("observable", []))
+            self.fault_variables = list(spec.get("faults", []))
+            cardinality = {name: len(states) for name, states in self.states.items()}
+            factors = []
+            for variable in spec["variables"]:
+                parents = variable.get("parents", [])
+                shape = [cardinality[variable["name"]]] + [cardinality[parent] for parent in parents]
+                factors.append(([variable["name"]] + parents, np.asarray(variable["cpd"], dtype=float).reshape(shape)))
+            self.planner = EliminationPlanner(factors, cardinality, plan_cache_size)
+            self.sampler = LikelihoodWeighting(factors, cardinality)
+            self.cache = PosteriorCache(cache_size)
+
+    def encode_evidence(self, evidence):
+        """Convierte nombres de estado en índices; los índices se dejan como están."""
+        encoded = {}
+        for variable, value in evidence.items():
+            states = self.states.get(variable)
+            if states is None:
+                raise ValueError(f"Node {variable} not in graph")
+            encoded[variable] = states.index(value) if isinstance(value, str) else int(value)
+        return encoded
+
+    def distributions(self, variables, evidence):
+        """Distribución posterior completa de cada variable pedida."""
+        evidence = self.encode_evidence(evidence)
+        with instrumentation.span("inference", method="elimination", queries=len(variables)):
+            return self.planner.query(variables, evidence)
+
+    def sample_distributions(self, variables, evidence, samples=None, time_budget=None, seed=None):
+        """Como `distributions`, pero aproximado por muestreo; devuelve un `sampling.SamplingResult`."""
+        evidence = self.encode_evidence(evidence)
+        with instrumentation.span("inference", method="sampling", queries=len(variables)):
+            return self.sampler.run(variables, evidence, samples, time_budget, seed=seed)
+
+    def fault_posteriors(self, evidence):
+        """P(falla en un estado distinto de "sin falla" | evidencia) para las fallas no observadas."""
+        evidence = self.encode_evidence(evidence)
+        faults = tuple(fault for fault in self.fault_variables if fault not in evidence)
+
+        def compute():
+            with instrumentation.span("inference", method="elimination", queries=len(faults)):
+                marginals = self.planner.query(faults, evidence)
+            return {fault: float(1 - marginals[fault][0]) for fault in faults}
+        return dict(self.cache.get_or_compute(("faults", evidence_key(evidence)), compute))
+
+    def infer(self, evidence):
+        return self.fault_posteriors(evidence)
+
+    def update_posteriors(self, posteriors, evidence, variable):
+        # Los planes ya están en caché, así que recalcular todo es tan barato como actualizar.
+        return self.fault_posteriors(evidence)
+
+    def diagnose_vehicle(self, evidence):
+        result = self.fault_posteriors(evidence)
+        most_probable_issue = max(result, key=result.get) if result else "Unknown"
+        return {"issue": most_probable_issue, "probability": result.get(most_probable_issue, 0)}
+
+    def question_gains(self, evidence, candidates):
+        """Reducción esperada de la entropía de las fallas no observadas al preguntar cada candidata.
+
+        Igual que `VehicleDiagnosis.question_gains`, pero con entropías categóricas y
+        promediando sobre todos los estados de la candidata.
+        """
+        evidence = self.encode_evidence(evidence)
+        faults = [fault for fault in self.fault_variables if fault not in evidence]
+        candidates = [candidate for candidate in candidates if candidate in self.states and candidate not in evidence]
+
+        def entropy(marginals):
+            total = 0.0
+            for distribution in marginals.values():
+                p = np.clip(distribution, 1e-12, 1.0)
+                total -= float((p * np.log2(p)).sum())
+            return total
+
+        current = entropy(self.planner.query(faults, evidence))
+        predictive = self.planner.query(candidates, evidence)
+        gains = {}
+        for candidate in candidates:
+            remaining = [fault for fault in faults if fault != candidate]
+            expected = 0.0
+            for state, weight in enumerate(predictive[candidate]):
+                if weight > 1e-12:
+                    expected += weight * entropy(self.planner.query(remaining, {**evidence, candidate: state}))
+            gains[candidate] = current - expected
+        return gains
+
+    def questions(self):
+        """Preguntas del cuestionario (formato de `questions.QUESTIONS`) para las variables observables."""
+        variables = {variable["name"]: variable for variable in self.spec["variables"]}
+        return [{"key": name, "text": variables[name].get("text", f"¿{name}?"), "options": self.states[name]}
+                for name in self.observable_variables]
@@ -0,0 +1,355 @@
+import heapq
+
+import numpy as np
+
+from evidence import _is_state
+from junction_tree import _einsum
+from posterior_cache import PosteriorCache
+
+
+class EliminationPlan:
+    """Pasos de eliminación para una variable consultada y un conjunto de variables observadas.
+
+    `reductions` indica, para cada factor que interviene, qué ejes se fijan con la evidencia;
+    `steps` son las contracciones en el orden de eliminación elegido. Ejecutar un plan solo
+    indexa los factores y llama a `einsum`.
+    """
+
+    __slots__ = ("query", "reductions", "steps", "width")
+
+    def __init__(self, query, reductions, steps, width):
+        self.query = query
+        self.reductions = reductions
+        self.steps = steps
+        self.width = width
+
+    def run(self, factors, evidence):
+        slots = []
+        for factor, axes in self.reductions:
+            values = factors[factor][1]
+            if axes is not None:
+                values = values[tuple(slice(None) if variable is None else evidence[variable] for variable in axes)]
+            slots.append(values)
+        for operands, labels, output in self.steps:
+            arguments = []
+            for slot, slot_labels in zip(operands, labels):
+                arguments += [slots[slot], slot_labels]
+            slots.append(_einsum(*arguments, output))
+        marginal = slots[-1]
+        return marginal / marginal.sum()
+
+
+class MapPlan:
+    """Pasos para la asignación conjunta más probable (MAP) de un conjunto de variables.
+
+    Primero se suman las variables que no están en la consulta (`sum_steps`, igual que en
+    `EliminationPlan`); lo que queda son factores sobre las variables consultadas, que se
+    eliminan por máximo guardando el argmax de cada paso (`max_steps`) para reconstruir la
+    asignación en orden inverso. Los factores que quedan después de la suma también dan
+    la probabilidad de la evidencia, con la que se normaliza.
+    """
+
+    __slots__ = ("variables", "reductions", "sum_steps", "slots", "max_steps", "width", "einsum")
+
+    def __init__(self, variables, reductions, sum_steps, slots, max_steps, width):
+        # Las etiquetas se renumeran una vez aquí para llamar a `np.einsum` sin reindexar
+        # en cada paso; solo si el plan usa más variables de las que admite se usa `_einsum`.
+        dense = {}
+        for _, operand_labels, output in sum_steps:
+            for labels in (*operand_labels, output):
+                for label in labels:
+                    dense.setdefault(label, len(dense))
+        for _, labels in slots:
+            for label in labels:
+                dense.setdefault(label, len(dense))
+
+        def relabel(labels):
+            return [dense[label] for label in labels]
+
+        self.variables = variables
+        self.reductions = reductions
+        self.sum_steps = [(operands, [relabel(l) for l in labels], relabel(output)) for operands, labels, output in sum_steps]
+        # (slot, etiquetas) de cada factor que sobrevive a la fase de suma.
+        self.slots = [(slot, relabel(labels)) for slot, labels in slots]
+        # (variable, etiqueta, operandos, etiquetas de cada operando, etiquetas de salida, slot de salida).
+        self.max_steps = [(variable, dense[label], operands, [relabel(l) for l in labels], relabel(output), result)
+                          for variable, label, operands, labels, output, result in max_steps]
+        self.width = width
+        self.einsum = np.einsum if len(dense) <= 52 else _einsum
+
+    def _summed(self, factors, evidence):
+        slots = []
+        for factor, axes in self.reductions:
+            values = factors[factor][1]
+            if axes is not None:
+                values = values[tuple(slice(None) if variable is None else evidence[variable] for variable in axes)]
+            slots.append(values)
+        for operands, labels, output in self.sum_steps:
+            arguments = []
+            for slot, slot_labels in zip(operands, labels):
+                arguments += [slots[slot], slot_labels]
+            slots.append(self.einsum(*arguments, output))
+        return {slot: slots[slot] for slot, _ in self.slots}
+
+    def _maximize(self, summed, masks):
+        # `masks` restringe los estados permitidos de algunas variables: {etiqueta: vector booleano}.
+        slots = dict(summed)
+        for label, mask in masks.items():
+            slot, labels = next((slot, labels) for slot, labels in self.slots if label in labels)
+            slots[slot] = slots[slot] * mask.reshape([-1 if l == label else 1 for l in labels])
+        backpointers = []
+        for variable, label, operands, labels, output, result in self.max_steps:
+            arguments = []
+            for slot, slot_labels in zip(operands, labels):
+                arguments += [slots.pop(slot), slot_labels]
+            joint = self.einsum(*arguments, output + [label])
+            backpointers.append((variable, label, output, joint.argmax(axis=-1)))
+            slots[result] = joint.max(axis=-1)
+        value = float(np.prod([float(values) for values in slots.values()]))
+
+        states = {}
+        for variable, label, output, argmax in reversed(backpointers):
+            states[label] = int(argmax[tuple(states[l] for l in output)])
+        return {variable: states[label] for variable, label, *_ in self.max_steps}, value
+
+    def run(self, factors, evidence, k=1):
+        """Las `k` asignaciones más probables, de mayor a menor, como [(asignación, P(asignación | evidencia))].
+
+        Para `k > 1` se particiona el espacio de asignaciones a partir de cada solución
+        (Lawler y Murty): cada subproblema fija un prefijo de la solución y prohíbe el
+        estado siguiente, y se resuelve repitiendo solo la fase de máximo. Se omiten las
+        asignaciones de probabilidad cero.
+        """
+        summed = self._summed(factors, evidence)
+        arguments = []
+        for slot, labels in self.slots:
+            arguments += [summed[slot], labels]
+        total = float(self.einsum(*arguments, [])) if arguments else 1.0
+        if total <= 0:
+            raise ValueError("La evidencia tiene probabilidad cero")
+
+        cardinality = {label: summed[slot].shape[labels.index(label)] for slot, labels in self.slots for label in labels}
+        order = [(variable, label) for variable, label, *_ in self.max_steps]
+        results = []
+        assignment, value = self._maximize(summed, {})
+        heap = [(-value, 0, assignment, {})]
+        pushed = 1
+        while heap and len(results) < k:
+            value, _, assignment, masks = heapq.heappop(heap)
+            if value >= 0:
+                break
+            results.append(({variable: assignment[variable] for variable in self.variables}, -value / total))
+            if len(results) == k:
+                break
+            fixed = dict(masks)
+            for variable, label in order:
+                allowed = fixed.get(label, np.ones(cardinality[label], dtype=bool))
+                if allowed.sum() > 1:
+                    branch = dict(fixed)
+                    branch[label] = allowed.copy()
+                    branch[label][assignment[variable]] = False
+                    candidate, candidate_value = self._maximize(summed, branch)
+                    if candidate_value > 0:
+                        heapq.heappush(heap, (-candidate_value, pushed, candidate, branch))
+                        pushed += 1
+                only = np.zeros(cardinality[label], dtype=bool)
+                only[assignment[variable]] = True
+                fixed[label] = only
+        return results
+
+
+def _elimination_order(hidden, scopes, cardinality):
+    """Orden de eliminación por la heurística de menor relleno ponderado (desempate por tamaño del factor)."""
+    neighbors = {}
+    for scope in scopes:
+        for variable in scope:
+            neighbors.setdefault(variable, set()).update(scope)
+    for variable, adjacent in neighbors.items():
+        adjacent.discard(variable)
+
+    def cost(variable):
+        adjacent = list(neighbors[variable])
+        fill = 0
+        for i, u in enumerate(adjacent):
+            for v in adjacent[i + 1:]:
+                if v not in neighbors[u]:
+                    fill += cardinality[u] * cardinality[v]
+        weight = cardinality[variable]
+        for u in adjacent:
+            weight *= cardinality[u]
+        return fill, weight
+
+    remaining = set(hidden)
+    costs = {variable: cost(variable) for variable in remaining}
+    order = []
+    while remaining:
+        variable = min(remaining, key=costs.__getitem__)
+        adjacent = neighbors.pop(variable)
+        for u in adjacent:
+            neighbors[u].discard(variable)
+            neighbors[u].update(adjacent - {u})
+        remaining.discard(variable)
+        del costs[variable]
+        order.append(variable)
+
+        affected = set(adjacent)
+        for u in adjacent:
+            affected.update(neighbors[u])
+        for u in affected & remaining:
+            costs[u] = cost(u)
+    return order
+
+
+class EliminationPlanner:
+    """Eliminación de variables exacta con planes calculados una vez por patrón de consulta y evidencia.
+
+    Un plan depende solo de la variable consultada y de qué variables están observadas (no de
+    sus valores), así que se guarda en una caché LRU con esa clave. Al planificar se
+    descartan los nodos que no son ancestros de la consulta ni de la evidencia y los
+    factores desconectados de la consulta, y las variables restantes se eliminan en orden
+    de menor relleno ponderado.
+    """
+
+    def __init__(self, factors, cardinality, plan_cache_size=4096):
+        # factors: lista de (variables de la familia, valores con un eje por variable); la
+        # primera variable de cada familia es el hijo.
+        self.factors = [(tuple(variables), np.asarray(values, dtype=float)) for variables, values in factors]
+        self.cardinality = dict(cardinality)
+        self._index = {variable: i for i, variable in enumerate(self.cardinality)}
+        self._label_variable = list(self.cardinality)
+        self._family = {variables[0]: i for i, (variables, _) in enumerate(self.factors)}
+        self.plans = PosteriorCache(plan_cache_size)
+
+    @classmethod
+    def from_cpds(cls, cpds, plan_cache_size=4096):
+        """Construye el planificador a partir de CPDs con el formato de `network_structure()` más `values`."""
+        cardinality = {cpd["variable"]: cpd["variable_card"] for cpd in cpds}
+        factors = []
+        for cpd in cpds:
+            shape = [cpd["variable_card"]] + list(cpd["evidence_card"])
+            factors.append(([cpd["variable"]] + list(cpd["evidence"]), np.asarray(cpd["values"]).reshape(shape)))
+        return cls(factors, cardinality, plan_cache_size)
+
+    def plan(self, query, evidence_variables):
+        """Devuelve (y guarda) el plan para consultar `query` con esas variables observadas."""
+        key = (query, tuple(sorted(evidence_variables)))
+        return self.plans.get_or_compute(key, lambda: self._make_plan(query, set(evidence_variables)))
+
+    def _make_plan(self, query, observed):
+        kept, scopes, component = self._prune([query], observed)
+        reductions, slot_scopes = self._reductions(kept, observed)
+        order = _elimination_order(component - {query}, [scopes[factor] for factor in kept], self.cardinality)
+        steps, alive, width = self._steps(order, slot_scopes, list(range(len(slot_scopes))))
+        steps.append((alive, [slot_scopes[slot] for slot in alive], [self._index[query]]))
+        return EliminationPlan(query, reductions, steps, width)
+
+    def _prune(self, targets, observed):
+        """Factores que intervienen en una consulta sobre `targets`: (factores, alcances sin observadas, variables)."""
+        for target in targets:
+            if target not in self.cardinality:
+                raise ValueError(f"Node {target} not in graph")
+            if target in observed:
+                raise ValueError(f"Can't have the same variables in both `variables` and `evidence`. Found in both: {{'{target}'}}")
+        unknown = observed - self.cardinality.keys()
+        if unknown:
+            raise ValueError(f"Node {sorted(unknown)[0]} not in graph")
+
+        # Los nodos que no son ancestros de la consulta ni de la evidencia no cambian el resultado.
+        relevant = set()
+        pending = [*targets, *observed]
+        while pending:
+            variable = pending.pop()
+            if variable not in relevant:
+                relevant.add(variable)
+                pending += self.factors[self._family[variable]][0][1:]
+
+        # Solo importan los factores conectados a la consulta sin pasar por nodos observados.
+        scopes = {}
+        touching = {}
+        for variable in relevant:
+            factor = self._family[variable]
+            scope = [v for v in self.factors[factor][0] if v not in observed]
+            if scope:
+                scopes[factor] = scope
+                for v in scope:
+                    touching.setdefault(v, []).append(factor)
+        component = set(targets)
+        pending = list(targets)
+        while pending:
+            variable = pending.pop()
+            for factor in touching.get(variable, ()):
+                for v in scopes[factor]:
+                    if v not in component:
+                        component.add(v)
+                        pending.append(v)
+        kept = sorted(factor for factor, scope in scopes.items() if scope[0] in component)
+        return kept, scopes, component
+
+    def _reductions(self, kept, observed):
+        reductions = []
+        slot_scopes = []
+        for factor in kept:
+            family = self.factors[factor][0]
+            axes = [v if v in observed else None for v in family]
+            reductions.append((factor, axes if any(axis is not None for axis in axes) else None))
+            slot_scopes.append([self._index[v] for v in family if v not in observed])
+        return reductions, slot_scopes
+
+    def _steps(self, order, slot_scopes, alive):
+        # Cada paso multiplica los factores vivos que contienen la variable y la elimina; el
+        # resultado ocupa un slot nuevo al final de `slot_scopes`.
+        steps = []
+        width = 0
+        for variable in order:
+            label = self._index[variable]
+            operands = [slot for slot in alive if label in slot_scopes[slot]]
+            output = sorted({l for slot in operands for l in slot_scopes[slot]} - {label})
+            width = max(width, len(output) + 1)
+            steps.append((operands, [slot_scopes[slot] for slot in operands], output))
+            alive = [slot for slot in alive if slot not in operands] + [len(slot_scopes)]
+            slot_scopes.append(output)
+        return steps, alive, width
+
+    def map_plan(self, variables, evidence_variables):
+        """Devuelve (y guarda) el plan MAP para `variables` con esas variables observadas."""
+        key = ("map", tuple(variables), tuple(sorted(evidence_variables)))
+        return self.plans.get_or_compute(key, lambda: self._make_map_plan(list(variables), set(evidence_variables)))
+
+    def _make_map_plan(self, variables, observed):
+        kept, scopes, component = self._prune(variables, observed)
+        reductions, slot_scopes = self._reductions(kept, observed)
+        hidden = component - set(variables)
+        order = _elimination_order(hidden, [scopes[factor] for factor in kept], self.cardinality)
+        sum_steps, alive, width = self._steps(order, slot_scopes, list(range(len(slot_scopes))))
+        slots = [(slot, slot_scopes[slot]) for slot in alive]
+
+        # La fase de máximo solo ve los factores sobre las variables consultadas.
+        remaining = [[self._label_variable[label] for label in slot_scopes[slot]] for slot in alive]
+        order = _elimination_order(variables, remaining, self.cardinality)
+        first = len(slot_scopes)
+        steps, _, max_width = self._steps(order, slot_scopes, alive)
+        max_steps = [(variable, self._index[variable], operands, labels, output, first + i)
+                     for i, (variable, (operands, labels, output)) in enumerate(zip(order, steps))]
+        return MapPlan(variables, reductions, sum_steps, slots, max_steps, max(width, max_width))
+
+    def _check_evidence(self, evidence):
+        for variable, value in evidence.items():
+            card = self.cardinality.get(variable)
+            if card is None:
+                raise ValueError(f"Node {variable} not in graph")
+            if not _is_state(value, card):
+                raise IndexError(f"Estado inválido para {variable}: {value!r}")
+
+    def map(self, variables, evidence, k=1):
+        """Las `k` asignaciones conjuntas más probables de `variables` dada la evidencia (ver `MapPlan.run`).
+
+        Las demás variables no observadas se suman (MAP marginal); con todas las no
+        observadas en `variables` es la explicación más probable (MPE).
+        """
+        self._check_evidence(evidence)
+        return self.map_plan(variables, evidence.keys()).run(self.factors, evidence, k)
+
+    def query(self, variables, evidence):
+        """Marginales posteriores normalizadas de `variables` dada la evidencia (estados como índices)."""
+        self._check_evidence(evidence)
+        return {variable: self.plan(variable, evidence.keys()).run(self.factors, evidence) for variable in variables}
@@ -0,0 +1,147 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# Índice fijo de las respuestas del cuestionario: la variable i ocupa el bit i.
+EVIDENCE_VARIABLES = [
+    'difficulty_starting', 'battery_ok', 'starter_sound', 'fuel_smell',
+    'brake_issue', 'brake_problem_frequency', 'noise_type',
+    'overheating', 'coolant_level', 'fan_function', 'leak_presence',
+    'vibrations', 'speed_dependency', 'tire_wear', 'steering_vibrates'
+]
+
+BITS = {variable: 1 << i for i, variable in enumerate(EVIDENCE_VARIABLES)}
+
+
+def mask_of(variables):
+    """Máscara con los bits de las variables indicadas que están en el índice."""
+    mask = 0
+    for variable in variables:
+        mask |= BITS.get(variable, 0)
+    return mask
+
+
+def _is_state(value, cardinality):
+    """Indica si `value` es un estado entero válido; los bool y los float (como `1.0` de JSON) no lo son."""
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool) and 0 <= value < cardinality
+
+
+class BitEvidence(Mapping):
+    """Evidencia binaria del cuestionario empaquetada en dos enteros.
+
+    `observed` tiene un bit por variable respondida y `values` un bit por variable en 1,
+    según `EVIDENCE_VARIABLES`. Es inmutable y hashable, así que sirve directamente como
+    clave de caché, y se comporta como un diccionario de solo lectura para el código que
+    espera uno. Se recorre en el orden del índice, que es el del cuestionario. Solo es
+    igual a otra `BitEvidence`; para comparar con un diccionario, use `to_dict()`.
+    """
+
+    __slots__ = ("observed", "values")
+
+    def __init__(self, observed=0, values=0):
+        if values & ~observed:
+            raise ValueError("`values` tiene bits en variables no observadas")
+        if observed >> len(EVIDENCE_VARIABLES):
+            raise ValueError("`observed` tiene bits fuera del índice de evidencia")
+        self.observed = observed
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, evidence):
+        """Convierte un diccionario {variable: 0 o 1}; falla con variables fuera del índice o valores no binarios."""
+        if isinstance(evidence, BitEvidence):
+            return evidence
+        observed = 0
+        values = 0
+        for variable, value in evidence.items():
+            bit = BITS.get(variable)
+            if bit is None:
+                raise ValueError(f"Variable fuera del índice de evidencia: {variable}")
+            if not _is_state(value, 2):
+                raise ValueError(f"Valor no binario para {variable}: {value!r}")
+            observed |= bit
+            if value:
+                values |= bit
+        return cls(observed, values)
+
+    @classmethod
+    def from_wire(cls, data):
+        """Lee el formato compacto `[observed, values]` de `to_wire`."""
+        observed, values = data
+        return cls(int(observed), int(values))
+
+    def to_wire(self):
+        return [self.observed, self.values]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @property
+    def key(self):
+        return self.observed, self.values
+
+    def set(self, variable, value):
+        """Copia con `variable` respondida con `value`."""
+        bit = BITS.get(variable)
+        if bit is None:
+            raise ValueError(f"Variable fuera del índice de evidencia: {variable}")
+        if not _is_state(value, 2):
+            raise ValueError(f"Valor no binario para {variable}: {value!r}")
+        return BitEvidence(self.observed | bit, self.values & ~bit | (bit if value else 0))
+
+    def without(self, variable):
+        """Copia sin la respuesta de `variable`."""
+        bit = BITS.get(variable, 0)
+        return BitEvidence(self.observed & ~bit, self.values & ~bit)
+
+    def restrict(self, mask):
+        """Copia con solo las respuestas de las variables de `mask`."""
+        return BitEvidence(self.observed & mask, self.values & mask)
+
+    def __getitem__(self, variable):
+        bit = BITS.get(variable, 0)
+        if not self.observed & bit:
+            raise KeyError(variable)
+        return 1 if self.values & bit else 0
+
+    def get(self, variable, default=None):
+        bit = BITS.get(variable, 0)
+        if not self.observed & bit:
+            return default
+        return 1 if self.values & bit else 0
+
+    def __contains__(self, variable):
+        return bool(self.observed & BITS.get(variable, 0))
+
+    def __iter__(self):
+        observed = self.observed
+        return (variable for i, variable in enumerate(EVIDENCE_VARIABLES) if observed >> i & 1)
+
+    def __len__(self):
+        return self.observed.bit_count()
+
+    def __hash__(self):
+        return hash((BitEvidence, self.observed, self.values))
+
+    def __eq__(self, other):
+        # Solo se compara con otra `BitEvidence`: igualar a un diccionario rompería la
+        # relación entre `==` y `hash`, porque los diccionarios no son hashables y el hash
+        # de `BitEvidence` no coincide con el de ningún otro tipo.
+        if isinstance(other, BitEvidence):
+            return self.observed == other.observed and self.values == other.values
+        return NotImplemented
+
+    def __repr__(self):
+        return f"BitEvidence({self.to_dict()})"
+
+    def __reduce__(self):
+        return BitEvidence, (self.observed, self.values)
+
+
+def bit_rows(evidences, variables, unobserved=-1):
+    """Matriz N x len(variables) int8 con los valores de una lista de `BitEvidence` (`unobserved` si falta)."""
+    masks = np.array([evidence.key for evidence in evidences], dtype=np.int64).reshape(-1, 2)
+    shifts = np.array([EVIDENCE_VARIABLES.index(variable) for variable in variables], dtype=np.int64)
+    observed = (masks[:, :1] >> shifts) & 1
+    values = (masks[:, 1:] >> shifts) & 1
+    return np.where(observed == 1, values, unobserved).astype(np.int8)
@@ -0,0 +1,181 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Variable de entorno con la ruta del archivo de trazas; si no está definida no se mide nada.
+TRACE_ENV_VAR = "DIAGNOSIS_TRACE"
+
+
+class NullSink:
+    """Destino por defecto: descarta todo. `span`, `count` y `event` ni siquiera llegan a llamarlo."""
+
+    enabled = False
+
+    def record_span(self, name, duration, attrs):
+        pass
+
+    def count(self, name, key, n):
+        pass
+
+    def event(self, name, attrs):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySink:
+    """Acumula duraciones, contadores y eventos en memoria."""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.counters = Counter()
+        self.events = []
+
+    def record_span(self, name, duration, attrs):
+        with self._lock:
+            self.durations[name].append(duration)
+
+    def count(self, name, key, n):
+        with self._lock:
+            self.counters[name if key is None else f"{name}:{key}"] += n
+
+    def event(self, name, attrs):
+        with self._lock:
+            self.events.append({"name": name, **attrs})
+
+    def summary(self):
+        """Cantidad, tiempo total, medio y máximo de cada tipo de span, más los contadores."""
+        with self._lock:
+            spans = {name: {"count": len(values), "total_s": sum(values),
+                            "mean_s": sum(values) / len(values), "max_s": max(values)}
+                     for name, values in self.durations.items()}
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def close(self):
+        pass
+
+
+class FileSink(MemorySink):
+    """Exporta cada span y evento como una línea JSON; al cerrar agrega el resumen y los contadores."""
+
+    def __init__(self, path, buffer_size=1000):
+        super().__init__()
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, record):
+        self._buffer.append(json.dumps(record, ensure_ascii=False, default=str))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def record_span(self, name, duration, attrs):
+        super().record_span(name, duration, attrs)
+        with self._lock:
+            self._write({"type": "span", "name": name, "ts": time.time(), "duration_s": duration, **attrs})
+
+    def event(self, name, attrs):
+        super().event(name, attrs)
+        with self._lock:
+            self._write({"type": "event", "name": name, "ts": time.time(), **attrs})
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer.clear()
+
+    def close(self):
+        summary = self.summary()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write({"type": "summary", "ts": time.time(), **summary})
+            self.flush()
+            self._file.close()
+
+
+_sink = NullSink()
+
+
+def set_sink(sink):
+    """Reemplaza el destino de la instrumentación y devuelve el anterior."""
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+
+def get_sink():
+    return _sink
+
+
+def enabled():
+    return _sink.enabled
+
+
+def configure_from_env():
+    """Activa un `FileSink` si `DIAGNOSIS_TRACE` apunta a un archivo; se cierra al terminar el proceso."""
+    path = os.environ.get(TRACE_ENV_VAR)
+    if path and not _sink.enabled:
+        sink = FileSink(path)
+        set_sink(sink)
+        atexit.register(sink.close)
+    return _sink
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        attrs = self.attrs if exc_type is None else {**self.attrs, "error": exc_type.__name__}
+        _sink.record_span(self.name, time.perf_counter() - self.start, attrs)
+        return False
+
+
+def span(name, **attrs):
+    """Mide la duración del bloque `with`; sin destino activo devuelve un contexto vacío compartido."""
+    if not _sink.enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def count(name, key=None, n=1):
+    """Incrementa un contador, opcionalmente desglosado por `key` (regla, variable, etc.)."""
+    if _sink.enabled:
+        _sink.count(name, key, n)
+
+
+def event(name, **attrs):
+    """Registra un evento puntual (por ejemplo, un error de inferencia)."""
+    if _sink.enabled:
+        _sink.event(name, attrs)
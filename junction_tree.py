@@ -0,0 +1,156 @@
+from itertools import combinations
+
+import numpy as np
+
+
+def _einsum(*operands):
+    """np.einsum con etiquetas enteras arbitrarias, reindexadas al rango que acepta NumPy."""
+    labels = {}
+
+    def remap(sublist):
+        return [labels.setdefault(label, len(labels)) for label in sublist]
+
+    inputs = operands[:len(operands) - len(operands) % 2]
+    remapped = [remap(operand) if i % 2 else operand for i, operand in enumerate(inputs)]
+    if len(operands) % 2:
+        remapped.append(remap(operands[-1]))
+    return np.einsum(*remapped)
+
+
+class JunctionTreeInference:
+    """Inferencia exacta por árbol de uniones: calibra una vez por evidencia y devuelve todas las marginales."""
+
+    def __init__(self, model):
+        import networkx as nx
+
+        self.variables = list(model.nodes())
+        self._index = {variable: i for i, variable in enumerate(self.variables)}
+        self.cardinality = {variable: model.get_cardinality(variable) for variable in self.variables}
+
+        moral_graph = nx.Graph()
+        moral_graph.add_nodes_from(self.variables)
+        for node in self.variables:
+            parents = model.get_parents(node)
+            moral_graph.add_edges_from((parent, node) for parent in parents)
+            moral_graph.add_edges_from(combinations(parents, 2))
+
+        self.cliques = [tuple(sorted(clique, key=self._index.get)) for clique in self._triangulate(moral_graph)]
+        self._labels = [[self._index[variable] for variable in clique] for clique in self.cliques]
+
+        clique_graph = nx.Graph()
+        clique_graph.add_nodes_from(range(len(self.cliques)))
+        for i, j in combinations(range(len(self.cliques)), 2):
+            shared = set(self.cliques[i]) & set(self.cliques[j])
+            if shared:
+                clique_graph.add_edge(i, j, weight=len(shared))
+        tree = nx.maximum_spanning_tree(clique_graph)
+
+        self.neighbors = {i: list(tree.neighbors(i)) for i in tree.nodes()}
+        self._sepsets = {}
+        for i, j in tree.edges():
+            sepset = sorted(set(self._labels[i]) & set(self._labels[j]))
+            self._sepsets[i, j] = self._sepsets[j, i] = sepset
+
+        # Orden de recolección (hojas hacia la raíz) de cada árbol del bosque. Los árboles no
+        # comparten variables, así que cada uno se calibra por separado.
+        self._schedules = []
+        self._tree = {}
+        for component in nx.connected_components(tree):
+            root = min(component)
+            self._schedules.append([(child, parent) for parent, child in reversed(list(nx.bfs_edges(tree, root)))])
+            for clique in component:
+                self._tree[clique] = len(self._schedules) - 1
+
+        self._potentials = [np.ones([self.cardinality[variable] for variable in clique]) for clique in self.cliques]
+        for cpd in model.get_cpds():
+            family = cpd.variables
+            home = min((i for i, clique in enumerate(self.cliques) if set(family) <= set(clique)),
+                       key=lambda i: self._potentials[i].size)
+            values = cpd.get_values().reshape([self.cardinality[variable] for variable in family])
+            self._potentials[home] = _einsum(self._potentials[home], self._labels[home],
+                                             values, [self._index[variable] for variable in family],
+                                             self._labels[home])
+
+        self._containing = {variable: [i for i, clique in enumerate(self.cliques) if variable in clique]
+                            for variable in self.variables}
+        self._home = {variable: min(cliques, key=lambda i: self._potentials[i].size)
+                      for variable, cliques in self._containing.items()}
+
+    @staticmethod
+    def _triangulate(graph):
+        """Elimina variables con la heurística de menor relleno y devuelve las cliques maximales resultantes."""
+        graph = graph.copy()
+        cliques = []
+        while graph:
+            def fill_in(node):
+                return sum(1 for u, v in combinations(graph[node], 2) if not graph.has_edge(u, v))
+
+            node = min(graph, key=lambda n: (fill_in(n), len(graph[n])))
+            clique = {node} | set(graph[node])
+            graph.add_edges_from(combinations(graph[node], 2))
+            graph.remove_node(node)
+            if not any(clique <= other for other in cliques):
+                cliques.append(clique)
+        return cliques
+
+    def trees_of(self, variables):
+        """Índices de los árboles del bosque que contienen a `variables`."""
+        return {self._tree[self._home[variable]] for variable in variables}
+
+    def _reduce(self, evidence, trees):
+        """Multiplica los potenciales de las cliques de `trees` por los indicadores de la evidencia."""
+        potentials = list(self._potentials)
+        for variable, value in evidence.items():
+            if variable not in self._index:
+                raise ValueError(f"Node {variable} not in graph")
+            if value not in range(self.cardinality[variable]):
+                raise IndexError(f"Estado {value} fuera de rango para {variable}")
+            if self._tree[self._home[variable]] not in trees:
+                continue
+            indicator = np.zeros(self.cardinality[variable])
+            indicator[value] = 1.0
+            for i in self._containing[variable]:
+                potentials[i] = _einsum(potentials[i], self._labels[i],
+                                        indicator, [self._index[variable]],
+                                        self._labels[i])
+        return potentials
+
+    def _message(self, potentials, messages, sender, receiver):
+        operands = [potentials[sender], self._labels[sender]]
+        for neighbor in self.neighbors[sender]:
+            if neighbor != receiver:
+                operands += [messages[neighbor, sender], self._sepsets[neighbor, sender]]
+        return _einsum(*operands, self._sepsets[sender, receiver])
+
+    def calibrate(self, evidence, trees=None):
+        """Propaga mensajes hacia la raíz y de regreso; devuelve los potenciales y mensajes calibrados.
+
+        Con `trees` solo se calibran esos árboles del bosque; los demás quedan sin mensajes.
+        """
+        trees = range(len(self._schedules)) if trees is None else trees
+        potentials = self._reduce(evidence, trees)
+        messages = {}
+        for tree in trees:
+            schedule = self._schedules[tree]
+            for child, parent in schedule:
+                messages[child, parent] = self._message(potentials, messages, child, parent)
+            for child, parent in reversed(schedule):
+                messages[parent, child] = self._message(potentials, messages, parent, child)
+        return potentials, messages
+
+    def query(self, evidence, variables=None):
+        """Devuelve la marginal posterior normalizada de cada variable a partir de una sola calibración.
+
+        Solo se calibran los árboles del bosque que contienen a las variables pedidas.
+        """
+        variables = self.variables if variables is None else variables
+        potentials, messages = self.calibrate(evidence, self.trees_of(variables))
+        result = {}
+        for variable in variables:
+            home = self._home[variable]
+            operands = [potentials[home], self._labels[home]]
+            for neighbor in self.neighbors[home]:
+                operands += [messages[neighbor, home], self._sepsets[neighbor, home]]
+            marginal = _einsum(*operands, [self._index[variable]])
+            result[variable] = marginal / marginal.sum()
+        return result
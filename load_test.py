@@ -0,0 +1,70 @@
+"""Prueba de carga para service.py: latencias p50/p99 y solicitudes por segundo."""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from questions import questionnaire_evidence
+
+
+async def client(host, port, evidences, requests, path, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            body = json.dumps({"evidence": random.choice(evidences)}).encode("utf-8")
+            start = time.perf_counter()
+            writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if b" 200 " not in status:
+                raise RuntimeError(f"Respuesta inesperada: {status!r}")
+    finally:
+        writer.close()
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def run(args):
+    random.seed(args.seed)
+    evidences = questionnaire_evidence()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, evidences, args.requests // args.concurrency, args.path, latencies)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(latencies)} solicitudes a {args.path} con {args.concurrency} conexiones en {elapsed:.2f} s")
+    print(f"  rps  {len(latencies) / elapsed:,.0f}")
+    print(f"  p50  {percentile(latencies, 50) * 1000:.2f} ms")
+    print(f"  p99  {percentile(latencies, 99) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/diagnose", choices=["/diagnose", "/next-question"])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
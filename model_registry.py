@@ -0,0 +1,144 @@
+import json
+import threading
+from collections import OrderedDict
+
+import instrumentation
+from posterior_cache import deep_nbytes
+
+# Memoria máxima de los modelos de variante residentes.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ModelRegistry:
+    """Modelos por variante de vehículo derivados de un modelo base.
+
+    Cada variante se registra solo con los CPDs que cambian respecto del base (por ejemplo
+    los priors de `battery_ok` u `overheating` de una marca y un rango de kilometraje).
+    Los reemplazos son pequeños y se guardan siempre; los modelos derivados con sus tablas
+    compiladas (ver `VehicleDiagnosis.derive`) se construyen al primer uso y se mantienen en
+    una LRU cuya memoria medida (ver `footprint`) no supera `max_bytes`. Una variante
+    expulsada se vuelve a derivar cuando se pide de nuevo.
+    """
+
+    def __init__(self, base, max_bytes=DEFAULT_MAX_BYTES, cache_size=64):
+        self.base = base
+        self.max_bytes = max_bytes
+        self.cache_size = cache_size
+        self.overlays = {}
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._fixed = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.evictions = 0
+
+    def register(self, variant, cpds):
+        """Registra (o reemplaza) una variante; `cpds` tiene el formato de `VehicleDiagnosis.set_cpds`."""
+        overlay = self.base._load_overlay(cpds)
+        with self._lock:
+            self.overlays[variant] = overlay
+            self._drop(variant)
+
+    def unregister(self, variant):
+        with self._lock:
+            self.overlays.pop(variant, None)
+            self._drop(variant)
+
+    def load(self, path):
+        """Registra las variantes de un JSON {variante: {variable: matriz del CPD}}."""
+        with open(path, encoding="utf-8") as f:
+            for variant, cpds in json.load(f).items():
+                self.register(variant, cpds)
+
+    def _drop(self, variant):
+        model = self._models.pop(variant, None)
+        self._sizes.pop(variant, None)
+        self._fixed.pop(id(model), None)
+
+    def get(self, variant):
+        """Modelo de la variante (el base si `variant` es None), derivándolo si no está residente."""
+        if variant is None:
+            return self.base
+        with self._lock:
+            model = self._models.get(variant)
+            if model is not None:
+                self._models.move_to_end(variant)
+                return model
+            overlay = self.overlays.get(variant)
+        if overlay is None:
+            raise KeyError(f"Variante desconocida: {variant}")
+
+        with instrumentation.span("variant_build", variant=str(variant)):
+            model = self.base.derive(overlay, cache_size=self.cache_size)
+        with self._lock:
+            if self.overlays.get(variant) is overlay:
+                self._models[variant] = model
+                self._sizes[variant] = self.footprint(model)
+                self.builds += 1
+                self._evict()
+        return model
+
+    def footprint(self, model):
+        """Memoria propia de un modelo derivado, sin contar lo que comparte con el base.
+
+        Suma los `nbytes` de los CPDs y tablas que cambian, del planificador y del
+        muestreador si ya se construyeron, y de las entradas de sus cachés (posteriores,
+        componentes y planes de eliminación). Las variantes no construyen la red de pgmpy
+        para consultar; si se la pide explícitamente (`set_cpds`, `save_snapshot`), no se mide.
+        """
+        planner, sampler = model._snapshot_planner, model._snapshot_sampler
+        # Lo fijo solo cambia cuando se construye el planificador o el muestreador.
+        fixed = self._fixed.get(id(model))
+        if fixed is None or fixed[0] is not planner or fixed[1] is not sampler:
+            shared = [cpd["values"] for cpd in self.base._network_cpds()] + list(self.base.posterior_tables.values())
+            size = deep_nbytes([model.overlay, model.posterior_tables, model._snapshot_network,
+                                None if planner is None else planner.factors,
+                                None if sampler is None else vars(sampler)], shared)
+            fixed = self._fixed[id(model)] = (planner, sampler, size)
+        size = fixed[2] + model.cache.stats()["nbytes"] + model.component_cache.stats()["nbytes"]
+        if planner is not None:
+            size += planner.plans.stats()["nbytes"]
+        return size
+
+    def _update(self, variant, model):
+        # La caché del modelo crece con el uso; se vuelve a medir después de cada consulta.
+        with self._lock:
+            if self._models.get(variant) is model:
+                self._sizes[variant] = self.footprint(model)
+                self._evict()
+
+    def _evict(self):
+        while len(self._models) > 1 and self.memory_usage() > self.max_bytes:
+            variant, model = self._models.popitem(last=False)
+            del self._sizes[variant]
+            self._fixed.pop(id(model), None)
+            self.evictions += 1
+            instrumentation.count("variant_evicted")
+
+    def memory_usage(self):
+        return sum(self._sizes.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "variants": len(self.overlays),
+                "resident": len(self._models),
+                "memory_bytes": self.memory_usage(),
+                "max_bytes": self.max_bytes,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
+
+    def infer(self, evidence, variant=None, method="table", **sampling):
+        model = self.get(variant)
+        result = model.infer(evidence, method, **sampling)
+        if variant is not None:
+            self._update(variant, model)
+        return result
+
+    def diagnose_vehicle(self, evidence, variant=None, method="table", **sampling):
+        model = self.get(variant)
+        result = model.diagnose_vehicle(evidence, method, **sampling)
+        if variant is not None:
+            self._update(variant, model)
+        return result
@@ -0,0 +1,135 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from evidence import BitEvidence
+
+
+def _state_key(value):
+    # `1.0` y `True` tienen el mismo hash que `1` pero no son estados válidos: se guardan
+    # con su tipo para que no compartan entrada con el estado entero.
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    return type(value).__name__, value
+
+
+def evidence_key(evidence):
+    """Forma canónica e inmutable de un diccionario de evidencia, usable como clave de caché."""
+    if isinstance(evidence, BitEvidence):
+        return evidence.key
+    return tuple(sorted((variable, _state_key(value)) for variable, value in evidence.items()))
+
+
+def _owner(array):
+    # Arreglo dueño de la memoria de `array` (las vistas comparten el buffer del original).
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def deep_nbytes(obj, shared=(), _seen=None):
+    """Bytes que ocupa `obj` con todo su contenido: arreglos de NumPy, contenedores y atributos de objetos.
+
+    Cada objeto y cada buffer de NumPy se cuentan una sola vez; no se cuentan los arreglos
+    que comparten memoria con los de `shared`.
+    """
+    if _seen is None:
+        _seen = {id(_owner(array)) for array in shared}
+    if isinstance(obj, np.ndarray):
+        owner = _owner(obj)
+        if id(owner) in _seen:
+            return 0
+        _seen.add(id(owner))
+        return owner.nbytes
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        contents = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        contents = obj
+    elif hasattr(obj, "__slots__"):
+        contents = [getattr(obj, name, None) for name in obj.__slots__]
+    else:
+        return size
+    return size + sum(deep_nbytes(item, _seen=_seen) for item in contents)
+
+
+class PosteriorCache:
+    """Caché LRU acotada y segura entre hilos para resultados de inferencia.
+
+    Lleva además la memoria de las entradas guardadas (claves y valores, medidas con
+    `deep_nbytes` al guardarlas) en `stats()["nbytes"]`.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._compute_time = 0.0
+
+    def get(self, key, default=None):
+        """Devuelve el valor guardado para `key` sin calcularlo; un fallo no cuenta como miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        return default
+
+    def get_or_compute(self, key, compute):
+        """Devuelve el valor guardado para `key` o lo calcula con `compute()` y lo guarda."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        start = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - start
+
+        size = deep_nbytes((key, value)) if self.maxsize > 0 else 0
+        with self._lock:
+            self._compute_time += elapsed
+            if self.maxsize > 0:
+                # Otro hilo pudo guardar la misma clave mientras se calculaba.
+                self._nbytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._nbytes -= self._sizes.pop(evicted)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        """Descarta todas las entradas sin reiniciar los contadores."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        """Contadores para dimensionar la caché."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "nbytes": self._nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "mean_compute_time": self._compute_time / self.misses if self.misses else 0.0,
+            }
@@ -0,0 +1,186 @@
+# Árbol de preguntas del cuestionario, compartido por la interfaz de Streamlit y los servicios.
+
+# Probabilidad de la falla más probable a partir de la cual el modo adaptativo deja de preguntar.
+CONFIDENCE_THRESHOLD = 0.8
+
+QUESTIONS = [
+    {
+        "key": "difficulty_starting",
+        "text": "¿Tu vehículo tiene dificultad para arrancar?",
+        "options": ["Sí", "No"],
+        "follow_up": [
+            {
+                "key": "battery_ok",
+                "text": "¿La batería parece estar cargada?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("difficulty_starting") == 1
+            },
+            {
+                "key": "starter_sound",
+                "text": "¿Escuchas el sonido del motor de arranque?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("difficulty_starting") == 1
+            },
+            {
+                "key": "fuel_smell",
+                "text": "¿Notas olor a combustible?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("difficulty_starting") == 1
+            }
+        ]
+    },
+    {
+        "key": "brake_issue",
+        "text": "¿Los frenos suenan raro al utilizarlos?",
+        "options": ["Sí", "No"],
+        "follow_up": [
+            {
+                "key": "brake_problem_frequency",
+                "text": "¿El problema con los frenos ocurre frecuentemente?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("brake_issue") == 1
+            },
+            {
+                "key": "noise_type",
+                "text": "¿Los frenos funcionan con normalidad?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("brake_issue") == 1
+            }
+        ]
+    },
+    {
+        "key": "overheating",
+        "text": "¿Tu vehículo se sobrecalienta?",
+        "options": ["Sí", "No"],
+        "follow_up": [
+            {
+                "key": "coolant_level",
+                "text": "¿El nivel de refrigerante está bajo?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("overheating") == 1
+            },
+            {
+                "key": "fan_function",
+                "text": "¿El ventilador del radiador está funcionando?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("overheating") == 1
+            },
+            {
+                "key": "leak_presence",
+                "text": "¿Ves signos de fuga de refrigerante?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("overheating") == 1
+            }
+        ]
+    },
+    {
+        "key": "vibrations",
+        "text": "¿Sientes vibraciones mientras conduces?",
+        "options": ["Sí", "No"],
+        "follow_up": [
+            {
+                "key": "speed_dependency",
+                "text": "¿Las vibraciones aumentan con la velocidad?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("vibrations") == 1
+            },
+            {
+                "key": "tire_wear",
+                "text": "¿Notas desgaste en las llantas?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("vibrations") == 1
+            },
+            {
+                "key": "steering_vibrates",
+                "text": "¿El volante vibra mientras conduces?",
+                "options": ["Sí", "No"],
+                "condition": lambda e: e.get("vibrations") == 1
+            }
+        ]
+    }
+]
+
+
+def get_next_question(evidence, questions=QUESTIONS):
+    """Obtiene la siguiente pregunta en el flujo."""
+    for question in questions:
+        if question["key"] not in evidence:
+            return question
+        for follow_up in question.get("follow_up", []):
+            if follow_up["key"] not in evidence and follow_up["condition"](evidence):
+                return follow_up
+    return None
+
+
+def find_question(key, questions=QUESTIONS):
+    """Busca una pregunta (principal o de seguimiento) por su clave."""
+    for question in questions:
+        if question["key"] == key:
+            return question
+        for follow_up in question.get("follow_up", []):
+            if follow_up["key"] == key:
+                return follow_up
+    return None
+
+
+def available_questions(evidence, questions=QUESTIONS):
+    """Preguntas que aún se pueden hacer: las principales sin responder y los seguimientos habilitados."""
+    available = []
+    for question in questions:
+        if question["key"] not in evidence:
+            available.append(question)
+        for follow_up in question.get("follow_up", []):
+            if follow_up["key"] not in evidence and follow_up["condition"](evidence):
+                available.append(follow_up)
+    return available
+
+
+def get_adaptive_question(evidence, diagnosis, questions=QUESTIONS, threshold=CONFIDENCE_THRESHOLD):
+    """Elige la pregunta que más reduce la incertidumbre sobre las fallas según `diagnosis`.
+
+    Devuelve None cuando la falla más probable ya supera `threshold` o cuando ninguna
+    pregunta restante aporta información.
+    """
+    available = available_questions(evidence, questions)
+    if not available:
+        return None
+    posteriors = diagnosis.fault_posteriors(evidence)
+    if posteriors and max(posteriors.values()) >= threshold:
+        return None
+
+    gains = diagnosis.question_gains(evidence, [question["key"] for question in available])
+    best = max(available, key=lambda question: gains.get(question["key"], 0.0))
+    if gains.get(best["key"], 0.0) <= 1e-9:
+        return None
+    return best
+
+
+def _group_answers(keys, complete):
+    """Respuestas de un grupo: completas (disparadora en 0, o en 1 con todo el seguimiento) o a medias."""
+    follow_ups = keys[1:]
+    if complete:
+        yield {keys[0]: 0}
+        lengths = [len(follow_ups)]
+    else:
+        yield {}
+        lengths = range(len(follow_ups))
+    for answered in lengths:
+        for bits in range(2 ** answered):
+            answers = {keys[0]: 1}
+            answers.update({key: (bits >> i) & 1 for i, key in enumerate(follow_ups[:answered])})
+            yield answers
+
+
+def questionnaire_evidence(questions=QUESTIONS):
+    """Genera todas las evidencias que puede producir el cuestionario, completas o a medio responder.
+
+    Los seguimientos de cada pregunta se hacen cuando la respuesta principal es 1, en el
+    orden del árbol; cada evidencia conserva el orden en que se respondió.
+    """
+    evidences = []
+    prefixes = [{}]
+    for question in questions:
+        keys = [question["key"]] + [follow_up["key"] for follow_up in question.get("follow_up", [])]
+        evidences += [dict(prefix, **answers) for prefix in prefixes for answers in _group_answers(keys, complete=False)]
+        prefixes = [dict(prefix, **answers) for prefix in prefixes for answers in _group_answers(keys, complete=True)]
+    return evidences + prefixes
@@ -0,0 +1,183 @@
+import time
+
+import numpy as np
+
+# Presupuesto por defecto cuando no se indica ni cantidad de muestras ni tiempo.
+DEFAULT_SAMPLES = 20_000
+BATCH_SIZE = 10_000
+
+# Cuantil normal del intervalo de confianza del 95 %.
+Z_95 = 1.959963984540054
+
+
+class SamplingResult:
+    """Marginales estimadas por muestreo, con un intervalo de confianza por estado.
+
+    Los intervalos usan la aproximación normal con el tamaño efectivo de muestra de Kish,
+    `(Σw)² / Σw²`, que descuenta la varianza de los pesos.
+    """
+
+    __slots__ = ("marginals", "intervals", "samples", "effective_samples", "elapsed")
+
+    def __init__(self, marginals, intervals, samples, effective_samples, elapsed):
+        self.marginals = marginals
+        self.intervals = intervals
+        self.samples = samples
+        self.effective_samples = effective_samples
+        self.elapsed = elapsed
+
+
+class LikelihoodWeighting:
+    """Ponderación por verosimilitud vectorizada sobre los CPDs de la red.
+
+    Cada lote muestrea en orden topológico todas las variables no observadas que son
+    ancestros de la consulta o de la evidencia; las observadas se fijan y multiplican el
+    peso de la muestra por su probabilidad dados los padres. Los pesos se llevan en
+    logaritmo para que redes grandes no se queden en cero.
+    """
+
+    def __init__(self, factors, cardinality):
+        # Mismo formato que `EliminationPlanner`: (familia con el hijo primero, valores).
+        self.cardinality = dict(cardinality)
+        self._parents = {}
+        self._columns = {}
+        self._cumulative = {}
+        self._log_values = {}
+        for variables, values in factors:
+            child, parents = variables[0], tuple(variables[1:])
+            values = np.asarray(values, dtype=float).reshape(self.cardinality[child], -1)
+            self._parents[child] = parents
+            self._columns[child] = tuple(self.cardinality[parent] for parent in parents)
+            self._cumulative[child] = np.cumsum(values.T, axis=1)
+            with np.errstate(divide="ignore"):
+                self._log_values[child] = np.log(values)
+        self.order = self._topological_order()
+
+    @classmethod
+    def from_cpds(cls, cpds):
+        """Construye el muestreador a partir de CPDs con el formato de `network_structure()` más `values`."""
+        cardinality = {cpd["variable"]: cpd["variable_card"] for cpd in cpds}
+        return cls([([cpd["variable"]] + list(cpd["evidence"]), cpd["values"]) for cpd in cpds], cardinality)
+
+    def _topological_order(self):
+        order = []
+        visited = set()
+        for start in self._parents:
+            stack = [(start, False)]
+            while stack:
+                variable, expanded = stack.pop()
+                if expanded:
+                    order.append(variable)
+                elif variable not in visited:
+                    visited.add(variable)
+                    stack.append((variable, True))
+                    stack += [(parent, False) for parent in self._parents[variable] if parent not in visited]
+        return order
+
+    def _relevant(self, variables):
+        relevant = set()
+        pending = list(variables)
+        while pending:
+            variable = pending.pop()
+            if variable not in relevant:
+                relevant.add(variable)
+                pending += self._parents[variable]
+        return [variable for variable in self.order if variable in relevant]
+
+    def _column(self, variable, states):
+        parents = self._parents[variable]
+        if not parents:
+            return 0
+        return np.ravel_multi_index([states[parent] for parent in parents], self._columns[variable])
+
+    def _batch(self, order, evidence, size, rng):
+        states = {}
+        log_weights = np.zeros(size)
+        for variable in order:
+            column = self._column(variable, states)
+            if variable in evidence:
+                value = evidence[variable]
+                states[variable] = np.full(size, value, dtype=np.intp)
+                log_weights += self._log_values[variable][value, column]
+            else:
+                cumulative = self._cumulative[variable][column]
+                u = rng.random(size)
+                if cumulative.ndim == 1:
+                    sampled = np.searchsorted(cumulative, u, side="right")
+                else:
+                    sampled = (u[:, None] >= cumulative).sum(axis=1)
+                states[variable] = np.minimum(sampled, self.cardinality[variable] - 1)
+        return states, log_weights
+
+    def forward(self, size, rng):
+        """Muestreo ancestral sin evidencia: `size` muestras conjuntas de todas las variables (estados como índices)."""
+        states, _ = self._batch(self.order, {}, size, rng)
+        return states
+
+    def run(self, variables, evidence, samples=None, time_budget=None, batch_size=BATCH_SIZE, seed=None):
+        """Estima las marginales de `variables` dada la evidencia (estados como índices).
+
+        Se detiene al llegar a `samples` muestras o al agotar `time_budget` segundos, lo que
+        ocurra primero; siempre se procesa al menos un lote. Sin ninguno de los dos se
+        usan `DEFAULT_SAMPLES` muestras.
+        """
+        if samples is not None and samples < 1:
+            raise ValueError(f"`samples` debe ser al menos 1: {samples}")
+        for variable in variables:
+            if variable not in self.cardinality:
+                raise ValueError(f"Node {variable} not in graph")
+            if variable in evidence:
+                raise ValueError(f"Can't have the same variables in both `variables` and `evidence`. Found in both: {{'{variable}'}}")
+        for variable, value in evidence.items():
+            card = self.cardinality.get(variable)
+            if card is None:
+                raise ValueError(f"Node {variable} not in graph")
+            if not 0 <= value < card:
+                raise IndexError(f"Estado {value} fuera de rango para {variable}")
+        if samples is None and time_budget is None:
+            samples = DEFAULT_SAMPLES
+
+        rng = np.random.default_rng(seed)
+        order = self._relevant([*variables, *evidence])
+        start = time.perf_counter()
+        drawn = 0
+        # Sumas ponderadas acumuladas lote a lote, escaladas por exp(-log_max) con el mayor
+        # log-peso visto hasta el momento: la memoria no crece con la cantidad de muestras.
+        log_max = -np.inf
+        total = total_squares = 0.0
+        sums = {variable: np.zeros(self.cardinality[variable]) for variable in variables}
+        while True:
+            size = batch_size if samples is None else min(batch_size, samples - drawn)
+            batch, log_weights = self._batch(order, evidence, size, rng)
+            batch_max = log_weights.max()
+            if batch_max > log_max:
+                scale = np.exp(log_max - batch_max)
+                total *= scale
+                total_squares *= scale ** 2
+                for variable in variables:
+                    sums[variable] *= scale
+                log_max = batch_max
+            if np.isfinite(log_max):
+                weights = np.exp(log_weights - log_max)
+                total += weights.sum()
+                total_squares += (weights ** 2).sum()
+                for variable in variables:
+                    sums[variable] += np.bincount(batch[variable], weights=weights, minlength=self.cardinality[variable])
+            drawn += size
+            if samples is not None and drawn >= samples:
+                break
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+
+        if not np.isfinite(log_max):
+            raise ValueError("La evidencia tiene probabilidad cero en todas las muestras")
+        effective = float(total ** 2 / total_squares)
+
+        marginals = {}
+        intervals = {}
+        for variable in variables:
+            estimate = sums[variable] / total
+            half_width = Z_95 * np.sqrt(estimate * (1 - estimate) / effective)
+            marginals[variable] = estimate
+            intervals[variable] = np.stack([np.clip(estimate - half_width, 0, 1), np.clip(estimate + half_width, 0, 1)], axis=1)
+        return SamplingResult(marginals, intervals, drawn, effective, time.perf_counter() - start)
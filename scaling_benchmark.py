@@ -0,0 +1,89 @@
+"""Latencia de las consultas por eliminación de variables a medida que crece la red.
+
+Para cada tamaño se genera una red aleatoria con `diagnostic_network.random_spec`, se
+observa una fracción de las variables observables y se mide la primera consulta de cada
+falla (que calcula el plan de eliminación) y las siguientes con otros valores de
+evidencia (que reutilizan el plan guardado).
+
+Ejemplos:
+    python scaling_benchmark.py
+    python scaling_benchmark.py --sizes 100 500 1000 --queries 50 --output escala.json
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from diagnostic_network import DiagnosticNetwork, random_spec
+
+SIZES = [25, 50, 100, 250, 500, 1000]
+SEED = 1234
+
+
+def measure(n_nodes, queries=20, repeats=5, observed_fraction=0.3, seed=SEED):
+    """Mide una red de `n_nodes` nodos; devuelve latencias por consulta en segundos."""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    network = DiagnosticNetwork(random_spec(n_nodes, seed=seed))
+    build = time.perf_counter() - start
+
+    observed = [variable for variable in network.observable_variables if rng.random() < observed_fraction]
+    faults = [network.fault_variables[i] for i in rng.choice(len(network.fault_variables),
+                                                               size=min(queries, len(network.fault_variables)),
+                                                               replace=False)]
+
+    def evidence():
+        return {variable: int(rng.integers(len(network.states[variable]))) for variable in observed}
+
+    first = []
+    cached = []
+    for fault in faults:
+        start = time.perf_counter()
+        network.planner.query([fault], evidence())
+        first.append(time.perf_counter() - start)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            network.planner.query([fault], evidence())
+            cached.append(time.perf_counter() - start)
+
+    widths = [network.planner.plan(fault, observed).width for fault in faults]
+    return {
+        "nodes": n_nodes,
+        "observed": len(observed),
+        "queries": len(faults),
+        "build_s": build,
+        "first_p50_s": statistics.median(first),
+        "cached_p50_s": statistics.median(cached),
+        "cached_p95_s": statistics.quantiles(cached, n=20, method="inclusive")[18] if len(cached) > 1 else cached[0],
+        "max_width": max(widths),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="cantidad de nodos de cada red")
+    parser.add_argument("--queries", type=int, default=20, help="fallas consultadas por red")
+    parser.add_argument("--repeats", type=int, default=5, help="consultas con el plan guardado por falla")
+    parser.add_argument("--observed", type=float, default=0.3, help="fracción de observables con evidencia")
+    parser.add_argument("--output", help="guarda los resultados en JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'nodos':>6} {'observ.':>8} {'construcción':>13} {'1.ª consulta':>13} {'con plan p50':>13} "
+          f"{'con plan p95':>13} {'ancho':>6}")
+    for n_nodes in args.sizes:
+        result = measure(n_nodes, args.queries, args.repeats, args.observed)
+        results.append(result)
+        print(f"{n_nodes:>6} {result['observed']:>8} {result['build_s'] * 1e3:>11.2f}ms "
+              f"{result['first_p50_s'] * 1e3:>11.3f}ms {result['cached_p50_s'] * 1e3:>11.3f}ms "
+              f"{result['cached_p95_s'] * 1e3:>11.3f}ms {result['max_width']:>6}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"seed": SEED, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+
+from evidence import BitEvidence
+from questions import get_next_question
+
+# Modelo y evaluador de reglas del proceso actual (el servidor o cada proceso de trabajo).
+_worker = {}
+
+
+def _init_worker(snapshot):
+    from bayesian_model import VehicleDiagnosis
+    from rules import get_compiled_rules
+
+    sys.stdout = sys.stderr
+    _worker["diagnosis"] = VehicleDiagnosis.from_snapshot(snapshot) if snapshot else VehicleDiagnosis()
+    _worker["rules"] = get_compiled_rules()
+
+
+def diagnose_many(evidences, sensitivity=None):
+    """Diagnostica un micro-lote de evidencias con el modelo y las reglas ya cargados en el proceso.
+
+    `sensitivity` indica, por evidencia, si se agrega el análisis what-if (por defecto, en
+    ninguna). Una evidencia que no se puede diagnosticar devuelve {"error": ...} en su
+    posición, sin afectar a las demás solicitudes del lote.
+    """
+    sensitivity = sensitivity or [False] * len(evidences)
+    results = []
+    for evidence, what_if in zip(evidences, sensitivity):
+        try:
+            results.append(_diagnose(evidence, what_if))
+        except Exception as e:
+            results.append({"error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+def _diagnose(evidence, sensitivity=False):
+    bayesian = _worker["diagnosis"].infer(evidence)
+    rule_based = _worker["rules"].evaluate(evidence)
+    result = {
+        "rule_based": rule_based[:3],
+        "bayesian": [[issue, float(prob)] for issue, prob in
+                     sorted(bayesian.items(), key=lambda x: x[1], reverse=True)[:3]],
+        "sensitivity": [],
+    }
+    if sensitivity:
+        # Respuestas que más mueven la falla más probable (value null = sin responder). Si el
+        # análisis falla, el diagnóstico se responde igual y el error va en `sensitivity_error`.
+        try:
+            variants = _worker["diagnosis"].what_if(evidence)["variants"]
+        except (ValueError, TypeError) as e:
+            result["sensitivity_error"] = f"{type(e).__name__}: {e}"
+        else:
+            result["sensitivity"] = [{"variable": variant["variable"], "value": variant["value"], "delta": variant["delta"]}
+                                     for variant in variants[:3]]
+    return result
+
+
+class MicroBatcher:
+    """Agrupa las solicitudes de diagnóstico que llegan juntas y las envía al pool en un solo lote."""
+
+    def __init__(self, executor, max_batch=64, max_delay=0.002):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+        # Los lotes en curso se guardan hasta que terminan: el bucle de eventos solo
+        # conserva referencias débiles a sus tareas.
+        self._dispatching = set()
+
+    async def diagnose(self, evidence, sensitivity=False):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((evidence, sensitivity, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.requests += len(batch)
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch):
+        evidences = [evidence for evidence, _, _ in batch]
+        sensitivity = [what_if for _, what_if, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, diagnose_many, evidences, sensitivity)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class DiagnosisService:
+    """Servicio HTTP local: flujo de preguntas y diagnóstico sobre un modelo precargado.
+
+    `/diagnose` agrega el análisis what-if en `sensitivity` solo si el cuerpo trae
+    `"sensitivity": true`.
+    """
+
+    def __init__(self, executor, max_batch=64, max_delay=0.002):
+        self.batcher = MicroBatcher(executor, max_batch, max_delay)
+
+    async def handle(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok", "batches": self.batcher.batches, "requests": self.batcher.requests}
+        if method != "POST" or path not in ("/next-question", "/diagnose"):
+            return HTTPStatus.NOT_FOUND, {"error": "Ruta no encontrada"}
+
+        try:
+            payload = json.loads(body or b"{}")
+            evidence = payload.get("evidence", {})
+            sensitivity = payload.get("sensitivity", False)
+            if not isinstance(sensitivity, bool):
+                raise ValueError("`sensitivity` debe ser true o false")
+            if isinstance(evidence, list):
+                # Formato compacto: [observed, values] (ver `evidence.BitEvidence.to_wire`).
+                evidence = BitEvidence.from_wire(evidence)
+            elif not isinstance(evidence, dict):
+                raise ValueError("`evidence` debe ser un objeto o [observed, values]")
+        except (ValueError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+        if path == "/next-question":
+            question = get_next_question(evidence)
+            if question is None:
+                return HTTPStatus.OK, {"question": None}
+            return HTTPStatus.OK, {"question": {"key": question["key"], "text": question["text"],
+                                                "options": question["options"]}}
+        if not evidence:
+            return HTTPStatus.OK, {"rule_based": [], "bayesian": [], "sensitivity": []}
+        result = await self.batcher.diagnose(evidence, sensitivity)
+        if "error" in result:
+            return HTTPStatus.BAD_REQUEST, result
+        return HTTPStatus.OK, result
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except Exception as e:
+                    # Un fallo del modelo o del pool se responde; no se cierra la conexión sin respuesta.
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, workers, snapshot, max_batch, max_delay):
+    if workers > 0:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,))
+    else:
+        # Un solo modelo compartido en el proceso del servidor.
+        _init_worker(snapshot)
+        executor = ThreadPoolExecutor(max_workers=1)
+    # Calienta los procesos de trabajo antes de aceptar conexiones.
+    await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(executor, diagnose_many, [{}])
+                           for _ in range(max(workers, 1))))
+
+    service = DiagnosisService(executor, max_batch, max_delay)
+    batcher = asyncio.create_task(service.batcher.run())
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Servicio de diagnóstico escuchando en http://{host}:{port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+        executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de diagnóstico de vehículos.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="procesos de inferencia (0 = hilo en el mismo proceso)")
+    parser.add_argument("--snapshot", help="carga el modelo desde un snapshot .npz")
+    parser.add_argument("--max-batch", type=int, default=64, help="solicitudes por micro-lote")
+    parser.add_argument("--max-delay", type=float, default=0.002, help="espera máxima en segundos para completar un lote")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.snapshot, args.max_batch, args.max_delay))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
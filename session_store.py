@@ -0,0 +1,288 @@
+import contextlib
+import json
+import operator
+import queue
+import sqlite3
+import threading
+import time
+
+import instrumentation
+
+# Ruta por defecto de la base de sesiones (se puede cambiar con DIAGNOSIS_SESSION_DB en la interfaz).
+DEFAULT_PATH = "sessions.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT,
+    value INTEGER,
+    posteriors TEXT,
+    rule_based TEXT
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session_id, id);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    top_fault TEXT,
+    top_probability REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+CREATE INDEX IF NOT EXISTS sessions_top_fault ON sessions (top_fault, updated_at);
+"""
+
+_INSERT_EVENT = ("INSERT INTO events (session_id, ts, kind, key, value, posteriors, rule_based) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)")
+_UPSERT_SESSION = """
+INSERT INTO sessions (session_id, started_at, updated_at, finished, top_fault, top_probability)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_id) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    finished = max(sessions.finished, excluded.finished),
+    top_fault = coalesce(excluded.top_fault, sessions.top_fault),
+    top_probability = coalesce(excluded.top_probability, sessions.top_probability)
+"""
+
+_STOP = object()
+
+# Intentos por lote cuando SQLite falla (por ejemplo, base bloqueada), con espera creciente.
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.05
+
+
+def _top_fault(posteriors):
+    if not posteriors:
+        return None, None
+    fault = max(posteriors, key=posteriors.get)
+    return fault, posteriors[fault]
+
+
+def _event(session_id, kind, key=None, value=None, posteriors=None, rule_based=None):
+    """Valida y serializa un evento en el hilo que lo registra, para que los datos inválidos fallen ahí.
+
+    El hilo de escritura recibe solo texto y números listos para SQLite.
+    """
+    if not isinstance(session_id, str):
+        raise TypeError(f"`session_id` debe ser texto: {session_id!r}")
+    if value is not None:
+        value = operator.index(value)
+    if posteriors is not None:
+        posteriors = {str(query): float(probability) for query, probability in posteriors.items()}
+    fault, probability = _top_fault(posteriors)
+    return (session_id, time.time(), kind, key, value,
+            None if posteriors is None else json.dumps(posteriors),
+            None if rule_based is None else json.dumps(rule_based, ensure_ascii=False),
+            fault, probability)
+
+
+class SessionStore:
+    """Registro durable de sesiones en SQLite: respuestas, posteriores y diagnósticos por reglas.
+
+    Los eventos se agregan solo al final de la tabla `events`; la tabla `sessions` es un
+    índice por sesión con la fecha de la última actividad y la falla más probable. Las
+    escrituras se encolan sin bloquear y un hilo las guarda por lotes de hasta
+    `batch_size` eventos en una sola transacción.
+
+    Los eventos se validan y serializan al registrarlos, así que los datos inválidos fallan
+    en quien llama. Un lote que SQLite rechaza se reintenta y luego se guarda evento por
+    evento: los que fallan solos se descartan (se cuentan en `session_store_dropped`) y, si
+    fallan todos, se conservan para el próximo lote y `flush()` y `close()` lanzan el
+    error. Después de `close()` las escrituras también se descartan.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        with contextlib.closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pending = []
+        self.error = None
+        self._writer = threading.Thread(target=self._write_loop, name="session-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record_answer(self, session_id, key, value, posteriors=None):
+        """Encola una respuesta y, si se conocen, los posteriores resultantes."""
+        self._put(_event(session_id, "answer", key, value, posteriors))
+
+    def record_diagnosis(self, session_id, posteriors, rule_based):
+        """Encola el diagnóstico final de la sesión y la marca como terminada."""
+        self._put(_event(session_id, "diagnosis", posteriors=posteriors, rule_based=rule_based))
+
+    def _put(self, record):
+        # El candado asegura que nada quede en la cola detrás de la marca de cierre.
+        with self._lock:
+            if not self._closed:
+                self._queue.put(record)
+                return
+        instrumentation.count("session_store_dropped")
+
+    def _write_loop(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is _STOP
+            records = self._pending + [record for record in batch if record is not _STOP]
+            self._pending = []
+            try:
+                if records:
+                    self._write_with_retries(connection, records)
+            except Exception as e:
+                # Un error inesperado no debe detener el hilo: se pierden solo estos eventos.
+                for record in records:
+                    self._drop(record, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        connection.close()
+
+    def _write_with_retries(self, connection, records):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with instrumentation.span("session_store_write", events=len(records)):
+                    self._write(connection, records)
+                self.error = None
+                return
+            except sqlite3.Error as e:
+                instrumentation.count("session_store_error")
+                instrumentation.event("session_store_error", error=str(e), events=len(records), attempt=attempt)
+                self.error = e
+                if attempt + 1 < WRITE_RETRIES:
+                    time.sleep(RETRY_DELAY * 2 ** attempt)
+            except Exception:
+                break
+
+        # El lote no entra completo: se guarda evento por evento para separar los que fallan.
+        failed = []
+        for record in records:
+            try:
+                self._write(connection, [record])
+            except Exception as e:
+                failed.append((record, e))
+        if len(failed) == len(records) and all(isinstance(e, sqlite3.Error) for _, e in failed):
+            # Falla todo con errores de SQLite (base bloqueada, disco lleno): se reintenta en el próximo lote.
+            self.error = failed[-1][1]
+            self._pending = records
+            return
+        for record, e in failed:
+            self._drop(record, e)
+
+    @staticmethod
+    def _drop(record, error):
+        instrumentation.count("session_store_dropped")
+        instrumentation.event("session_store_dropped", session_id=record[0], kind=record[2], error=str(error))
+
+    @staticmethod
+    def _write(connection, records):
+        events = []
+        sessions = {}
+        for session_id, ts, kind, key, value, posteriors, rule_based, fault, probability in records:
+            events.append((session_id, ts, kind, key, value, posteriors, rule_based))
+            # Una fila por sesión y lote: la primera fecha, la última y la falla más reciente.
+            previous = sessions.get(session_id)
+            if previous is None:
+                sessions[session_id] = (session_id, ts, ts, int(kind == "diagnosis"), fault, probability)
+            else:
+                sessions[session_id] = (session_id, previous[1], ts, max(previous[3], int(kind == "diagnosis")),
+                                        fault or previous[4], previous[5] if fault is None else probability)
+        with connection:
+            connection.executemany(_INSERT_EVENT, events)
+            connection.executemany(_UPSERT_SESSION, sessions.values())
+
+    def flush(self):
+        """Espera a que todos los eventos encolados estén guardados; falla si alguno no se pudo guardar.
+
+        Si el hilo de escritura ya no corre, falla enseguida en lugar de esperar para siempre.
+        """
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                if not self._writer.is_alive():
+                    raise RuntimeError(f"El hilo de escritura de {self.path} terminó con "
+                                       f"{self._queue.unfinished_tasks} eventos sin guardar")
+                done.wait(0.1)
+        self._raise_pending()
+
+    def close(self):
+        """Guarda lo pendiente y detiene el hilo de escritura; las escrituras posteriores se descartan."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._writer.join()
+        self._raise_pending()
+
+    def _raise_pending(self):
+        if self._pending:
+            raise RuntimeError(f"{len(self._pending)} eventos sin guardar en {self.path}") from self.error
+
+    def load_session(self, session_id):
+        """Reconstruye una sesión: evidencia en orden de respuesta, últimos posteriores y diagnóstico.
+
+        Devuelve None si la sesión no existe. Solo ve los eventos ya guardados; llame a
+        `flush()` antes si necesita incluir los recién encolados.
+        """
+        with contextlib.closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT kind, key, value, posteriors, rule_based FROM events WHERE session_id = ? ORDER BY id",
+                (session_id,)).fetchall()
+        if not rows:
+            return None
+        session = {"session_id": session_id, "evidence": {}, "posteriors": None, "rule_based": None, "finished": False}
+        for kind, key, value, posteriors, rule_based in rows:
+            if kind == "answer":
+                session["evidence"][key] = value
+            else:
+                session["finished"] = True
+                session["rule_based"] = json.loads(rule_based)
+            if posteriors is not None:
+                session["posteriors"] = json.loads(posteriors)
+        return session
+
+    def find_sessions(self, top_fault=None, since=None, until=None, finished=None, limit=100):
+        """Busca sesiones por falla más probable, rango de última actividad y estado, de la más reciente a la más antigua."""
+        conditions = []
+        params = []
+        if top_fault is not None:
+            conditions.append("top_fault = ?")
+            params.append(top_fault)
+        if since is not None:
+            conditions.append("updated_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("updated_at < ?")
+            params.append(until)
+        if finished is not None:
+            conditions.append("finished = ?")
+            params.append(int(finished))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with contextlib.closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"SELECT * FROM sessions {where} ORDER BY updated_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished_sessions(self, limit=100):
+        """Sesiones sin diagnóstico final, para retomarlas."""
+        return self.find_sessions(finished=False, limit=limit)
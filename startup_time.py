@@ -0,0 +1,46 @@
+"""Mide el arranque en frío: construir la red de pgmpy frente a cargarla desde un snapshot."""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_SNAPSHOT = "vehicle_diagnosis.npz"
+
+
+def measure(code, repeat):
+    """Ejecuta `code` en intérpretes nuevos y devuelve los tiempos de pared en segundos."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-W", "ignore", "-c", code], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.snapshot):
+        from bayesian_model import VehicleDiagnosis
+        VehicleDiagnosis().save_snapshot(args.snapshot)
+
+    cases = {
+        "python vacío": "pass",
+        "VehicleDiagnosis()": "from bayesian_model import VehicleDiagnosis; "
+                              "VehicleDiagnosis().infer({'battery_ok': 1})",
+        "VehicleDiagnosis.from_snapshot()": "from bayesian_model import VehicleDiagnosis; "
+                                            f"VehicleDiagnosis.from_snapshot({args.snapshot!r}).infer({{'battery_ok': 1}})",
+    }
+    for name, code in cases.items():
+        times = measure(code, args.repeat)
+        print(f"{name:<36} mediana {statistics.median(times):.3f} s  (min {min(times):.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
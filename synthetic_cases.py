@@ -0,0 +1,207 @@
+"""Generador de casos de diagnóstico sintéticos a partir de la red de `VehicleDiagnosis`.
+
+Muestrea la red completa por bloques (muestreo ancestral vectorizado), oculta las
+respuestas que el cuestionario no habría preguntado y escribe un registro JSONL por caso:
+
+    {"evidence": {"difficulty_starting": 1, "battery_ok": 0, ...}, "faults": {"ignition_issue": 0, ...}}
+
+`evidence` viene en el orden del cuestionario, así que los registros sirven tal cual de
+entrada para `batch_diagnosis.py`, que conserva `faults` en la salida. Al terminar se
+informa cuánto coincide el motor de reglas con la falla más probable del modelo.
+
+Ejemplo:
+    python synthetic_cases.py casos.jsonl --cases 1000000 --seed 7 --abandon 0.2
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from bayesian_model import DIAGNOSIS_QUERIES, OBSERVABLE_VARIABLES, UNOBSERVED
+from compiled_rules import NO_DIAGNOSIS, RULE_GROUPS, CompiledRuleMatcher
+from evidence import EVIDENCE_VARIABLES
+from questions import QUESTIONS
+from sampling import LikelihoodWeighting
+
+CHUNK_SIZE = 100_000
+
+# Falla de la red que señala cada regla de `TroubleshootingExpert` (por nombre de regla).
+RULE_FAULTS = {
+    'diagnose_ignition': 'ignition_issue',
+    'diagnose_battery': 'battery_issue',
+    'diagnose_brakes': 'brake_issue',
+    'diagnose_brakes2': 'brake_issue',
+    'diagnose_tires_or_alignment': 'tire_issue',
+    'diagnose_tires_or_alignment2': 'tire_issue',
+}
+
+MASKS = ("questionnaire", "all")
+
+
+class CaseGenerator:
+    """Casos sintéticos (respuestas del cuestionario y fallas reales) muestreados de la red.
+
+    Con `mask="questionnaire"` solo quedan las preguntas principales y los seguimientos
+    cuya condición se cumple, como en `DiagnosticChatbot`; con `mask="all"` se responden
+    todas. `abandon` es la probabilidad de que un caso deje el cuestionario a medias: se
+    conservan solo las primeras respuestas, en el orden en que se preguntan.
+    """
+
+    def __init__(self, diagnosis, mask="questionnaire", abandon=0.0, questions=QUESTIONS):
+        if mask not in MASKS:
+            raise ValueError(f"Máscara desconocida: {mask}. Opciones: {', '.join(MASKS)}")
+        if not 0 <= abandon <= 1:
+            raise ValueError(f"`abandon` debe estar entre 0 y 1: {abandon}")
+        self.diagnosis = diagnosis
+        self.mask = mask
+        self.abandon = abandon
+        self.questions = questions
+        self.sampler = LikelihoodWeighting.from_cpds(diagnosis._network_cpds())
+        self.matcher = CompiledRuleMatcher()
+
+        self._column = {variable: i for i, variable in enumerate(EVIDENCE_VARIABLES)}
+        self._observable = [self._column[variable] for variable in OBSERVABLE_VARIABLES]
+        self._main = [self._column[question["key"]] for question in questions]
+        self._observed_faults = [(i, self._column[query]) for i, query in enumerate(DIAGNOSIS_QUERIES)
+                                 if query in self._column]
+        rule_names = [name for _, _, rules in RULE_GROUPS for name, _, _ in rules]
+        self._code_fault = np.array([DIAGNOSIS_QUERIES.index(RULE_FAULTS[name]) for name in rule_names] + [-1])
+
+    def sample(self, size, rng):
+        """Muestra `size` casos: (respuestas N x 15 con `UNOBSERVED` en las no preguntadas, fallas N x 7)."""
+        states = self.sampler.forward(size, rng)
+        answers = np.stack([states[variable] for variable in EVIDENCE_VARIABLES], axis=1).astype(np.int8)
+        faults = np.stack([states[query] for query in DIAGNOSIS_QUERIES], axis=1).astype(np.int8)
+
+        asked = self._asked(answers) if self.mask == "questionnaire" else np.ones(answers.shape, dtype=bool)
+        if self.abandon:
+            # Cada caso que abandona se corta después de un número uniforme de respuestas.
+            position = np.cumsum(asked, axis=1)
+            limit = np.where(rng.random(size) < self.abandon,
+                             (rng.random(size) * asked.sum(axis=1)).astype(int), len(EVIDENCE_VARIABLES))
+            asked &= position <= limit[:, None]
+        answers[~asked] = UNOBSERVED
+        return answers, faults
+
+    def _asked(self, answers):
+        # Las condiciones de seguimiento son funciones de Python sobre la evidencia; se
+        # evalúan una vez por combinación de respuestas principales, que son las únicas
+        # que el cuestionario consulta antes de decidir los seguimientos.
+        patterns, inverse = np.unique(answers[:, self._main], axis=0, return_inverse=True)
+        asked = np.zeros((len(patterns), len(EVIDENCE_VARIABLES)), dtype=bool)
+        for row, pattern in enumerate(patterns.tolist()):
+            evidence = {question["key"]: value for question, value in zip(self.questions, pattern)}
+            for question in self.questions:
+                asked[row, self._column[question["key"]]] = True
+                for follow_up in question.get("follow_up", []):
+                    asked[row, self._column[follow_up["key"]]] = follow_up["condition"](evidence)
+        return asked[inverse.ravel()]
+
+    def compare(self, answers, faults):
+        """Contadores de coincidencia entre reglas, modelo y fallas reales para un bloque.
+
+        La falla más probable es la de `diagnose_vehicle` (las fallas que el cuestionario
+        observa no compiten). El motor de reglas "coincide" cuando alguno de sus
+        diagnósticos señala esa falla; se usa el evaluador compilado, equivalente a
+        `TroubleshootingExpert` (lo comprueba `tests/test_compiled_rules.py`).
+        """
+        posteriors = self.diagnosis.infer_batch(answers[:, self._observable])
+        for query, column in self._observed_faults:
+            posteriors[answers[:, column] != UNOBSERVED, query] = -1.0
+        top = posteriors.argmax(axis=1)
+
+        codes = self.matcher.match_batch(answers)
+        rule_faults = self._code_fault[np.where(codes == NO_DIAGNOSIS, -1, codes)]
+        fired = (rule_faults >= 0).any(axis=1)
+        agree = (rule_faults == top[:, None]).any(axis=1)
+        rows = np.arange(len(faults))
+        rule_correct = np.zeros(len(faults), dtype=bool)
+        for group in range(rule_faults.shape[1]):
+            fault = rule_faults[:, group]
+            rule_correct |= (fault >= 0) & (faults[rows, np.maximum(fault, 0)] == 1)
+        return {
+            "cases": len(faults),
+            "rule_cases": int(fired.sum()),
+            "agreements": int((agree & fired).sum()),
+            "model_correct": int((faults[rows, top] == 1).sum()),
+            "rule_correct": int(rule_correct.sum()),
+        }
+
+    def records(self, answers, faults):
+        """Líneas JSONL de un bloque; cada patrón distinto de respuestas o fallas se serializa una sola vez."""
+        weights = np.int64(3) ** np.arange(answers.shape[1], dtype=np.int64)
+        answer_keys, answer_index = np.unique((answers.astype(np.int64) + 1) @ weights, return_inverse=True)
+        fault_keys, fault_index = np.unique(faults.astype(np.int64) @ (np.int64(2) ** np.arange(faults.shape[1])),
+                                            return_inverse=True)
+        answer_rows = answers[np.unique(answer_index.ravel(), return_index=True)[1]]
+        fault_rows = faults[np.unique(fault_index.ravel(), return_index=True)[1]]
+
+        evidence_json = []
+        for row in answer_rows.tolist():
+            evidence = {variable: value for variable, value in zip(EVIDENCE_VARIABLES, row) if value != UNOBSERVED}
+            evidence_json.append('{"evidence": ' + json.dumps(evidence))
+        faults_json = [', "faults": ' + json.dumps(dict(zip(DIAGNOSIS_QUERIES, row))) + "}\n"
+                       for row in fault_rows.tolist()]
+        return "".join(evidence_json[a] + faults_json[f]
+                       for a, f in zip(answer_index.ravel().tolist(), fault_index.ravel().tolist()))
+
+    def generate(self, cases, chunk_size=CHUNK_SIZE, seed=None):
+        """Genera bloques (respuestas, fallas) hasta completar `cases`; con la misma semilla y tamaño de bloque se repiten."""
+        rng = np.random.default_rng(seed)
+        for start in range(0, cases, chunk_size):
+            yield self.sample(min(chunk_size, cases - start), rng)
+
+    def write(self, stream, cases, chunk_size=CHUNK_SIZE, seed=None):
+        """Escribe `cases` registros JSONL en `stream` y devuelve el informe de coincidencias."""
+        started = time.perf_counter()
+        totals = {}
+        for answers, faults in self.generate(cases, chunk_size, seed):
+            stream.write(self.records(answers, faults))
+            for key, value in self.compare(answers, faults).items():
+                totals[key] = totals.get(key, 0) + value
+        return report(totals, time.perf_counter() - started)
+
+
+def report(totals, elapsed):
+    """Tasas a partir de los contadores sumados de `CaseGenerator.compare`."""
+    cases = totals.get("cases", 0)
+    rule_cases = totals.get("rule_cases", 0)
+    return {
+        "cases": cases,
+        "rule_coverage": rule_cases / cases if cases else 0.0,
+        "rule_agreement": totals.get("agreements", 0) / rule_cases if rule_cases else 0.0,
+        "model_accuracy": totals.get("model_correct", 0) / cases if cases else 0.0,
+        "rule_accuracy": totals.get("rule_correct", 0) / rule_cases if rule_cases else 0.0,
+        "elapsed": elapsed,
+        "cases_per_second": cases / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="archivo JSONL de salida ('-' para la salida estándar)")
+    parser.add_argument("--cases", type=int, default=1_000_000, help="cantidad de casos")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="casos por bloque")
+    parser.add_argument("--seed", type=int, help="semilla para repetir la generación")
+    parser.add_argument("--mask", choices=MASKS, default="questionnaire", help="qué respuestas conservar")
+    parser.add_argument("--abandon", type=float, default=0.0, help="probabilidad de dejar el cuestionario a medias")
+    parser.add_argument("--snapshot", help="modelo guardado con VehicleDiagnosis.save_snapshot")
+    args = parser.parse_args(argv)
+
+    from bayesian_model import VehicleDiagnosis
+
+    diagnosis = VehicleDiagnosis.from_snapshot(args.snapshot) if args.snapshot else VehicleDiagnosis()
+    generator = CaseGenerator(diagnosis, args.mask, args.abandon)
+    if args.output == "-":
+        result = generator.write(sys.stdout, args.cases, args.chunk_size, args.seed)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            result = generator.write(f, args.cases, args.chunk_size, args.seed)
+
+    print(json.dumps(result), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Ingesta de telemetría de vehículos (lecturas tipo OBD) convertida en evidencia para el diagnóstico.
+
+Cada lectura es una línea JSON:
+
+    {"vehicle": "ABC123", "ts": 1712.5, "signal": "coolant_temp", "value": 107.2}
+
+Las lecturas de cada vehículo se agregan por ventanas de tiempo (según `ts`, no según el
+reloj) y se comparan con umbrales para obtener las variables de evidencia de
+`VehicleDiagnosis`. El diagnóstico de un vehículo solo se vuelve a calcular cuando su
+evidencia derivada cambia.
+
+Ejemplos:
+    python telemetry.py flota-*.jsonl                    # reproduce los archivos lo más rápido posible
+    python telemetry.py flota-*.jsonl --replay-speed 10  # respeta los tiempos, 10 veces más rápido
+    python telemetry.py --listen 127.0.0.1:9100          # recibe lecturas por sockets locales
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+
+import instrumentation
+from compiled_rules import CompiledRuleMatcher
+from evidence import BitEvidence
+
+# (variable de evidencia, señal, ventana en segundos, agregación, comparación, umbral): la
+# variable vale 1 si la agregación de la señal en la ventana cumple la comparación.
+EVIDENCE_RULES = [
+    ("difficulty_starting", "cranking_time", 600, "max", ">", 2.0),
+    ("battery_ok", "battery_voltage", 600, "min", ">=", 9.6),
+    ("overheating", "coolant_temp", 60, "mean", ">", 105.0),
+    ("coolant_level", "coolant_level_pct", 300, "min", "<", 30.0),
+    ("fan_function", "fan_state", 30, "max", ">=", 1.0),
+    ("vibrations", "vibration_rms", 10, "mean", ">", 0.5),
+    ("steering_vibrates", "steering_vibration_rms", 10, "mean", ">", 0.3),
+]
+
+QUEUE_SIZE = 10_000
+MAX_VEHICLES = 10_000
+MAX_READINGS = 1024
+
+_AGGREGATES = {
+    "mean": lambda values: sum(values) / len(values),
+    "min": min,
+    "max": max,
+    "last": lambda values: values[-1],
+}
+_COMPARISONS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+class VehicleState:
+    """Lecturas recientes de un vehículo (acotadas por ventana y por cantidad) y su última evidencia."""
+
+    __slots__ = ("readings", "evidence", "result")
+
+    def __init__(self):
+        self.readings = {}
+        self.evidence = BitEvidence()
+        self.result = None
+
+
+class TelemetryPipeline:
+    """Pipeline asyncio: fuentes -> cola acotada -> agregación por vehículo -> diagnóstico.
+
+    Las fuentes esperan cuando la cola está llena, así que una flota rápida no hace crecer
+    la memoria. Se guardan como mucho `max_vehicles` vehículos (se descarta el que lleva
+    más tiempo sin datos) y `max_readings` lecturas por señal. `on_change(result)` se
+    llama con cada diagnóstico nuevo.
+
+    El diagnóstico corre en el mismo bucle de eventos que la ingesta: con las tablas
+    compiladas y la caché de componentes cada uno toma microsegundos, menos que pasarlo a
+    otro hilo, y así el modelo y el estado de los vehículos no se comparten entre hilos.
+    Mientras se diagnostica no se leen lecturas nuevas; un modelo más lento (por ejemplo,
+    con inferencia por muestreo) frenaría a todas las fuentes.
+    """
+
+    def __init__(self, diagnosis, on_change=None, rules=EVIDENCE_RULES, queue_size=QUEUE_SIZE,
+                 max_vehicles=MAX_VEHICLES, max_readings=MAX_READINGS):
+        self.diagnosis = diagnosis
+        self.on_change = on_change
+        self.rules = rules
+        self.queue = asyncio.Queue(queue_size)
+        self.max_vehicles = max_vehicles
+        self.max_readings = max_readings
+        self.vehicles = OrderedDict()
+        self.matcher = CompiledRuleMatcher()
+        self._windows = {}
+        for _, signal, window, aggregate, comparison, _ in rules:
+            if aggregate not in _AGGREGATES or comparison not in _COMPARISONS:
+                raise ValueError(f"Regla de telemetría inválida para {signal}: {aggregate} {comparison}")
+            self._windows[signal] = max(window, self._windows.get(signal, 0))
+        self.readings = 0
+        self.rejected = 0
+        self.diagnoses = 0
+        self.evicted = 0
+
+    async def submit(self, reading):
+        """Encola una lectura; espera si la cola está llena."""
+        await self.queue.put(reading)
+
+    async def run(self):
+        """Procesa la cola hasta que se cancele la tarea; cada lectura se diagnostica en el bucle de eventos."""
+        while True:
+            reading = await self.queue.get()
+            try:
+                self.process(reading)
+            finally:
+                self.queue.task_done()
+
+    def process(self, reading):
+        """Agrega una lectura y, si cambia la evidencia del vehículo, vuelve a diagnosticarlo."""
+        try:
+            vehicle = str(reading["vehicle"])
+            signal = reading["signal"]
+            ts = float(reading["ts"])
+            value = float(reading["value"])
+        except (KeyError, TypeError, ValueError):
+            self.rejected += 1
+            instrumentation.count("telemetry_rejected")
+            return None
+        if signal not in self._windows:
+            self.rejected += 1
+            instrumentation.count("telemetry_rejected", signal)
+            return None
+        self.readings += 1
+
+        state = self.vehicles.get(vehicle)
+        if state is None:
+            state = self.vehicles[vehicle] = VehicleState()
+            if len(self.vehicles) > self.max_vehicles:
+                self.vehicles.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.vehicles.move_to_end(vehicle)
+        window = state.readings.get(signal)
+        if window is None:
+            window = state.readings[signal] = deque(maxlen=self.max_readings)
+        window.append((ts, value))
+
+        evidence = self.derive_evidence(state, ts)
+        if evidence == state.evidence:
+            return None
+        state.evidence = evidence
+        with instrumentation.span("telemetry_diagnosis", vehicle=vehicle):
+            posteriors = self.diagnosis.fault_posteriors(evidence) if evidence else {}
+            top_fault = max(posteriors, key=posteriors.get) if posteriors else None
+            state.result = {
+                "vehicle": vehicle,
+                "ts": ts,
+                "evidence": evidence.to_dict(),
+                "issue": top_fault,
+                "probability": float(posteriors[top_fault]) if top_fault else 0.0,
+                "posteriors": {fault: float(p) for fault, p in posteriors.items()},
+                "rule_based": self.matcher.evaluate(evidence),
+            }
+        self.diagnoses += 1
+        if self.on_change is not None:
+            self.on_change(state.result)
+        return state.result
+
+    def derive_evidence(self, state, now):
+        """Evidencia según las lecturas dentro de cada ventana; sin lecturas recientes, la variable queda sin observar."""
+        for signal, window in state.readings.items():
+            horizon = now - self._windows[signal]
+            while window and window[0][0] < horizon:
+                window.popleft()
+
+        evidence = BitEvidence()
+        for variable, signal, window, aggregate, comparison, threshold in self.rules:
+            readings = state.readings.get(signal)
+            values = [value for ts, value in readings or () if ts >= now - window]
+            if values:
+                met = _COMPARISONS[comparison](_AGGREGATES[aggregate](values), threshold)
+                evidence = evidence.set(variable, int(met))
+        return evidence
+
+    async def ingest_lines(self, lines, replay_speed=None):
+        """Encola lecturas de un iterable asíncrono de líneas JSON.
+
+        Con `replay_speed` se respetan los intervalos entre `ts` consecutivos, divididos
+        por ese factor; sin él las lecturas se encolan tan rápido como lo permita la cola.
+        """
+        previous = None
+        started = time.monotonic()
+        async for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                reading = json.loads(line)
+            except ValueError:
+                self.rejected += 1
+                instrumentation.count("telemetry_rejected")
+                continue
+            if replay_speed and isinstance(reading, dict) and isinstance(reading.get("ts"), (int, float)):
+                if previous is None:
+                    previous = reading["ts"]
+                delay = (reading["ts"] - previous) / replay_speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.submit(reading)
+
+    async def ingest_file(self, path, replay_speed=None):
+        await self.ingest_lines(_file_lines(path), replay_speed)
+
+    async def ingest_stream(self, reader, writer=None):
+        """Lee lecturas de una conexión (TCP o socket Unix) hasta que el cliente la cierra."""
+        try:
+            await self.ingest_lines(_stream_lines(reader))
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def replay(self, paths, replay_speed=None):
+        """Reproduce varios archivos a la vez, espera a que se procese todo y devuelve el último resultado de cada vehículo."""
+        worker = asyncio.create_task(self.run())
+        try:
+            await asyncio.gather(*(self.ingest_file(path, replay_speed) for path in paths))
+            await self.queue.join()
+        finally:
+            worker.cancel()
+        return {vehicle: state.result for vehicle, state in self.vehicles.items() if state.result is not None}
+
+    def stats(self):
+        return {"vehicles": len(self.vehicles), "readings": self.readings, "rejected": self.rejected,
+                "diagnoses": self.diagnoses, "evicted": self.evicted, "queued": self.queue.qsize()}
+
+
+async def _file_lines(path, batch=1000):
+    # La lectura del disco se hace en un hilo, por bloques, para no frenar el bucle de eventos.
+    with open(path, encoding="utf-8") as f:
+        while True:
+            lines = await asyncio.to_thread(f.readlines, batch * 100)
+            if not lines:
+                return
+            for line in lines:
+                yield line
+
+
+async def _stream_lines(reader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line.decode("utf-8", errors="replace")
+
+
+async def serve(pipeline, host=None, port=None, path=None):
+    """Recibe lecturas por TCP (`host`/`port`) o por un socket Unix (`path`)."""
+    if path is not None:
+        server = await asyncio.start_unix_server(pipeline.ingest_stream, path)
+    else:
+        server = await asyncio.start_server(pipeline.ingest_stream, host, port)
+    worker = asyncio.create_task(pipeline.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="archivos JSONL de lecturas para reproducir")
+    parser.add_argument("--replay-speed", type=float, help="respeta los tiempos de las lecturas, acelerados por este factor")
+    parser.add_argument("--listen", metavar="HOST:PUERTO", help="recibe lecturas por TCP")
+    parser.add_argument("--unix", metavar="RUTA", help="recibe lecturas por un socket Unix")
+    parser.add_argument("--snapshot", help="modelo guardado con VehicleDiagnosis.save_snapshot")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="lecturas en espera antes de frenar a las fuentes")
+    parser.add_argument("--max-vehicles", type=int, default=MAX_VEHICLES, help="vehículos con estado en memoria")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.listen and not args.unix:
+        parser.error("indique archivos para reproducir, --listen o --unix")
+
+    from bayesian_model import VehicleDiagnosis
+
+    instrumentation.configure_from_env()
+    diagnosis = VehicleDiagnosis.from_snapshot(args.snapshot) if args.snapshot else VehicleDiagnosis()
+
+    def emit(result):
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    async def run():
+        pipeline = TelemetryPipeline(diagnosis, emit, queue_size=args.queue_size, max_vehicles=args.max_vehicles)
+        if args.inputs:
+            await pipeline.replay(args.inputs, args.replay_speed)
+            print(json.dumps(pipeline.stats()), file=sys.stderr)
+        else:
+            host, _, port = (args.listen or "").rpartition(":")
+            await serve(pipeline, host or None, int(port) if port else None, args.unix)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def diagnosis():
+    # Construir la red importa pgmpy, que tarda varios segundos: se comparte entre pruebas.
+    from bayesian_model import VehicleDiagnosis
+    return VehicleDiagnosis()
@@ -0,0 +1,87 @@
+from itertools import permutations, product
+
+import pytest
+
+from compiled_rules import RULE_GROUPS, RULE_VARIABLES, CompiledRuleMatcher, evidence_rows
+from evidence import BitEvidence
+from questions import QUESTIONS, questionnaire_evidence
+
+pytest.importorskip("experta")
+
+# Probabilidades que dispararían las reglas `*_from_bayesian` si llegaran con su nombre.
+BAYESIAN_DIAGNOSIS = {'battery_issue': 0.2, 'ignition_issue': 0.15, 'coolant_leak': 0.0805,
+                      'radiator_issue': 0.115, 'tire_issue': 0.1904, 'engine_mount_issue': 0.2}
+
+
+def equivalence_cases():
+    """Casos para comparar con experta.
+
+    - Todas las evidencias del cuestionario, en el orden en que se responden.
+    - Todas las combinaciones (sin responder, 0, 1) de las variables de cada grupo; como
+      las reglas de un grupo solo miran sus propias variables, esto cubre exhaustivamente
+      las condiciones de cada regla.
+    - Todos los órdenes posibles de los grupos cuando cada uno dispara cada diagnóstico,
+      para comprobar el orden de la lista resultante.
+    """
+    cases = questionnaire_evidence()
+    for question in QUESTIONS:
+        keys = [question["key"]] + [follow_up["key"] for follow_up in question.get("follow_up", [])]
+        for states in product((None, 0, 1), repeat=len(keys)):
+            cases.append({key: state for key, state in zip(keys, states) if state is not None})
+
+    firing = [[{trigger: 1, **conditions} for _, conditions, _ in rules] for trigger, _, rules in RULE_GROUPS]
+    for choice in product(*firing):
+        for order in permutations(choice):
+            evidence = {}
+            for answers in order:
+                evidence.update(answers)
+            cases.append(evidence)
+    return cases
+
+
+def verify_against_experta(evidences):
+    """Comprueba que el evaluador compilado y `pass_evidence_to_engine` den las mismas listas de diagnóstico."""
+    from rules import pass_evidence_to_engine
+
+    matcher = CompiledRuleMatcher()
+    batch = matcher.evaluate_many(evidence_rows(evidences))
+    for evidence, batch_result in zip(evidences, batch):
+        expected = pass_evidence_to_engine(evidence, BAYESIAN_DIAGNOSIS)
+
+        assert matcher.evaluate(evidence) == expected, evidence
+        if list(evidence) == [key for key in RULE_VARIABLES if key in evidence]:
+            assert batch_result == expected, evidence
+
+
+def test_matches_experta_on_rule_conditions_and_questionnaire_sample():
+    # Los casos por grupo y por orden de disparo cubren todas las condiciones de las reglas;
+    # del cuestionario completo basta una muestra para la prueba rápida.
+    questionnaire = questionnaire_evidence()
+    verify_against_experta(equivalence_cases()[len(questionnaire):] + questionnaire[::50])
+
+
+@pytest.mark.slow
+def test_matches_experta_on_all_equivalence_cases():
+    verify_against_experta(equivalence_cases())
+
+
+def test_batch_and_bit_evidence_match_single_evaluation():
+    matcher = CompiledRuleMatcher()
+    cases = questionnaire_evidence()
+    batch = matcher.evaluate_many(evidence_rows(cases))
+    for evidence, result in zip(cases, batch):
+        assert result == matcher.evaluate(evidence)
+        assert matcher.evaluate(BitEvidence.from_dict(evidence)) == result
+
+
+def test_answer_order_is_kept_with_a_dict_not_with_bit_evidence():
+    from rules import pass_evidence_to_engine
+
+    # Orden adaptativo: las vibraciones se respondieron antes que el arranque.
+    answers = {"vibrations": 1, "speed_dependency": 1, "tire_wear": 1, "steering_vibrates": 0,
+               "difficulty_starting": 1, "battery_ok": 0, "starter_sound": 0, "fuel_smell": 0}
+    expected = pass_evidence_to_engine(answers, {})
+    assert pass_evidence_to_engine(answers, {}, backend="compiled") == expected
+    assert len(expected) == 2
+    # `BitEvidence` no guarda el orden de las respuestas: da el del cuestionario.
+    assert CompiledRuleMatcher().evaluate(BitEvidence.from_dict(answers)) == expected[::-1]
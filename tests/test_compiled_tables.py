@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+
+def test_compiled_tables_match_variable_elimination(diagnosis):
+    # Cada celda de cada tabla es una evidencia posible sobre los padres de la falla.
+    for query, table in diagnosis.posterior_tables.items():
+        parents = diagnosis.table_parents[query]
+        for index in np.ndindex(*table.shape):
+            evidence = {parent: state - 1 for parent, state in zip(parents, index) if state}
+            exact = diagnosis.variable_elimination.query([query], evidence=evidence, show_progress=False).values[1]
+            assert table[index] == pytest.approx(exact, abs=1e-9), (query, evidence)
+
+
+def test_infer_batch_matches_infer_row_by_row(diagnosis):
+    from bayesian_model import DIAGNOSIS_QUERIES, INFERENCE_QUERIES, OBSERVABLE_VARIABLES, UNOBSERVED
+
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(UNOBSERVED, 2, size=(200, len(OBSERVABLE_VARIABLES)))
+    result = diagnosis.infer_batch(matrix)
+    for row, posteriors in zip(matrix, result):
+        evidence = {variable: int(state) for variable, state in zip(OBSERVABLE_VARIABLES, row) if state != UNOBSERVED}
+        expected = diagnosis.infer(evidence, method="elimination")
+        assert [posteriors[DIAGNOSIS_QUERIES.index(query)] for query in INFERENCE_QUERIES] == \
+            pytest.approx([expected[query] for query in INFERENCE_QUERIES]), evidence
+
+
+@pytest.mark.parametrize("matrix", [np.full((1, 14), 0.5), np.ones((1, 14)), np.ones((1, 14), dtype=bool)])
+def test_infer_batch_rejects_non_integer_states(diagnosis, matrix):
+    with pytest.raises(ValueError, match="enteros"):
+        diagnosis.infer_batch(matrix)
+
+
+def test_set_cpds_recompiles_and_clears_the_cache():
+    from bayesian_model import VehicleDiagnosis
+
+    diagnosis = VehicleDiagnosis()
+    before = diagnosis.infer({"battery_ok": 1})
+    diagnosis.set_cpds({"battery_issue": np.full((2, 4), 0.5)})
+    assert diagnosis.cache_stats()["size"] == 0
+    assert diagnosis.infer({"battery_ok": 1})["battery_issue"] == pytest.approx(0.5)
+    assert diagnosis.infer({"battery_ok": 1})["tire_issue"] == pytest.approx(before["tire_issue"])
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from cpd_learning import read_chunks
+
+
+@pytest.mark.parametrize("save", [np.savez, np.savez_compressed])
+def test_npz_rows_are_read_in_chunks(tmp_path, save):
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(-1, 2, size=(1003, 5)).astype(np.int8)
+    path = tmp_path / "casos.npz"
+    save(path, columns=np.array(list("abcde")), data=matrix)
+
+    columns, chunks = read_chunks(path, chunk_size=100)
+    chunks = list(chunks)
+    assert columns == list("abcde")
+    assert [len(chunk) for chunk in chunks] == [100] * 10 + [3]
+    np.testing.assert_array_equal(np.concatenate(chunks), matrix)
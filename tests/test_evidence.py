@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from evidence import BitEvidence
+
+
+@pytest.mark.parametrize("value", [True, False, 1.0, 0.0, 2, -1, "1", None])
+def test_only_integer_binary_states_are_accepted(value):
+    with pytest.raises(ValueError, match="no binario"):
+        BitEvidence.from_dict({"battery_ok": value})
+    with pytest.raises(ValueError, match="no binario"):
+        BitEvidence().set("battery_ok", value)
+
+
+def test_numpy_integers_are_states():
+    assert BitEvidence.from_dict({"battery_ok": np.int8(1)}) == BitEvidence().set("battery_ok", 1)
+
+
+def test_equality_and_hash_only_with_bit_evidence():
+    answers = {"battery_ok": 1, "vibrations": 0}
+    evidence = BitEvidence.from_dict(answers)
+    assert evidence == BitEvidence.from_dict(dict(reversed(answers.items())))
+    assert hash(evidence) == hash(BitEvidence.from_dict(answers))
+    assert evidence != answers and answers != evidence
+    assert evidence.to_dict() == answers
+    assert len({evidence, BitEvidence.from_dict(answers)}) == 1
@@ -0,0 +1,89 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import batch_diagnosis
+from bayesian_model import DIAGNOSIS_QUERIES, INFERENCE_QUERIES
+
+
+@pytest.mark.parametrize("value", [1.0, True, 2, "1"])
+@pytest.mark.parametrize("cached_first", [False, True])
+def test_invalid_state_is_dropped_not_raised(diagnosis, value, cached_first):
+    diagnosis.cache.clear()
+    if cached_first:
+        diagnosis.infer({"battery_ok": 1})
+    for method in ("table", "junction_tree", "elimination"):
+        result = diagnosis.infer({"battery_ok": value}, method=method)
+        assert "battery_issue" not in result
+        assert result["tire_issue"] == pytest.approx(diagnosis.infer({})["tire_issue"])
+
+
+def test_integer_states_use_the_same_cache_entry(diagnosis):
+    assert diagnosis.infer({"battery_ok": np.int64(1)}) == diagnosis.infer({"battery_ok": 1})
+    assert set(diagnosis.infer({"battery_ok": 1})) == set(INFERENCE_QUERIES)
+
+
+def test_batch_writes_error_records_and_keeps_going(diagnosis, monkeypatch):
+    monkeypatch.setitem(batch_diagnosis._worker, "diagnosis", diagnosis)
+    monkeypatch.setattr(batch_diagnosis, "_load_worker", lambda snapshot, backend:
+                        batch_diagnosis._worker.update(diagnosis=diagnosis, backend=backend))
+    lines = ['{"battery_ok": 1.0}', "no es json", '{"evidence": 5}', '{"battery_ok": 0}']
+    output = io.StringIO()
+    assert batch_diagnosis.run_batch(io.StringIO("\n".join(lines)), output, workers=1) == 4
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert all("error" in result for result in results[:3])
+    assert results[3]["bayesian"]["battery_issue"] == pytest.approx(0.13)
+
+
+def test_batch_csv_columns_split_into_evidence_and_metadata(diagnosis, monkeypatch):
+    monkeypatch.setattr(batch_diagnosis, "_load_worker", lambda snapshot, backend:
+                        batch_diagnosis._worker.update(diagnosis=diagnosis, backend=backend))
+    rows = "id,battery_ok,difficulty_starting,taller\n7,0,1,norte\n8,3,1,sur\n"
+    output = io.StringIO()
+    batch_diagnosis.run_batch(io.StringIO(rows), output, fmt="csv", workers=1)
+
+    first, second = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert (first["id"], first["taller"]) == (7, "norte")
+    assert first["evidence"] == {"battery_ok": 0, "difficulty_starting": 1}
+    assert first["bayesian"] == pytest.approx(diagnosis.infer(first["evidence"]))
+    assert "battery_ok" in second["error"]
+
+
+@pytest.mark.parametrize("evidence", [{"ignition_issue": 1, "battery_ok": 1}, {"coolant_leak": 0, "fan_function": 1}])
+def test_what_if_with_observed_fault_matches_fault_posteriors(diagnosis, evidence):
+    result = diagnosis.what_if(evidence)
+    assert result["posteriors"] == pytest.approx(diagnosis.fault_posteriors(evidence))
+    for variant in result["variants"]:
+        changed = {key: value for key, value in evidence.items() if key != variant["variable"]}
+        if variant["value"] is not None:
+            changed[variant["variable"]] = variant["value"]
+        assert variant["posteriors"] == pytest.approx(diagnosis.fault_posteriors(changed))
+    # Cambiar la falla observada mueve a las otras fallas de su componente.
+    flipped = next(variant for variant in result["variants"]
+                   if variant["variable"] in DIAGNOSIS_QUERIES and variant["value"] is not None)
+    assert any(flipped["posteriors"][query] != pytest.approx(probability)
+               for query, probability in result["posteriors"].items())
+
+
+def test_cache_stats_count_requests_not_components():
+    from bayesian_model import VehicleDiagnosis
+
+    diagnosis = VehicleDiagnosis()
+    # `ignition_issue` observado obliga a inferencia exacta en su componente.
+    evidence = {"ignition_issue": 1, "vibrations": 1}
+    diagnosis.fault_posteriors(evidence)
+    stats = diagnosis.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (0, 1, 1)
+    assert stats["components"]["misses"] >= 1
+
+    # Otra respuesta en otro componente reutiliza el componente ya calculado.
+    diagnosis.fault_posteriors({**evidence, "overheating": 0})
+    stats = diagnosis.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (0, 2, 2)
+    assert stats["components"]["hits"] >= 1
+
+    diagnosis.fault_posteriors(evidence)
+    assert diagnosis.cache_stats()["hits"] == 1
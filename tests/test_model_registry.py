@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from bayesian_model import VehicleDiagnosis
+from model_registry import ModelRegistry
+
+OVERLAY = {"battery_ok": [[0.5], [0.5]], "overheating": [[0.7], [0.3]]}
+
+
+@pytest.mark.parametrize("method", ["table", "junction_tree", "variable_elimination", "elimination"])
+def test_variant_exact_inference_does_not_build_pgmpy(diagnosis, method):
+    registry = ModelRegistry(diagnosis)
+    registry.register("v", OVERLAY)
+    # `ignition_issue` observado no se resuelve por tabla.
+    evidence = {"ignition_issue": 1, "battery_ok": 1, "overheating": 1}
+    result = registry.diagnose_vehicle(evidence, "v", method)
+    assert registry.get("v").model is None
+    expected = VehicleDiagnosis(cpds=OVERLAY).diagnose_vehicle(evidence, method)
+    assert result["issue"] == expected["issue"]
+    assert result["probability"] == pytest.approx(expected["probability"])
+
+
+def test_footprint_is_measured_and_caps_residents(diagnosis):
+    registry = ModelRegistry(diagnosis)
+    registry.register("v", OVERLAY)
+    model = registry.get("v")
+    built = registry.footprint(model)
+    # Como mínimo los CPDs reemplazados y las tablas recompiladas, que no comparte con el base.
+    own = sum(values.nbytes for values in model.overlay.values()) + sum(
+        table.nbytes for node, table in model.posterior_tables.items() if table is not diagnosis.posterior_tables[node])
+    assert own <= built < 64 * 1024
+
+    registry.infer({"ignition_issue": 1, "vibrations": 1}, "v", "elimination")
+    assert registry.stats()["memory_bytes"] > built
+
+    small = ModelRegistry(diagnosis, max_bytes=registry.stats()["memory_bytes"] + 1)
+    for variant in ("a", "b"):
+        small.register(variant, OVERLAY)
+        small.infer({"ignition_issue": 1, "vibrations": 1}, variant, "elimination")
+    assert small.stats()["resident"] == 1 and small.stats()["evictions"] == 1
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from bayesian_model import DIAGNOSIS_QUERIES, OBSERVABLE_VARIABLES
+from junction_tree import _einsum
+
+
+def _evidences():
+    rng = np.random.default_rng(0)
+    return [{}] + [{variable: int(rng.integers(2)) for variable in OBSERVABLE_VARIABLES + ['brake_issue']
+                    if rng.random() < 0.5} for _ in range(20)]
+
+
+@pytest.fixture(scope="module")
+def joint(diagnosis):
+    # Distribución conjunta completa de la red, para comparar por enumeración.
+    planner = diagnosis._planner()
+    variables = list(planner.cardinality)
+    labels = {variable: i for i, variable in enumerate(variables)}
+    arguments = []
+    for family, values in planner.factors:
+        arguments += [values, [labels[variable] for variable in family]]
+    return variables, _einsum(*arguments, list(range(len(variables))))
+
+
+@pytest.mark.parametrize("evidence", _evidences())
+def test_mpe_matches_enumeration(diagnosis, joint, evidence, k=5):
+    variables, table = joint
+    faults = [query for query in DIAGNOSIS_QUERIES if query not in evidence]
+    kept = [variable for variable in variables if variable not in evidence]
+    conditioned = table[tuple(evidence.get(variable, slice(None)) for variable in variables)]
+    marginal = conditioned.sum(axis=tuple(i for i, variable in enumerate(kept) if variable not in faults))
+    marginal = marginal / conditioned.sum()
+    order = [variable for variable in kept if variable in faults]
+    expected = np.sort(marginal.ravel())[::-1][:k]
+
+    explanations = diagnosis.most_probable_explanation(evidence, k)
+    assert len(explanations) == min(k, np.count_nonzero(marginal))
+    # Las asignaciones pueden diferir en los empates; sus probabilidades no.
+    for explanation, probability in zip(explanations, expected):
+        state = tuple(explanation["faults"][variable] for variable in order)
+        assert explanation["probability"] == pytest.approx(probability, abs=1e-12)
+        assert marginal[state] == pytest.approx(explanation["probability"], abs=1e-12)
+
+
+@pytest.mark.parametrize("evidence", [{"foo": 1}, {"battery_ok": 2}, {"battery_ok": 1.0}, {"battery_ok": True}])
+def test_mpe_with_invalid_evidence_is_logged_not_raised(diagnosis, evidence):
+    assert diagnosis.most_probable_explanation(evidence) == []
+    assert diagnosis.diagnose_vehicle(evidence, method="mpe") == {"issue": "Unknown", "probability": 0, "faults": {}}
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from bayesian_model import DIAGNOSIS_QUERIES, OBSERVABLE_VARIABLES, VehicleDiagnosis
+
+
+def _evidences(seed=0, count=20):
+    rng = np.random.default_rng(seed)
+    return [{variable: int(rng.integers(2)) for variable in OBSERVABLE_VARIABLES if rng.random() < 0.5}
+            for _ in range(count)]
+
+
+def test_sampling_converges_to_junction_tree(diagnosis):
+    # Al crecer el presupuesto el error baja y los intervalos del 95 % cubren el valor exacto.
+    report = {}
+    for budget in (1_000, 10_000, 100_000):
+        max_error = 0.0
+        covered = total = 0
+        for i, evidence in enumerate(_evidences()):
+            queries = [query for query in DIAGNOSIS_QUERIES if query not in evidence]
+            exact = diagnosis._compute_posteriors(queries, evidence, "junction_tree")
+            result = diagnosis.sample_posteriors(queries, evidence, samples=budget, seed=i)
+            for query in queries:
+                low, high = result.intervals[query][1]
+                max_error = max(max_error, abs(result.marginals[query][1] - exact[query]))
+                covered += low <= exact[query] <= high
+                total += 1
+        report[budget] = (max_error, covered / total)
+
+    assert report[100_000][0] < report[1_000][0]
+    assert all(coverage >= 0.85 for _, coverage in report.values()), report
+
+
+@pytest.mark.parametrize("samples", [0, -5])
+def test_non_positive_samples_are_rejected(diagnosis, samples):
+    with pytest.raises(ValueError, match="samples"):
+        diagnosis.infer({"vibrations": 1}, method="sampling", samples=samples)
+
+
+@pytest.mark.parametrize("evidence", [{"not_a_node": 1}, {"vibrations": 2}, {"vibrations": 1.0}])
+def test_bad_evidence_is_an_inference_error_like_exact_methods(diagnosis, evidence):
+    # Se omiten las mismas consultas que en la inferencia exacta, sin lanzar.
+    exact = diagnosis.infer(evidence, method="elimination")
+    assert diagnosis.infer(evidence, method="sampling", samples=100).keys() == exact.keys()
+    assert len(exact) < len(diagnosis.infer({}))
+
+
+def test_snapshot_sampling_does_not_build_pgmpy(diagnosis, tmp_path):
+    path = tmp_path / "model.npz"
+    diagnosis.save_snapshot(path)
+    snapshot = VehicleDiagnosis.from_snapshot(path)
+    result = snapshot.infer({"vibrations": 1}, method="sampling", samples=1_000, seed=0)
+    assert snapshot.model is None
+    assert result == diagnosis.infer({"vibrations": 1}, method="sampling", samples=1_000, seed=0)
+
+    variant = diagnosis.derive({"battery_ok": [[0.5], [0.5]]})
+    variant.infer({"vibrations": 1}, method="sampling", samples=1_000)
+    assert variant.model is None
+
+
+@pytest.mark.parametrize("call", [
+    lambda diagnosis: diagnosis.infer({"vibrations": 1}, samples=100),
+    lambda diagnosis: diagnosis.infer({"vibrations": 1}, method="elimination", seed=0),
+    lambda diagnosis: diagnosis.diagnose_vehicle({"vibrations": 1}, time_budget=0.1),
+    lambda diagnosis: diagnosis.diagnose_vehicle({"vibrations": 1}, method="mpe", samples=100),
+])
+def test_sampling_arguments_need_the_sampling_method(diagnosis, call):
+    with pytest.raises(TypeError, match="method='sampling'"):
+        call(diagnosis)
+
+
+def test_diagnose_vehicle_reports_the_sampling_interval(diagnosis):
+    evidence = {"vibrations": 1, "tire_wear": 1}
+    exact = diagnosis.diagnose_vehicle(evidence)
+    result = diagnosis.diagnose_vehicle(evidence, method="sampling", samples=50_000, seed=0)
+    assert result["issue"] == exact["issue"]
+    low, high = result["interval"]
+    assert low <= exact["probability"] <= high
+    assert high - low < 0.02
+
+
+def test_time_budget_accumulates_without_keeping_the_samples(diagnosis):
+    # Con presupuesto de tiempo se procesan muchos lotes; la estimación sigue siendo exacta
+    # en promedio aunque solo se guarden las sumas ponderadas.
+    evidence = {"vibrations": 1, "steering_vibrates": 0}
+    exact = diagnosis._compute_posteriors(["tire_issue"], evidence, "junction_tree")["tire_issue"]
+    result = diagnosis.sample_posteriors(["tire_issue"], evidence, time_budget=0.2, seed=0)
+    assert result.samples > 10_000
+    low, high = result.intervals["tire_issue"][1]
+    assert low <= exact <= high
@@ -0,0 +1,120 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pytest
+
+import service
+
+
+@pytest.fixture
+def worker(diagnosis, monkeypatch):
+    from rules import get_compiled_rules
+    monkeypatch.setitem(service._worker, "diagnosis", diagnosis)
+    monkeypatch.setitem(service._worker, "rules", get_compiled_rules())
+
+
+def test_bad_evidence_fails_only_its_own_request(worker, diagnosis):
+    # Las reglas fallan con una evidencia que no es un diccionario ni `BitEvidence`.
+    results = service.diagnose_many([{"battery_ok": 1.0}, ["vibrations"], {"vibrations": 1}, {"overheating": 0}])
+    assert "error" in results[1]
+    assert all("error" not in results[i] for i in (0, 2, 3))
+    expected = diagnosis.infer({"vibrations": 1})
+    assert results[2]["bayesian"][0] == [max(expected, key=expected.get), pytest.approx(max(expected.values()))]
+
+
+def _request(port, body):
+    async def send():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        data = json.dumps(body).encode()
+        writer.write(b"POST /diagnose HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(data) + data)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+    return send()
+
+
+def test_micro_batch_with_failing_request_answers_everyone(worker, monkeypatch):
+    monkeypatch.setattr(service, "_diagnose", lambda evidence, sensitivity: 1 / 0 if "bad" in evidence else {"ok": True})
+
+    async def run():
+        executor = ThreadPoolExecutor(max_workers=1)
+        api = service.DiagnosisService(executor, max_delay=0.05)
+        batcher = asyncio.create_task(api.batcher.run())
+        server = await asyncio.start_server(api.serve_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(*(_request(port, {"evidence": evidence})
+                                          for evidence in ({"bad": 1}, {"vibrations": 1}, {"overheating": 0})))
+        finally:
+            batcher.cancel()
+            server.close()
+            executor.shutdown()
+
+    responses = asyncio.run(run())
+    assert responses[0].startswith(b"HTTP/1.1 400")
+    assert all(response.startswith(b"HTTP/1.1 200") for response in responses[1:])
+
+
+def test_handler_failure_answers_500(monkeypatch):
+    api = service.DiagnosisService(None)
+
+    async def fail(method, path, body):
+        raise RuntimeError("pool caído")
+
+    monkeypatch.setattr(api, "handle", fail)
+
+    async def run():
+        server = await asyncio.start_server(api.serve_connection, "127.0.0.1", 0)
+        try:
+            return await _request(server.sockets[0].getsockname()[1], {"evidence": {"vibrations": 1}})
+        finally:
+            server.close()
+
+    response = asyncio.run(run())
+    assert response.startswith(b"HTTP/1.1 %d" % HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def test_sensitivity_is_opt_in_and_reports_its_errors(worker, diagnosis, monkeypatch):
+    evidence = {"vibrations": 1, "tire_wear": 0}
+    plain, with_what_if = service.diagnose_many([evidence, evidence], [False, True])
+    assert plain["sensitivity"] == []
+    expected = diagnosis.what_if(evidence)["variants"][0]
+    assert with_what_if["sensitivity"][0] == {"variable": expected["variable"], "value": expected["value"],
+                                              "delta": expected["delta"]}
+
+    def fail(evidence):
+        raise ValueError("sin variantes")
+
+    monkeypatch.setattr(diagnosis, "what_if", fail)
+    result = service.diagnose_many([evidence], [True])[0]
+    assert result["sensitivity"] == [] and "sin variantes" in result["sensitivity_error"]
+    assert result["bayesian"] == plain["bayesian"]
+
+
+@pytest.mark.parametrize("body, expected", [
+    ({"evidence": {}}, (HTTPStatus.OK, {"rule_based": [], "bayesian": [], "sensitivity": []})),
+    ({"evidence": {"vibrations": 1}, "sensitivity": "yes"}, (HTTPStatus.BAD_REQUEST, {"error": "`sensitivity` debe ser true o false"})),
+])
+def test_diagnose_answers_without_the_model(body, expected):
+    api = service.DiagnosisService(None)
+    assert asyncio.run(api.handle("POST", "/diagnose", json.dumps(body).encode())) == expected
+
+
+def test_dispatched_batches_are_kept_until_done(worker):
+    async def run():
+        executor = ThreadPoolExecutor(max_workers=1)
+        batcher = service.MicroBatcher(executor, max_delay=0)
+        runner = asyncio.create_task(batcher.run())
+        try:
+            result = await batcher.diagnose({"vibrations": 1})
+            await asyncio.sleep(0)
+            return result, len(batcher._dispatching)
+        finally:
+            runner.cancel()
+            executor.shutdown()
+
+    result, pending = asyncio.run(run())
+    assert result["bayesian"] and pending == 0
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "RETRY_DELAY", 0)
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    yield store
+    try:
+        store.close()
+    except RuntimeError:
+        pass
+
+
+def test_close_stops_with_stop_mid_batch(store):
+    # La marca de cierre queda en medio del lote: el hilo debe terminar igual.
+    store._queue.put(session_store._STOP)
+    store._queue.put(session_store._event("s", "answer", "battery_ok", 1))
+    store._writer.join(timeout=5)
+    assert not store._writer.is_alive()
+
+
+def test_writes_after_close_are_ignored(store):
+    store.record_answer("s", "battery_ok", 1)
+    closer = threading.Thread(target=store.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+    store.record_answer("s", "vibrations", 1)
+    store.close()
+    assert store.load_session("s")["evidence"] == {"battery_ok": 1}
+
+
+def test_failed_batch_is_retried(store, monkeypatch):
+    write = SessionStore._write
+    calls = []
+
+    def flaky(connection, records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        write(connection, records)
+
+    monkeypatch.setattr(SessionStore, "_write", staticmethod(flaky))
+    store.record_answer("s", "battery_ok", 0)
+    store.flush()
+    assert len(calls) == 2
+    assert store.load_session("s")["evidence"] == {"battery_ok": 0}
+
+
+def test_lost_batch_is_reported(store, monkeypatch):
+    def fail(connection, records):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(SessionStore, "_write", staticmethod(fail))
+    store.record_answer("s", "battery_ok", 0)
+    with pytest.raises(RuntimeError, match="1 eventos sin guardar") as error:
+        store.flush()
+    assert isinstance(error.value.__cause__, sqlite3.OperationalError)
+
+    # Los eventos se conservan y se guardan al reintentar con el siguiente lote.
+    monkeypatch.undo()
+    monkeypatch.setattr(session_store, "RETRY_DELAY", 0)
+    store.record_answer("s", "vibrations", 1)
+    store.flush()
+    assert store.load_session("s")["evidence"] == {"battery_ok": 0, "vibrations": 1}
+
+
+@pytest.mark.parametrize("record", [
+    lambda store: store.record_diagnosis("c", {"a": 0.5}, {1, 2}),
+    lambda store: store.record_answer("c", "battery_ok", 1, {"a": None}),
+    lambda store: store.record_answer("c", "battery_ok", 0.5),
+])
+def test_invalid_events_raise_to_the_caller(store, record):
+    with pytest.raises((TypeError, ValueError)):
+        record(store)
+    store.record_answer("c", "battery_ok", 1)
+    store.flush()
+    assert store.load_session("c")["evidence"] == {"battery_ok": 1}
+
+
+def test_record_that_fails_alone_is_dropped_and_the_rest_saved(store, monkeypatch):
+    write = SessionStore._write
+
+    def reject_bad(connection, records):
+        if any(record[3] == "bad" for record in records):
+            raise sqlite3.IntegrityError("constraint failed")
+        write(connection, records)
+
+    monkeypatch.setattr(SessionStore, "_write", staticmethod(reject_bad))
+    store.record_answer("s", "battery_ok", 1)
+    store.record_answer("s", "bad", 1)
+    store.record_answer("s", "vibrations", 0)
+    store.flush()
+    store.record_answer("s", "overheating", 1)
+    store.flush()
+    assert store.load_session("s")["evidence"] == {"battery_ok": 1, "vibrations": 0, "overheating": 1}
+
+
+def test_unexpected_writer_error_does_not_stop_the_writer(store, monkeypatch):
+    write = SessionStore._write
+    calls = []
+
+    def broken_once(connection, records):
+        calls.append(records)
+        if len(calls) <= 2:
+            raise RuntimeError("fallo inesperado")
+        write(connection, records)
+
+    monkeypatch.setattr(SessionStore, "_write", staticmethod(broken_once))
+    store.record_answer("s", "battery_ok", 1)
+    store.flush()
+    store.record_answer("s", "vibrations", 0)
+    store.flush()
+    assert store._writer.is_alive()
+    assert store.load_session("s")["evidence"] == {"vibrations": 0}
+
+
+def test_flush_fails_fast_when_the_writer_is_dead(store):
+    store._queue.put(session_store._STOP)
+    store._writer.join(timeout=5)
+    store._queue.put(session_store._event("s", "answer", "battery_ok", 1))
+    with pytest.raises(RuntimeError, match="hilo de escritura"):
+        store.flush()
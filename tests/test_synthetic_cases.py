@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+import pytest
+
+from bayesian_model import DIAGNOSIS_QUERIES, UNOBSERVED
+from evidence import EVIDENCE_VARIABLES
+from synthetic_cases import CaseGenerator
+
+
+def test_same_seed_repeats_the_cases(diagnosis):
+    generator = CaseGenerator(diagnosis, abandon=0.3)
+    first, second = io.StringIO(), io.StringIO()
+    assert generator.write(first, 2000, chunk_size=700, seed=7)["cases"] == 2000
+    generator.write(second, 2000, chunk_size=700, seed=7)
+    assert first.getvalue() == second.getvalue()
+    assert len(first.getvalue().splitlines()) == 2000
+
+    other = io.StringIO()
+    generator.write(other, 2000, chunk_size=700, seed=8)
+    assert other.getvalue() != first.getvalue()
+
+
+def test_sampled_frequencies_match_the_network_marginals(diagnosis):
+    answers, faults = CaseGenerator(diagnosis, mask="all").sample(200_000, np.random.default_rng(0))
+    assert not (answers == UNOBSERVED).any()
+
+    planner = diagnosis._planner()
+    for variable, frequency in zip(EVIDENCE_VARIABLES, answers.mean(axis=0)):
+        assert frequency == pytest.approx(planner.query([variable], {})[variable][1], abs=0.005), variable
+    for query, frequency in zip(DIAGNOSIS_QUERIES, faults.mean(axis=0)):
+        assert frequency == pytest.approx(planner.query([query], {})[query][1], abs=0.005), query
+
+
+def test_questionnaire_mask_keeps_main_questions_and_met_follow_ups(diagnosis):
+    generator = CaseGenerator(diagnosis)
+    answers, _ = generator.sample(5000, np.random.default_rng(1))
+    column = {variable: i for i, variable in enumerate(EVIDENCE_VARIABLES)}
+    for question in generator.questions:
+        main = answers[:, column[question["key"]]]
+        assert (main != UNOBSERVED).all()
+        for follow_up in question.get("follow_up", []):
+            asked = answers[:, column[follow_up["key"]]] != UNOBSERVED
+            expected = [follow_up["condition"]({question["key"]: int(value)}) for value in main]
+            assert asked.tolist() == [bool(value) for value in expected], follow_up["key"]
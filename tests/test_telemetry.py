@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from telemetry import TelemetryPipeline
+
+
+def _reading(ts, signal, value, vehicle="ABC123"):
+    return {"vehicle": vehicle, "ts": ts, "signal": signal, "value": value}
+
+
+def test_window_aggregate_is_compared_with_the_threshold(diagnosis):
+    pipeline = TelemetryPipeline(diagnosis)
+    # `overheating` compara la media de `coolant_temp` en 60 s con 105.
+    result = pipeline.process(_reading(0, "coolant_temp", 110))
+    assert result["evidence"] == {"overheating": 1}
+    assert result["posteriors"] == pytest.approx(diagnosis.fault_posteriors({"overheating": 1}))
+    # La media de la ventana (110 + 90) / 2 ya no supera el umbral.
+    assert pipeline.process(_reading(10, "coolant_temp", 90))["evidence"] == {"overheating": 0}
+    # Fuera de la ventana, la lectura de 110 no cuenta: la media es la de las dos últimas.
+    assert pipeline.process(_reading(65, "coolant_temp", 130))["evidence"] == {"overheating": 1}
+
+
+def test_evidence_returns_to_unobserved_when_the_window_expires(diagnosis):
+    pipeline = TelemetryPipeline(diagnosis)
+    pipeline.process(_reading(0, "vibration_rms", 0.9))
+    result = pipeline.process(_reading(30, "coolant_temp", 95))
+    # La ventana de `vibration_rms` es de 10 s: a los 30 s ya no hay lecturas recientes.
+    assert result["evidence"] == {"overheating": 0}
+    assert not pipeline.vehicles["ABC123"].readings["vibration_rms"]
+
+
+def test_vehicle_without_data_for_longest_is_evicted(diagnosis):
+    pipeline = TelemetryPipeline(diagnosis, max_vehicles=2)
+    for vehicle in ("a", "b", "a", "c"):
+        pipeline.process(_reading(0, "vibration_rms", 0.9, vehicle))
+    assert list(pipeline.vehicles) == ["a", "c"]
+    assert pipeline.stats()["evicted"] == 1
+
+
+@pytest.mark.parametrize("reading", [
+    {"vehicle": "a", "ts": 0, "signal": "coolant_temp"},
+    _reading("ayer", "coolant_temp", 90),
+    _reading(0, "coolant_temp", None),
+    _reading(0, "oil_pressure", 3.0),
+    "no es un objeto",
+])
+def test_invalid_readings_are_rejected(diagnosis, reading):
+    pipeline = TelemetryPipeline(diagnosis)
+    assert pipeline.process(reading) is None
+    assert (pipeline.rejected, pipeline.readings, len(pipeline.vehicles)) == (1, 0, 0)
+
+
+def test_replay_diagnoses_once_per_evidence_change(diagnosis, tmp_path):
+    readings = [
+        _reading(0, "coolant_temp", 110),
+        _reading(1, "coolant_temp", 112),   # sigue sobrecalentado: sin diagnóstico nuevo
+        _reading(2, "vibration_rms", 0.8),
+        _reading(3, "vibration_rms", 0.9),  # sin cambios
+        _reading(4, "coolant_temp", 50),    # la media baja del umbral
+        _reading(5, "coolant_temp", 20),    # sin cambios
+    ]
+    path = tmp_path / "flota.jsonl"
+    path.write_text("\n".join(json.dumps(reading) for reading in readings) + "\nno es json\n", encoding="utf-8")
+    changes = []
+    pipeline = TelemetryPipeline(diagnosis, on_change=changes.append)
+
+    latest = asyncio.run(pipeline.replay([str(path)]))
+
+    assert [change["evidence"] for change in changes] == [
+        {"overheating": 1},
+        {"overheating": 1, "vibrations": 1},
+        {"overheating": 0, "vibrations": 1},
+    ]
+    assert [change["ts"] for change in changes] == [0, 2, 4]
+    assert latest == {"ABC123": changes[-1]}
+    assert pipeline.stats() == {"vehicles": 1, "readings": 6, "rejected": 1, "diagnoses": 3, "evicted": 0, "queued": 0}